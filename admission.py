@@ -0,0 +1,325 @@
+"""Cost estimates, admission control and rate limiting for simulation requests.
+
+Cost is counted in pull-equivalents: every simulated pull is one unit and
+every banner a simulation visits adds BANNER_COST, the engine's per-banner
+overhead measured in pulls. A request costs its simulations times the pulls
+its plan is expected to take, worked out from budget, pity and target copies
+without running anything. The exact engine's work does not depend on the
+number of simulations but on how many outcomes it tracks, which grows with
+the budget; it is estimated separately and added once. Seconds follow from
+each engine's throughput in units per second, which starts from a measured
+default and then tracks the runs actually observed.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from plan import compile_plan
+
+PULL_COST = 150  # Diamonds per pull, as in GachaSimulator
+HARD_PITY = 140  # Most pulls to a featured copy, UR and SP alike
+MILESTONE_PULLS = 200  # Pulls that earn the free milestone copy
+
+# Expected pulls per featured copy from pity 0, the means of the hit-time tables
+PULLS_PER_COPY = {"UR": 102, "SP": 107}
+
+# Per-banner work of a simulation in pulls (single worker), for "exact" the
+# NumPy figures since it falls back to that engine on large state spaces
+BANNER_COST = {"numpy": 100, "scalar": 200}
+
+# Units per second before any run has been observed, set below the measured
+# rates so that a cold estimate errs towards too slow
+DEFAULT_THROUGHPUT = {"numpy": 2e8, "scalar": 2.5e7}
+
+# Exact engine: work per tracked outcome (start state and pull count) in
+# units, and how many states each pull on a banner adds for the banners
+# after it, far more when the milestone copy is commonly reached and leaves
+# pity behind
+EXACT_ROW_COST = 300
+EXACT_STATE_SPREAD = 6
+EXACT_MILESTONE_SPREAD = 60
+
+# Outcome rows of one banner beyond which the exact engine falls back to
+# NumPy, ExactEngine.max_rows for the default state limit
+EXACT_MAX_ROWS = 2000000
+
+# Weight of one observed run in the throughput average, and the shortest run
+# that says more about throughput than about overhead
+THROUGHPUT_SMOOTHING = 0.2
+MIN_OBSERVED_SECONDS = 0.05
+
+# Fewest simulations worth running when downscaling a request
+MIN_DOWNSCALED_SIMS = 1000
+
+# run_monte_carlo positional arguments before num_simulations
+RUN_ARGUMENTS = ('initial_diamonds', 'initial_ur_tickets', 'initial_sp_tickets', 'initial_ur_pity',
+                 'initial_sp_pity', 'free_ur_tickets', 'free_sp_tickets', 'targeted_banners', 'daily_income')
+
+ACCEPT = 'accept'
+DOWNSCALE = 'downscale'
+QUEUE = 'queue'
+REJECT = 'reject'
+
+
+def _walk_plan(initial_diamonds, initial_ur_tickets, initial_sp_tickets, initial_ur_pity,
+               initial_sp_pity, free_ur_tickets, free_sp_tickets, targeted_banners, daily_income,
+               now=None):
+    """(step, expected pulls, most pulls affordable) for every banner of the plan.
+    
+    Each banner takes the pulls its target copies need on average, fewer
+    for pity already built up, or what the remaining budget affords if that
+    is less. The most affordable assumes nothing was spent on the banners
+    before, as some outcomes do.
+    """
+    plan = compile_plan(targeted_banners, free_ur_tickets, free_sp_tickets, daily_income, now)
+    diamonds = total_diamonds = initial_diamonds
+    tickets = {"UR": initial_ur_tickets, "SP": initial_sp_tickets}
+    total_tickets = dict(tickets)
+    pity = {"UR": initial_ur_pity, "SP": initial_sp_pity}
+    
+    for step in plan.steps:
+        banner_type = step['banner_type']
+        diamonds += step['total_diamonds_gained']
+        total_diamonds += step['total_diamonds_gained']
+        for key, gained in (("UR", step['free_ur_tickets_gained']), ("SP", step['free_sp_tickets_gained'])):
+            tickets[key] += gained
+            total_tickets[key] += gained
+        
+        needed = max(step['target_copies'] * PULLS_PER_COPY[banner_type] - pity[banner_type], 0)
+        pity[banner_type] = 0
+        banner_pulls = max(min(needed, tickets[banner_type] + diamonds // PULL_COST), 0)
+        tickets_used = min(tickets[banner_type], banner_pulls)
+        tickets[banner_type] -= tickets_used
+        diamonds -= (banner_pulls - tickets_used) * PULL_COST
+        yield step, banner_pulls, max(total_tickets[banner_type] + total_diamonds // PULL_COST, 0)
+
+
+def expected_pulls(*args, now=None):
+    """Expected pulls per simulation on every banner of the plan, in the order simulated,
+    for run_monte_carlo positional arguments without num_simulations"""
+    return [pulls for _, pulls, _ in _walk_plan(*args, now=now)]
+
+
+def exact_rows(walk):
+    """Outcomes the exact engine tracks for a _walk_plan, summed over banners.
+    
+    Every state entering a banner is followed for at most the pulls it can
+    afford or hard pity allows for its target copies. One start state ends
+    in one state per pull; once states differ, each pull adds the pity
+    values left behind. Counting stops at the banner where the engine would
+    fall back to NumPy.
+    """
+    states, rows = 1, 0
+    for i, (step, pulls, affordable) in enumerate(walk):
+        reach = min(affordable, step['target_copies'] * HARD_PITY)
+        if states * reach > EXACT_MAX_ROWS:
+            break  # The engine gives up here and samples with NumPy instead
+        rows += states * reach
+        if i == 0:
+            states += reach
+        else:
+            states += reach * (EXACT_MILESTONE_SPREAD if pulls >= MILESTONE_PULLS else EXACT_STATE_SPREAD)
+    return rows
+
+
+def banner_cost(engine):
+    return BANNER_COST.get(engine, BANNER_COST["numpy"])
+
+
+class CostEstimate:
+    """Predicted work of one run: units per simulation plus fixed units, in total and in seconds"""
+    
+    def __init__(self, engine, num_sims, banners, per_simulation, throughput, fixed=0):
+        self.engine = engine
+        self.num_sims = num_sims
+        self.banners = banners
+        self.per_simulation = per_simulation
+        self.throughput = throughput
+        self.fixed = fixed
+        self.units = per_simulation * num_sims + fixed
+        self.seconds = self.units / throughput
+    
+    def scaled(self, num_sims):
+        """The same plan with another number of simulations"""
+        return CostEstimate(self.engine, num_sims, self.banners, self.per_simulation, self.throughput,
+                            self.fixed)
+    
+    def to_dict(self):
+        return {'units': self.units, 'seconds': round(self.seconds, 3), 'simulations': self.num_sims}
+
+
+class CostModel:
+    """Cost estimates from expected pulls and per-engine throughput learned from observed runs"""
+    
+    def __init__(self, throughput=None):
+        self.throughput = dict(DEFAULT_THROUGHPUT, **(throughput or {}))
+        self._lock = threading.Lock()
+    
+    def _rate(self, engine):
+        return self.throughput.get(engine, self.throughput["numpy"])
+    
+    def estimate(self, args, engine='scalar', now=None):
+        """CostEstimate for run_monte_carlo positional arguments (num_simulations last).
+        
+        The exact engine is charged its tracked outcomes on top of a NumPy
+        run, which it falls back to when they grow too many.
+        """
+        walk = list(_walk_plan(*args[:-1], now=now))
+        pulls = [banner_pulls for _, banner_pulls, _ in walk]
+        per_simulation = len(pulls) * banner_cost(engine) + sum(pulls)
+        fixed = exact_rows(walk) * EXACT_ROW_COST if engine == 'exact' else 0
+        return CostEstimate(engine, args[-1], len(pulls), per_simulation, self._rate(engine), fixed)
+    
+    def estimate_batch(self, profile_args, num_sims):
+        """CostEstimate of simulating every plan in profile_args (run_monte_carlo positional
+        arguments without num_simulations) num_sims times with the NumPy engine"""
+        estimates = [self.estimate(tuple(args) + (num_sims,), 'numpy') for args in profile_args]
+        return CostEstimate('numpy', num_sims, sum(e.banners for e in estimates),
+                            sum(e.per_simulation for e in estimates), self._rate('numpy'))
+    
+    def estimate_sweep(self, args, sweep, full_statistics=False):
+        """CostEstimate of GachaSimulator.run_sweep.
+        
+        A sweep over diamonds and daily income only is one run that pulls
+        every target to the end, like solving for diamonds; any other sweep
+        is a full NumPy run at every grid point.
+        """
+        from sweep import BUDGET_PARAMETERS, expand_grid
+        
+        base = dict(zip(RUN_ARGUMENTS, args[:-1]))
+        grid = expand_grid(base, sweep)
+        if not full_statistics and all(axis['parameter'] in BUDGET_PARAMETERS for axis in sweep):
+            return self.estimate_solve(args, 'diamonds')
+        return self.estimate_batch([[arguments[name] for name in RUN_ARGUMENTS]
+                                    for _, arguments in grid], args[-1])
+    
+    def estimate_solve(self, args, solve_for='diamonds'):
+        """CostEstimate of GachaSimulator.solve_budget.
+        
+        Diamonds and daily income take one run that pulls every target to
+        the end. Copies bisect each banner's target between 0 and the
+        solver's limit, a run per step, estimated at the limit.
+        """
+        from solver import BudgetSolver
+        
+        args = list(args)
+        num_sims = args.pop()
+        if solve_for != 'copies':
+            args[0] = BudgetSolver.UNLIMITED_DIAMONDS
+            return self.estimate_batch([args], num_sims)
+        
+        targeted_banners = args[7]
+        limit = BudgetSolver.COPIES_LIMIT
+        # rate(0), then at most ceil(log2(limit + 1)) bisection steps
+        runs = 1 + limit.bit_length()
+        profile_args = []
+        for banner_name, _ in targeted_banners:
+            args[7] = [(name, limit if name == banner_name else copies) for name, copies in targeted_banners]
+            profile_args += [list(args)] * runs
+        return self.estimate_batch(profile_args, num_sims)
+    
+    def simulations_within(self, estimate, seconds=None, units=None):
+        """Most simulations of the estimated plan that fit in seconds and units"""
+        if not estimate.per_simulation:
+            # Nothing scales with the simulations, so the run fits whole or not at all
+            fits = not (seconds and estimate.seconds > seconds) and not (units and estimate.units > units)
+            return estimate.num_sims if fits else 0
+        limit = estimate.num_sims
+        if seconds:
+            available = seconds * self._rate(estimate.engine) - estimate.fixed
+            limit = min(limit, max(int(available / estimate.per_simulation), 0))
+        if units:
+            limit = min(limit, max(int((units - estimate.fixed) // estimate.per_simulation), 0))
+        return limit
+    
+    def observe(self, estimate, simulations, pulls, seconds):
+        """Record a finished run and return its actual cost in units.
+        
+        The throughput average follows predicted units per second, so it
+        also absorbs a systematic error of the pull estimate. The exact
+        engine does not count pulls and is left out.
+        """
+        actual = simulations * estimate.banners * banner_cost(estimate.engine) + pulls
+        if estimate.engine in self.throughput and seconds >= MIN_OBSERVED_SECONDS and simulations:
+            with self._lock:
+                current = self.throughput[estimate.engine]
+                rate = estimate.scaled(simulations).units / seconds
+                # One odd run (e.g. mostly served by the prefix cache) moves it by at most 2x
+                rate = min(max(rate, current / 2), current * 2)
+                self.throughput[estimate.engine] = current + THROUGHPUT_SMOOTHING * (rate - current)
+        return actual
+
+
+def admit(model, estimate, latency_budget=0, max_units=0, downscale=False, queue=False):
+    """How to serve a request: (decision, simulations).
+    
+    ACCEPT runs it as asked. Above the latency budget (seconds) or the
+    max_units cap, DOWNSCALE runs the most simulations that fit when the
+    client allows it, QUEUE hands it to the job queue when the client asked
+    for that and it is within the cap, and REJECT refuses it, with the most
+    simulations that would have fit. 0 disables a limit.
+    """
+    limit = model.simulations_within(estimate, latency_budget, max_units)
+    if limit >= estimate.num_sims:
+        return ACCEPT, estimate.num_sims
+    if downscale and limit >= min(MIN_DOWNSCALED_SIMS, estimate.num_sims):
+        return DOWNSCALE, limit
+    if queue and (not max_units or estimate.units <= max_units):
+        return QUEUE, estimate.num_sims
+    return REJECT, limit
+
+
+class TokenBucket:
+    """rate units per second, up to capacity.
+    
+    A request takes its whole cost once the bucket holds min(cost,
+    capacity), leaving the bucket in debt if it costs more, so clients are
+    throttled in proportion to the work they ask for.
+    """
+    
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+    
+    def take(self, amount, now):
+        """Take amount and return 0, or the seconds until it can be taken"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        required = min(amount, self.capacity)
+        if self.tokens < required:
+            return (required - self.tokens) / self.rate
+        self.tokens -= amount
+        return 0.0
+
+
+class RateLimiter:
+    """One TokenBucket per client, for the most recently seen max_clients clients"""
+    
+    def __init__(self, rate, burst, max_clients=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @property
+    def enabled(self):
+        return self.rate > 0
+    
+    def take(self, client, amount):
+        """0 when the client may spend amount units now, else seconds to wait"""
+        if not self.enabled:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = TokenBucket(self.rate, self.burst, now)
+                # Forgotten clients start again with a full bucket
+                while len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+            return bucket.take(amount, now)
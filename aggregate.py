@@ -0,0 +1,288 @@
+from statistics import NormalDist
+
+import numpy as np
+
+
+class Histogram:
+    """Exact counts of integer values, stored as sorted (values, counts) arrays.
+    
+    Memory grows with the number of distinct values, which is bounded by the
+    pull and resource ranges of a plan, not with the number of simulations.
+    """
+    
+    def __init__(self):
+        self.values = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+    
+    @property
+    def total(self):
+        return int(self.counts.sum())
+    
+    def add(self, values, count=1):
+        """Count an array of values, or a single value count times"""
+        values = np.asarray(values, dtype=np.int64)
+        if values.ndim == 0:
+            self._merge(values.reshape(1), np.array([count], dtype=np.int64))
+            return
+        if values.size == 0:
+            return
+        
+        low = int(values.min())
+        span = int(values.max()) - low + 1
+        if span <= 4 * values.size:
+            # Dense enough for a direct bincount
+            counts = np.bincount(values - low, minlength=span)
+            present = np.flatnonzero(counts)
+            self._merge(present + low, counts[present])
+        else:
+            unique_values, counts = np.unique(values, return_counts=True)
+            self._merge(unique_values, counts)
+    
+    def merge(self, other):
+        self._merge(other.values, other.counts)
+    
+    def _merge(self, values, counts):
+        if self.values.size == 0:
+            self.values = values.astype(np.int64, copy=True)
+            self.counts = counts.astype(np.int64, copy=True)
+            return
+        
+        all_values = np.concatenate([self.values, values])
+        all_counts = np.concatenate([self.counts, counts])
+        self.values, inverse = np.unique(all_values, return_inverse=True)
+        self.counts = np.zeros(len(self.values), dtype=np.int64)
+        np.add.at(self.counts, inverse.ravel(), all_counts)
+    
+    def mean(self):
+        return float(np.dot(self.values, self.counts) / self.total)
+    
+    def percentile(self, q):
+        """Same result as np.percentile on the raw values (linear interpolation)"""
+        position = (self.total - 1) * q / 100
+        lower = int(np.floor(position))
+        cumulative = np.cumsum(self.counts)
+        below = self.values[np.searchsorted(cumulative, lower, side='right')]
+        above = self.values[np.searchsorted(cumulative, min(lower + 1, self.total - 1), side='right')]
+        return float(below + (position - lower) * (above - below))
+    
+    def smallest_covering(self, fraction):
+        """Smallest value v such that at least fraction of the counts are <= v"""
+        cumulative = np.cumsum(self.counts)
+        needed = max(1, int(np.ceil(fraction * self.total - 1e-9)))
+        return int(self.values[np.searchsorted(cumulative, needed)])
+    
+    def fraction_at_most(self, value):
+        """Fraction of the counts at or below value"""
+        return float(self.counts[self.values <= value].sum() / self.total)
+
+
+def histogram_mean(histogram):
+    return histogram.mean()
+
+
+def histogram_percentile(histogram, q):
+    return histogram.percentile(q)
+
+
+def wilson_interval(successes, num_sims, confidence=0.95):
+    """Wilson score interval for a success rate, in percent"""
+    if num_sims == 0:
+        return 0.0, 100.0
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    p = successes / num_sims
+    denominator = 1 + z * z / num_sims
+    center = (p + z * z / (2 * num_sims)) / denominator
+    half_width = z * np.sqrt(p * (1 - p) / num_sims + z * z / (4 * num_sims * num_sims)) / denominator
+    return float(max(0.0, center - half_width) * 100), float(min(1.0, center + half_width) * 100)
+
+
+class SimulationResults:
+    """Per-simulation banner results as one structured array.
+    
+    values has one row per simulation and one column per plan step and only
+    holds what varies between simulations. The per-banner constants (name,
+    dates, tag, income and free tickets) live once in steps, the compiled
+    plan step dicts.
+    """
+    
+    DTYPE = np.dtype([
+        ('success', bool),
+        ('total_pulls', np.int64),
+        ('diamonds_spent', np.int64),
+        ('tickets_used', np.int64),
+        ('milestone_tickets', np.int64),
+        ('milestone_copies', np.int64),
+        ('copies_obtained', np.int64),
+        ('remaining_diamonds', np.int64),
+        ('remaining_ur_tickets', np.int64),
+        ('remaining_sp_tickets', np.int64),
+        ('remaining_ur_pity', np.int64),
+        ('remaining_sp_pity', np.int64),
+    ])
+    
+    def __init__(self, steps, values):
+        self.steps = steps
+        self.values = values
+    
+    def __len__(self):
+        return self.values.shape[0]
+    
+    @property
+    def success(self):
+        """Whether each simulation reached every target"""
+        return self.values['success'].all(axis=1)
+
+
+class BannerAccumulator:
+    """Running per-banner counters and histograms"""
+    
+    # Per-simulation integer values kept as histograms
+    METRICS = (
+        'total_pulls', 'diamonds_spent', 'tickets_used',
+        'remaining_diamonds', 'remaining_ur_tickets', 'remaining_sp_tickets',
+        'total_diamonds_gained', 'free_ur_tickets_gained', 'free_sp_tickets_gained',
+        'milestone_tickets_gained', 'milestone_copies', 'base_copies'
+    )
+    
+    def __init__(self, start_date, end_date, duration_days, banner_tag):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.duration_days = duration_days
+        self.banner_tag = banner_tag
+        self.success_count = 0
+        self.histograms = {metric: Histogram() for metric in self.METRICS}
+    
+    def add(self, success, values):
+        """Add one chunk: success is a bool array, values maps metric to an array or a constant"""
+        num_sims = len(success)
+        self.success_count += int(np.count_nonzero(success))
+        for metric in self.METRICS:
+            self.histograms[metric].add(values[metric], num_sims)
+    
+    def merge(self, other):
+        self.success_count += other.success_count
+        for metric in self.METRICS:
+            self.histograms[metric].merge(other.histograms[metric])
+    
+    def stats(self):
+        """Banner stats in the layout GachaSimulator._build_analysis expects"""
+        stats = dict(self.histograms)
+        stats.update({
+            'success_count': self.success_count,
+            'start_date': self.start_date,
+            'end_date': self.end_date,
+            'duration_days': self.duration_days,
+            'banner_tag': self.banner_tag
+        })
+        return stats
+
+
+class ResultAggregator:
+    """Consumes simulations chunk by chunk, keeping only counters and histograms"""
+    
+    def __init__(self):
+        self.num_sims = 0
+        self.success_count = 0
+        self.banners = {}
+        
+        # Simulations and successes per replicate group under variance-reduced
+        # sampling (see sampling.py), one array per chunk
+        self.replicate_sizes = []
+        self.replicate_successes = []
+        self._replicate_ids = None
+    
+    def track_replicates(self, replicate_ids):
+        """Also count the next add_success per replicate group, replicate_ids giving each simulation's group"""
+        self._replicate_ids = replicate_ids
+    
+    def add_success(self, sim_success):
+        self.num_sims += len(sim_success)
+        self.success_count += int(np.count_nonzero(sim_success))
+        if self._replicate_ids is not None:
+            self.replicate_sizes.append(np.bincount(self._replicate_ids))
+            self.replicate_successes.append(np.bincount(self._replicate_ids, weights=sim_success))
+            self._replicate_ids = None
+    
+    def add_banner(self, step, success, values):
+        """Add one chunk of results for a compiled plan step"""
+        name = step['banner_name']
+        if name not in self.banners:
+            self.banners[name] = BannerAccumulator(
+                step['start_date'], step['end_date'], step['duration_days'], step['banner_tag']
+            )
+        values = dict(values)
+        for constant in ('total_diamonds_gained', 'free_ur_tickets_gained', 'free_sp_tickets_gained'):
+            if constant not in values:
+                values[constant] = step[constant]
+        self.banners[name].add(success, values)
+    
+    def add_simulation_results(self, results):
+        """Add a SimulationResults chunk, one column of values per banner"""
+        self.add_success(results.success)
+        for k, step in enumerate(results.steps):
+            column = results.values[:, k]
+            self.add_banner(step, column['success'], {
+                'total_pulls': column['total_pulls'],
+                'diamonds_spent': column['diamonds_spent'],
+                'tickets_used': column['tickets_used'],
+                'remaining_diamonds': column['remaining_diamonds'],
+                'remaining_ur_tickets': column['remaining_ur_tickets'],
+                'remaining_sp_tickets': column['remaining_sp_tickets'],
+                'milestone_tickets_gained': column['milestone_tickets'],
+                'milestone_copies': column['milestone_copies'],
+                'base_copies': column['copies_obtained'] - column['milestone_copies']
+            })
+    
+    def add_results(self, results):
+        """Add a chunk of per-simulation result dicts in the older list layout"""
+        self.add_success(np.array([r['success'] for r in results], dtype=bool))
+        
+        per_banner = {}
+        for result in results:
+            for banner_result in result['banner_results']:
+                per_banner.setdefault(banner_result['banner_name'], []).append(banner_result)
+        
+        for name, banner_results in per_banner.items():
+            first = banner_results[0]
+            step = {
+                'banner_name': name,
+                'start_date': first['banner_start_date'],
+                'end_date': first['banner_end_date'],
+                'duration_days': first['banner_duration_days'],
+                'banner_tag': first['banner_tag']
+            }
+            values = {
+                metric: np.array([r[metric] for r in banner_results], dtype=np.int64)
+                for metric in BannerAccumulator.METRICS if metric != 'base_copies'
+            }
+            values['base_copies'] = np.array(
+                [r['copies_obtained'] - r['milestone_copies'] for r in banner_results], dtype=np.int64
+            )
+            success = np.array([r['success'] for r in banner_results], dtype=bool)
+            self.add_banner(step, success, values)
+    
+    def merge(self, other):
+        self.num_sims += other.num_sims
+        self.success_count += other.success_count
+        self.replicate_sizes.extend(other.replicate_sizes)
+        self.replicate_successes.extend(other.replicate_successes)
+        for name, banner in other.banners.items():
+            if name in self.banners:
+                self.banners[name].merge(banner)
+            else:
+                self.banners[name] = banner
+    
+    def total_pulls(self):
+        """Pulls made across every simulation and banner"""
+        return sum(int(np.dot(banner.histograms['total_pulls'].values, banner.histograms['total_pulls'].counts))
+                   for banner in self.banners.values())
+    
+    def banner_stats(self):
+        return {name: banner.stats() for name, banner in self.banners.items()}
+    
+    def success_intervals(self, confidence=0.95):
+        """Wilson intervals for the overall and every per-banner success rate"""
+        intervals = {'overall': wilson_interval(self.success_count, self.num_sims, confidence)}
+        for name, banner in self.banners.items():
+            intervals[name] = wilson_interval(banner.success_count, self.num_sims, confidence)
+        return intervals
@@ -1,79 +1,837 @@
-from flask import Flask, request, jsonify, send_file, send_from_directory
+import time
+_import_start = time.perf_counter()
+
+from flask import Flask, Response, g, has_request_context, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
+from werkzeug.security import safe_join
 import sys
 import os
+import json
+import tempfile
+import uuid
+import math
+import cProfile
+from datetime import date, datetime
 
-# Import the GachaSimulator from your main.py
-from main import GachaSimulator
+# GachaSimulator (and with it NumPy) is imported on first use, see new_simulator
+from banners import current_schedule
+from cache import PrefixCache, ResultCache, canonical_key
+from metrics import MetricsRegistry, PhaseTimer
 
 app = Flask(__name__)
 CORS(app)
 
+# Processes used to split large simulation runs
+SIM_WORKERS = int(os.environ.get('SIM_WORKERS', 1))
+
+# Results of recent /simulate requests, optionally persisted to SIM_CACHE_DIR
+result_cache = ResultCache(
+    max_entries=int(os.environ.get('SIM_CACHE_SIZE', 256)),
+    ttl=int(os.environ.get('SIM_CACHE_TTL', 3600)),
+    disk_dir=os.environ.get('SIM_CACHE_DIR')
+)
+
+# Per-banner simulation state of recent runs, so edits to the end of a plan
+# only simulate the changed banners (0 disables it), at most SIM_PREFIX_CACHE_MB
+SIM_PREFIX_CACHE_SIZE = int(os.environ.get('SIM_PREFIX_CACHE_SIZE', 16))
+SIM_PREFIX_CACHE_MB = int(os.environ.get('SIM_PREFIX_CACHE_MB', 64))
+prefix_cache = PrefixCache(
+    max_entries=SIM_PREFIX_CACHE_SIZE, max_bytes=SIM_PREFIX_CACHE_MB * 1024 * 1024
+) if SIM_PREFIX_CACHE_SIZE else None
+
+# Requests above this many simulations must go through /jobs (0 means no limit)
+SIM_INLINE_MAX_SIMS = int(os.environ.get('SIM_INLINE_MAX_SIMS', 0))
+
+# Background jobs, created on first use
+job_queue = None
+
+# Seconds a /simulate, sweep, solve or batch request may be estimated to
+# take (0 means no limit); costlier ones are downscaled, queued or rejected,
+# see admission.admit. Streams report progress and get a longer budget.
+SIM_LATENCY_BUDGET = float(os.environ.get('SIM_LATENCY_BUDGET', 10))
+SIM_STREAM_LATENCY_BUDGET = float(os.environ.get('SIM_STREAM_LATENCY_BUDGET', 60))
+
+# Largest estimated cost of any run, in pull-equivalents (0 means no limit);
+# the default is about what the NumPy engine does in the 600s job time limit
+SIM_MAX_COST = float(os.environ.get('SIM_MAX_COST', 1.2e11))
+
+# Per-client token bucket in pull-equivalents per second, with SIM_RATE_BURST
+# as the bucket size (a rate of 0 disables rate limiting)
+SIM_RATE_LIMIT = float(os.environ.get('SIM_RATE_LIMIT', 0))
+SIM_RATE_BURST = float(os.environ.get('SIM_RATE_BURST', SIM_RATE_LIMIT * 60))
+
+# Reverse proxies in front of the app, so the client address comes from X-Forwarded-For
+SIM_PROXY_COUNT = int(os.environ.get('SIM_PROXY_COUNT', 0))
+if SIM_PROXY_COUNT:
+    from werkzeug.middleware.proxy_fix import ProxyFix
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=SIM_PROXY_COUNT)
+
+# Cost estimates and per-client budgets, created on first use
+cost_model = None
+rate_limiter = None
+
+# Request and phase timings served at /metrics
+metrics = MetricsRegistry()
+
+# Setting this allows per-request cProfile captures ("profile": true), written here
+SIM_PROFILE_DIR = os.environ.get('SIM_PROFILE_DIR')
+
+# Seconds spent importing this module, the simulator and warming up, for /warmup
+startup_timings = {}
+_simulator_class = None
+
+def new_simulator(engine='scalar', sampling=None):
+    """Create a GachaSimulator, importing the simulation modules on first use.
+    
+    Keeps NumPy out of cold starts that only serve pages or cached results.
+    """
+    global _simulator_class
+    if _simulator_class is None:
+        start = time.perf_counter()
+        from main import GachaSimulator
+        _simulator_class = GachaSimulator
+        startup_timings['simulator_import'] = time.perf_counter() - start
+        if has_request_context():
+            g.timer.phases['import'] = startup_timings['simulator_import']
+    return _simulator_class(engine=engine, sampling=sampling)
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+    g.timer = PhaseTimer()
+
+@app.after_request
+def record_timing(response):
+    """Add a Server-Timing header and record the request in the metrics"""
+    total = time.perf_counter() - g.request_start
+    timer = g.timer
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    response.headers['Server-Timing'] = timer.server_timing(total)
+    
+    metrics.observe('gacha_request_seconds', total, help_text='Request latency',
+                    endpoint=endpoint, status=response.status_code)
+    for phase, seconds in timer.phases.items():
+        metrics.observe('gacha_phase_seconds', seconds, help_text='Time per request phase',
+                        endpoint=endpoint, phase=phase)
+    if timer.counters.get('simulations'):
+        metrics.inc('gacha_simulations_total', timer.counters['simulations'],
+                    help_text='Simulations run', endpoint=endpoint)
+        metrics.inc('gacha_pulls_total', timer.counters.get('pulls', 0),
+                    help_text='Pulls simulated', endpoint=endpoint)
+        simulate_seconds = timer.phases.get('simulate')
+        if simulate_seconds:
+            metrics.set_max('gacha_simulations_per_second_max', timer.counters['simulations'] / simulate_seconds,
+                            help_text='Best simulation throughput seen', endpoint=endpoint)
+    if not response.is_streamed:
+        size = response.calculate_content_length() or 0
+        metrics.observe('gacha_response_bytes', size, buckets=MetricsRegistry.SIZE_BUCKETS,
+                        help_text='Response body size', endpoint=endpoint)
+        metrics.set_max('gacha_response_bytes_max', size, help_text='Largest response body', endpoint=endpoint)
+    return response
+
+def profile_requested(data):
+    """Profiling is opt-in per request and only allowed when SIM_PROFILE_DIR is set"""
+    return bool(SIM_PROFILE_DIR) and bool(request.args.get('profile') or data.get('profile'))
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
+
+# index.html and its compressed variants, loaded on the first request
+index_page = None
+
+# Fingerprinted asset URLs never change content, anything else revalidates hourly
+IMMUTABLE_MAX_AGE = 31536000
+ASSET_MAX_AGE = 3600
+
+# Content hash of each served asset by path, with the mtime it was computed at
+asset_fingerprints = {}
+
+def asset_fingerprint(filename):
+    """Content hash of an asset as written into ASSET_VERSIONS, None if there is no such file"""
+    from static_assets import content_hash
+    path = safe_join(ASSETS_DIR, filename)
+    if path is None or not os.path.isfile(path):
+        return None
+    mtime = os.stat(path).st_mtime
+    cached = asset_fingerprints.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, 'rb') as f:
+            cached = asset_fingerprints[path] = (mtime, content_hash(f.read()))
+    return cached[1]
+
 @app.route('/')
 def index():
-    return send_file('index.html')
+    """index.html, precompressed when the client accepts it, with ETag revalidation"""
+    global index_page
+    if index_page is None:
+        from static_assets import INDEX_PATH, StaticPage
+        index_page = StaticPage(INDEX_PATH)
+    elif app.debug:
+        index_page.reload_if_changed()
+    
+    body, encoding, etag = index_page.variant(request.accept_encodings)
+    response = Response(body, mimetype='text/html')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    response.set_etag(etag)
+    return response.make_conditional(request)
 
 @app.route('/assets/<path:filename>')
 def serve_assets(filename):
-    """Serve files from the assets directory"""
-    try:
-        assets_path = os.path.join(os.getcwd(), 'assets')
-        print(f"Attempting to serve: {filename}")
-        print(f"From path: {assets_path}")
-        print(f"Full path: {os.path.join(assets_path, filename)}")
-        print(f"File exists: {os.path.exists(os.path.join(assets_path, filename))}")
-        return send_from_directory(assets_path, filename)
-    except Exception as e:
-        print(f"Error serving asset {filename}: {str(e)}")
-        return str(e), 404
+    """Serve files from the assets directory, immutable when requested by content hash"""
+    # Only a URL naming the current content may be cached forever, a stale
+    # or made-up version would otherwise pin whatever the file holds now
+    version = request.args.get('v')
+    versioned = version is not None and version == asset_fingerprint(filename)
+    response = send_from_directory(ASSETS_DIR, filename,
+                                   max_age=IMMUTABLE_MAX_AGE if versioned else ASSET_MAX_AGE)
+    if versioned:
+        response.cache_control.immutable = True
+    return response
+
+def parse_simulation_request(data):
+    """Map a /simulate request body onto GachaSimulator.run_monte_carlo arguments"""
+    diamonds = data.get('diamonds', 0)
+    ur_tickets = data.get('ur_tickets', 0)
+    sp_tickets = data.get('sp_tickets', 0)
+    ur_pity = data.get('ur_pity', 0)
+    sp_pity = data.get('sp_pity', 0)
+    free_ur = data.get('free_ur', 0)
+    free_sp = data.get('free_sp', 0)
+    daily_income = data.get('daily_income', 0)
+    num_sims = data.get('num_sims', 10000)
+    
+    # Optional early stopping: precision is the target confidence interval
+    # half-width in percentage points, max_sims caps the simulations run
+    precision = data.get('precision')
+    if precision is not None:
+        num_sims = data.get('max_sims', num_sims)
+    
+    # Convert targeted banners to the format expected by the simulator
+    targeted_banners = [(b['name'], b['copies']) for b in data.get('targeted_banners', [])]
+    
+    args = (diamonds, ur_tickets, sp_tickets, ur_pity, sp_pity,
+            free_ur, free_sp, targeted_banners, daily_income, num_sims)
+    kwargs = {
+        'seed': data.get('seed'),
+        'workers': SIM_WORKERS,
+        'target_precision': precision,
+        'confidence': data.get('confidence', 0.95),
+        'prefix_cache': prefix_cache,
+        'histograms': bool(data.get('histograms'))
+    }
+    return args, kwargs
+
+
+def serialize_results(results):
+    """Convert datetime objects to strings and histogram arrays to lists for JSON serialization"""
+    for banner_name, banner_stats in results['banner_statistics'].items():
+        if banner_stats.get('start_date'):
+            banner_stats['start_date'] = banner_stats['start_date'].strftime('%Y-%m-%d')
+        if banner_stats.get('end_date'):
+            banner_stats['end_date'] = banner_stats['end_date'].strftime('%Y-%m-%d')
+        for histogram in banner_stats.get('histograms', {}).values():
+            for key, values in histogram.items():
+                histogram[key] = values.tolist()
+    return results
+
+
+def result_response(results, response_format):
+    """Response in the negotiated format: JSON, or one of the binary formats in formats.py"""
+    import formats
+    if response_format == formats.JSON:
+        return jsonify(results)
+    return Response(formats.encode(results, response_format), mimetype=response_format)
+
+
+# Buckets of the actual over predicted cost ratio
+COST_RATIO_BUCKETS = (0.25, 0.5, 0.8, 0.9, 1.1, 1.25, 2, 4)
+
+def get_admission():
+    """The cost model and rate limiter, created on first use (they need the plan compiler and NumPy)"""
+    global cost_model, rate_limiter
+    if cost_model is None:
+        from admission import CostModel, RateLimiter
+        cost_model = CostModel()
+        rate_limiter = RateLimiter(SIM_RATE_LIMIT, SIM_RATE_BURST)
+    return cost_model, rate_limiter
+
+
+def estimate_cost(data, args):
+    """admission.CostEstimate of a request, from its parse_simulation_request arguments"""
+    return get_admission()[0].estimate(args, data.get('engine', 'scalar'))
+
+
+def admit_request(data, estimate, latency_budget=None, can_queue=False):
+    """Admission decision for an estimated run, charged to the client's token bucket.
+    
+    Runs are held to latency_budget (SIM_LATENCY_BUDGET unless given, 0 for
+    jobs) and downscaled when the body sets "downscale", or queued as a job
+    when the client sends Prefer: respond-async and can_queue; every run is
+    held to SIM_MAX_COST. Returns (decision, estimate of what will run,
+    error response or None).
+    """
+    from admission import DOWNSCALE, REJECT, admit
+    model, limiter = get_admission()
+    if latency_budget is None:
+        latency_budget = SIM_LATENCY_BUDGET
+    decision, num_sims = admit(
+        model, estimate, latency_budget, SIM_MAX_COST,
+        downscale=bool(latency_budget) and bool(data.get('downscale')),
+        queue=can_queue and 'respond-async' in request.headers.get('Prefer', '')
+    )
+    if decision == REJECT:
+        over_cap = SIM_MAX_COST and estimate.units > SIM_MAX_COST
+        if over_cap:
+            reason = f"Estimated cost of {estimate.units:.3g} pull-equivalents exceeds the limit of {SIM_MAX_COST:.3g}"
+        else:
+            reason = f"Estimated {estimate.seconds:.1f}s of simulation exceeds the {latency_budget:g}s budget"
+        if not num_sims and estimate.fixed:
+            # Exact engine: fewer simulations would not make it any cheaper
+            hint = 'the state space of this plan is too large for the exact engine, send "engine": "numpy"'
+            if not over_cap:
+                hint += ' or submit it to /jobs' if not can_queue else ' or "Prefer: respond-async" to queue it as a job'
+        else:
+            hint = f"at most {num_sims} simulations fit"
+            if latency_budget and num_sims:
+                hint += ', send "downscale": true to run that many'
+            if can_queue:
+                hint += ' or "Prefer: respond-async" to queue it as a job'
+        return decision, estimate, (jsonify({
+            'error': f"{reason}; {hint}", 'estimate': estimate.to_dict(), 'max_simulations': num_sims
+        }), 413)
+    
+    if decision == DOWNSCALE:
+        estimate = estimate.scaled(num_sims)
+    retry_after = limiter.take(request.remote_addr, estimate.units)
+    if retry_after:
+        response = jsonify({
+            'error': f"Rate limit exceeded, retry in {math.ceil(retry_after)}s", 'estimate': estimate.to_dict()
+        })
+        response.headers['Retry-After'] = str(math.ceil(retry_after))
+        return decision, estimate, (response, 429)
+    return decision, estimate, None
+
+
+def record_cost(estimate, timer):
+    """Log the predicted against the actual cost of a finished run and update the throughput average"""
+    if 'pulls' not in timer.counters:
+        return  # The exact engine counts no pulls
+    simulations = timer.counters.get('simulations', 0)
+    seconds = timer.phases.get('simulate', 0.0)
+    model, _ = get_admission()
+    actual = model.observe(estimate, simulations, timer.counters['pulls'], seconds)
+    predicted = estimate.scaled(simulations)
+    
+    metrics.inc('gacha_cost_predicted_total', predicted.units,
+                help_text='Predicted cost of simulation runs in pull-equivalents', engine=estimate.engine)
+    metrics.inc('gacha_cost_actual_total', actual,
+                help_text='Actual cost of simulation runs in pull-equivalents', engine=estimate.engine)
+    if predicted.units:
+        metrics.observe('gacha_cost_ratio', actual / predicted.units, buckets=COST_RATIO_BUCKETS,
+                        help_text='Actual over predicted cost per run', engine=estimate.engine)
+    print(f"cost engine={estimate.engine} simulations={simulations} predicted_units={predicted.units} "
+          f"actual_units={actual} predicted_seconds={predicted.seconds:.3f} seconds={seconds:.3f}",
+          file=sys.stderr)
+
 
 @app.route('/simulate', methods=['POST'])
 def simulate():
     try:
+        import formats
         data = request.json
+        timer = g.timer
+        profiling = profile_requested(data)
         
-        diamonds = data.get('diamonds', 0)
-        ur_tickets = data.get('ur_tickets', 0)
-        sp_tickets = data.get('sp_tickets', 0)
-        ur_pity = data.get('ur_pity', 0)
-        sp_pity = data.get('sp_pity', 0)
-        free_ur = data.get('free_ur', 0)
-        free_sp = data.get('free_sp', 0)
-        daily_income = data.get('daily_income', 0)
-        num_sims = data.get('num_sims', 10000)
+        # Binary formats always carry the full histograms, JSON only when asked for
+        response_format = request.accept_mimetypes.best_match(formats.available_formats(), default=formats.JSON)
+        if response_format != formats.JSON:
+            data = dict(data, histograms=True)
+        
+        # Identical plans submitted on the same day reuse the earlier result
+        # (profiled requests always simulate)
+        with timer.phase('cache'):
+            cache_key = canonical_key(data)
+            cached = None if profiling else result_cache.get(cache_key)
+        if cached is not None:
+            with timer.phase('serialize'):
+                response = result_response(cached, response_format)
+            response.headers['X-Cache'] = 'HIT'
+            return response
+        
+        args, kwargs = parse_simulation_request(data)
+        if SIM_INLINE_MAX_SIMS and args[-1] > SIM_INLINE_MAX_SIMS:
+            return jsonify({
+                'error': f"num_sims above {SIM_INLINE_MAX_SIMS} must be submitted to /jobs"
+            }), 413
         
-        # Convert targeted banners to the format expected by the simulator
-        targeted_banners = [(b['name'], b['copies']) for b in data.get('targeted_banners', [])]
+        # Predict the work before doing it: run, downscale, queue or refuse
+        with timer.phase('admission'):
+            decision, estimate, error = admit_request(data, estimate_cost(data, args), can_queue=True)
+        if error:
+            return error
+        from admission import DOWNSCALE, QUEUE
+        if decision == QUEUE:
+            response, status = submit_job(data, args[-1])
+            response.headers['Preference-Applied'] = 'respond-async'
+            return response, status
+        requested_simulations = args[-1]
+        if decision == DOWNSCALE:
+            # The result's total_simulations tells the client how many ran
+            args = args[:-1] + (estimate.num_sims,)
         
         # Create simulator and run
-        sim = GachaSimulator()
-        results = sim.run_monte_carlo(
-            diamonds, 
-            ur_tickets, 
-            sp_tickets, 
-            ur_pity, 
-            sp_pity,
-            free_ur, 
-            free_sp, 
-            targeted_banners, 
-            daily_income, 
-            num_sims
-        )
+        sim = new_simulator(data.get('engine', 'scalar'), data.get('sampling'))
+        profiler = cProfile.Profile() if profiling else None
+        if profiler:
+            profiler.enable()
+        try:
+            results = sim.run_monte_carlo(*args, timer=timer, **kwargs)
+        finally:
+            if profiler:
+                profiler.disable()
+        record_cost(estimate, timer)
+        if estimate.num_sims != requested_simulations:
+            results['requested_simulations'] = requested_simulations
+        
+        with timer.phase('serialize'):
+            results = serialize_results(results)
+            response = result_response(results, response_format)
+        result_cache.set(cache_key, results)
+        
+        response.headers['X-Cache'] = 'MISS'
+        if profiler:
+            os.makedirs(SIM_PROFILE_DIR, exist_ok=True)
+            profile_name = f"simulate-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.prof"
+            profiler.dump_stats(os.path.join(SIM_PROFILE_DIR, profile_name))
+            response.headers['X-Profile'] = profile_name
+        return response
+    
+    except Exception as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/simulate/sweep', methods=['POST'])
+def simulate_sweep():
+    """Evaluate a plan over a grid of one or two parameters with common random numbers"""
+    data = request.json
+    try:
+        # canonical_key ignores the sweep itself, so it is appended
+        full_statistics = bool(data.get('full_statistics'))
+        cache_key = ('sweep:' + canonical_key(data) + json.dumps(data.get('sweep'), sort_keys=True)
+                     + (':full' if full_statistics else ''))
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            response = jsonify(cached)
+            response.headers['X-Cache'] = 'HIT'
+            return response
+        
+        args, kwargs = parse_simulation_request(data)
+        sweep = data.get('sweep') or []
         
-        # Convert datetime objects to strings for JSON serialization
-        for banner_name, banner_stats in results['banner_statistics'].items():
-            if banner_stats.get('start_date'):
-                banner_stats['start_date'] = banner_stats['start_date'].strftime('%Y-%m-%d')
-            if banner_stats.get('end_date'):
-                banner_stats['end_date'] = banner_stats['end_date'].strftime('%Y-%m-%d')
+        with g.timer.phase('admission'):
+            try:
+                estimate = get_admission()[0].estimate_sweep(args, sweep, full_statistics)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            _, estimate, error = admit_request(data, estimate)
+        if error:
+            return error
         
+        sim = new_simulator('numpy')
+        try:
+            results = sim.run_sweep(*args[:-1], sweep, num_simulations=estimate.num_sims,
+                                    seed=kwargs['seed'], full_statistics=full_statistics)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if estimate.num_sims != args[-1]:
+            results['requested_simulations'] = args[-1]
+        
+        for point in results['points']:
+            if 'banner_statistics' in point:
+                serialize_results(point)
+        result_cache.set(cache_key, results)
+        
+        response = jsonify(results)
+        response.headers['X-Cache'] = 'MISS'
+        return response
+    
+    except Exception as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+# Most profiles accepted by one /simulate/batch request
+MAX_BATCH_PROFILES = int(os.environ.get('SIM_MAX_BATCH_PROFILES', 100))
+
+@app.route('/simulate/batch', methods=['POST'])
+def simulate_batch():
+    """Simulate many player profiles together, e.g. a whole guild.
+    
+    The body holds a profiles list with the /simulate fields of each member
+    (plus an optional id). Fields set next to profiles apply to every
+    profile that does not set them.
+    """
+    data = request.json
+    try:
+        shared = {key: value for key, value in data.items() if key != 'profiles'}
+        profiles_data = [dict(shared, **profile) for profile in data.get('profiles') or []]
+        if not profiles_data or len(profiles_data) > MAX_BATCH_PROFILES:
+            return jsonify({'error': f"profiles must hold 1 to {MAX_BATCH_PROFILES} entries"}), 400
+        
+        cache_key = 'batch:' + json.dumps([canonical_key(profile) for profile in profiles_data])
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            response = jsonify(cached)
+            response.headers['X-Cache'] = 'HIT'
+            return response
+        
+        profiles = []
+        for i, profile_data in enumerate(profiles_data):
+            args, _ = parse_simulation_request(profile_data)
+            names = [name for name, _ in args[7]]
+            if len(set(names)) != len(names):
+                return jsonify({'error': f"Profile {i} targets the same banner more than once"}), 400
+            profiles.append(dict(zip((
+                'initial_diamonds', 'initial_ur_tickets', 'initial_sp_tickets', 'initial_ur_pity',
+                'initial_sp_pity', 'free_ur_tickets', 'free_sp_tickets', 'targeted_banners', 'daily_income'
+            ), args[:-1])))
+        num_sims = data.get('num_sims', 10000)
+        if SIM_INLINE_MAX_SIMS and num_sims > SIM_INLINE_MAX_SIMS:
+            return jsonify({
+                'error': f"num_sims above {SIM_INLINE_MAX_SIMS} must be submitted to /jobs"
+            }), 413
+        
+        with g.timer.phase('admission'):
+            _, estimate, error = admit_request(data, get_admission()[0].estimate_batch(
+                [list(profile.values()) for profile in profiles], num_sims
+            ))
+        if error:
+            return error
+        requested_simulations, num_sims = num_sims, estimate.num_sims
+        
+        sim = new_simulator('numpy')
+        with g.timer.phase('simulate'):
+            results = sim.run_batch(profiles, num_simulations=num_sims, seed=data.get('seed'), workers=SIM_WORKERS)
+        g.timer.count('simulations', num_sims * len(profiles))
+        
+        for profile_data, profile_results in zip(profiles_data, results['profiles']):
+            serialize_results(profile_results)
+            profile_results['id'] = profile_data.get('id')
+        if num_sims != requested_simulations:
+            results['requested_simulations'] = requested_simulations
+        result_cache.set(cache_key, results)
+        
+        response = jsonify(results)
+        response.headers['X-Cache'] = 'MISS'
+        return response
+    
+    except Exception as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/simulate/solve', methods=['POST'])
+def simulate_solve():
+    """Minimum diamonds or daily income, or maximum copies, for a target success rate"""
+    data = request.json
+    try:
+        args, kwargs = parse_simulation_request(data)
+        try:
+            target_success_rate = float(data.get('target_success_rate', 90))
+        except (TypeError, ValueError):
+            target_success_rate = None
+        if target_success_rate is None or not 0 < target_success_rate <= 100:
+            return jsonify({'error': 'target_success_rate must be a percentage above 0 and at most 100'}), 400
+        
+        solve_for = data.get('solve_for', 'diamonds')
+        with g.timer.phase('admission'):
+            _, estimate, error = admit_request(data, get_admission()[0].estimate_solve(args, solve_for))
+        if error:
+            return error
+        
+        sim = new_simulator('numpy')
+        try:
+            results = sim.solve_budget(
+                *args[:-1], target_success_rate,
+                solve_for=solve_for, num_simulations=estimate.num_sims, seed=kwargs['seed']
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if estimate.num_sims != args[-1]:
+            results['requested_simulations'] = args[-1]
         return jsonify(results)
+    
+    except Exception as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+def sse_event(event, payload):
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+@app.route('/simulate/stream', methods=['POST'])
+def simulate_stream():
+    """Run simulations in batches, pushing partial results as server-sent events.
+    
+    Sends a "progress" event after every batch and ends with a "result" event
+    holding the same payload as /simulate. Disconnecting stops the run.
+    """
+    # Errors before the stream starts are JSON responses, like /simulate's
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    try:
+        args, kwargs = parse_simulation_request(data)
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'error': f"Invalid request: {e}"}), 400
+    try:
+        requested_simulations = args[-1]
+        if SIM_INLINE_MAX_SIMS and requested_simulations > SIM_INLINE_MAX_SIMS:
+            return jsonify({
+                'error': f"num_sims above {SIM_INLINE_MAX_SIMS} must be submitted to /jobs"
+            }), 413
         
+        # Streams report progress, so they are held to the longer stream budget
+        _, estimate, error = admit_request(data, estimate_cost(data, args), SIM_STREAM_LATENCY_BUDGET)
+        if error:
+            return error
+        num_sims = estimate.num_sims
+        args = args[:-1] + (num_sims,)
+        
+        sim = new_simulator(data.get('engine', 'scalar'), data.get('sampling'))
+        batch_size = data.get('batch_size') or max(sim.ADAPTIVE_BATCH_SIZE, num_sims // 20)
     except Exception as e:
         print(f"Error: {str(e)}", file=sys.stderr)
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
+    
+    # Early stopping does not apply to streamed runs, the client decides when to stop.
+    # Batches lay out the seeds differently from /simulate's chunks, so streamed
+    # results are cached apart from it and per batch size.
+    cacheable = data.get('precision') is None
+    cache_key = f"stream:{batch_size}:" + canonical_key(data)
+    
+    def events():
+        if cacheable:
+            cached = result_cache.get(cache_key)
+            if cached is not None:
+                yield sse_event('result', cached)
+                return
+        
+        try:
+            results = None
+            for analysis in sim.iter_monte_carlo(*args, batch_size=batch_size, seed=kwargs['seed'],
+                                                 workers=kwargs['workers'], histograms=kwargs['histograms']):
+                results = serialize_results(analysis)
+                yield sse_event('progress', dict(results, requested_simulations=num_sims))
+            
+            if results is None:
+                yield sse_event('error', {'error': 'No simulations were run'})
+                return
+            
+            # The last batch is the final result
+            results.pop('simulations_run')
+            if num_sims != requested_simulations:
+                results['requested_simulations'] = requested_simulations
+            if cacheable:
+                result_cache.set(cache_key, results)
+            yield sse_event('result', results)
+        except Exception as e:
+            print(f"Error: {str(e)}", file=sys.stderr)
+            import traceback
+            traceback.print_exc()
+            yield sse_event('error', {'error': str(e)})
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def run_simulation_job(data, should_stop=None):
+    """Job runner: yields (simulations_run, results) after every batch.
+    
+    Jobs run on threads of this process, so the scalar engine, which holds
+    the GIL for the whole run, is replaced by the NumPy engine. Results are
+    kept in the job store only: batches, the engine switch and a time limit
+    can all make them differ from the /simulate result for the same body.
+    """
+    if data.get('engine', 'scalar') == 'scalar':
+        data = dict(data, engine='numpy')
+    args, kwargs = parse_simulation_request(data)
+    sim = new_simulator(data['engine'], data.get('sampling'))
+    
+    if kwargs['target_precision'] is not None:
+        # Early stopping decides the batches itself, so there is one update;
+        # should_stop ends it early on cancellation or the time limit
+        results = serialize_results(sim.run_monte_carlo(*args, should_stop=should_stop, **kwargs))
+        yield results['simulations_run'], results
+    else:
+        num_sims = args[-1]
+        batch_size = max(sim.ADAPTIVE_BATCH_SIZE, num_sims // 100)
+        for analysis in sim.iter_monte_carlo(*args, batch_size=batch_size, seed=kwargs['seed'],
+                                             workers=kwargs['workers'], histograms=kwargs['histograms']):
+            simulations_run = analysis.pop('simulations_run')
+            results = serialize_results(analysis)
+            yield simulations_run, results
+
+
+def get_job_queue():
+    global job_queue
+    if job_queue is None:
+        from jobs import JobQueue, JobStore
+        store = JobStore(os.environ.get('SIM_JOB_DB', os.path.join(tempfile.gettempdir(), 'simulation-jobs.sqlite3')))
+        job_queue = JobQueue(
+            store, run_simulation_job,
+            max_workers=int(os.environ.get('SIM_JOB_WORKERS', 2)),
+            max_pending=int(os.environ.get('SIM_JOB_QUEUE', 32)),
+            timeout=int(os.environ.get('SIM_JOB_TIMEOUT', 600)),
+            # Seconds without a heartbeat before another process takes a job over
+            lease=int(os.environ.get('SIM_JOB_LEASE', 30))
+        )
+    return job_queue
+
+
+def serialize_job(job):
+    requested = job['requested_simulations']
+    return {
+        'id': job['id'],
+        'status': job['status'],
+        'simulations_run': job['simulations_run'],
+        'requested_simulations': requested,
+        'progress': job['simulations_run'] / requested if requested else 0.0,
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at'],
+        'result': job['result'],
+        'error': job['error']
+    }
+
+
+def submit_job(data, requested_simulations):
+    """Queue a simulation, returning the 202 response with its job id or a 503 when the queue is full"""
+    from jobs import QueueFull
+    try:
+        job_id = get_job_queue().submit(data, requested_simulations)
+    except QueueFull as e:
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+    
+    response = jsonify({'id': job_id, 'status': 'queued'})
+    response.headers['Location'] = f"/jobs/{job_id}"
+    return response, 202
+
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Queue a simulation and return its job id"""
+    data = request.json
+    args, _ = parse_simulation_request(data)
+    # Jobs run scalar requests on the NumPy engine, see run_simulation_job
+    engine = 'numpy' if data.get('engine', 'scalar') == 'scalar' else data['engine']
+    _, _, error = admit_request(data, get_admission()[0].estimate(args, engine), latency_budget=0)
+    if error:
+        return error
+    return submit_job(data, args[-1])
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(serialize_job(job))
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def delete_job(job_id):
+    """Cancel a queued or running job, or remove a finished one"""
+    if not get_job_queue().cancel(job_id):
+        return jsonify({'error': 'Job not found'}), 404
+    return '', 204
+
+@app.route('/jobs/stats')
+def job_stats():
+    return jsonify(get_job_queue().stats())
+
+@app.route('/banners')
+def banner_schedule():
+    """The banner schedule as [name, type, start, end] rows.
+    
+    Optional query parameters: start and end (YYYY-MM-DD) keep banners
+    running at any time between them, tag ('new release' or 'rebanner')
+    and type ('UR' or 'SP') keep banners starting between them instead.
+    """
+    schedule = current_schedule()
+    banners = schedule.banners
+    try:
+        # Whole days, with the end day included up to its last moment
+        window_start = (datetime.combine(date.fromisoformat(request.args['start']), datetime.min.time())
+                        if request.args.get('start') else datetime.min)
+        window_end = (datetime.combine(date.fromisoformat(request.args['end']), datetime.max.time())
+                      if request.args.get('end') else datetime.max)
+    except ValueError:
+        return jsonify({'error': 'start and end must be YYYY-MM-DD dates'}), 400
+    tag = request.args.get('tag')
+    banner_type = request.args.get('type')
+    if tag or banner_type:
+        banners = schedule.index.starting_between(window_start, window_end, tag, banner_type)
+    elif request.args.get('start') or request.args.get('end'):
+        banners = schedule.index.active_between(window_start, window_end)
+    
+    response = jsonify({
+        'version': schedule.version,
+        'digest': schedule.digest,
+        'banners': [[name, b_type, start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')]
+                    for name, b_type, start, end in banners]
+    })
+    response.headers['Cache-Control'] = 'no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
+
+def warm_up():
+    """Import the simulator, build the hit-time tables and run a tiny simulation of each engine"""
+    start = time.perf_counter()
+    for engine in ('scalar', 'numpy'):
+        sim = new_simulator(engine)
+        sim.get_hit_time_table('UR')
+        sim.get_hit_time_table('SP')
+        sim.run_monte_carlo(0, 10, 10, 0, 0, 0, 0, [(banner[0], 1) for banner in sim.BANNERS[-1:]], 0, 100, seed=0)
+    startup_timings['warmup'] = time.perf_counter() - start
+
+@app.route('/warmup')
+def warmup():
+    """Warm-up hook for schedulers and deploy checks; reports startup timings"""
+    if 'warmup' not in startup_timings:
+        warm_up()
+    return jsonify(startup_timings)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Request, phase and throughput metrics in the Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache/stats')
+def cache_stats():
+    """Hit/miss counters of the /simulate result cache"""
+    stats = result_cache.stats()
+    stats['prefix_cache'] = prefix_cache.stats() if prefix_cache is not None else None
+    return jsonify(stats)
+
+startup_timings['app_import'] = time.perf_counter() - _import_start
+
+# Long-running servers can pay the warm-up at startup instead of on the first request
+if os.environ.get('SIM_WARMUP'):
+    warm_up()
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
@@ -1,49 +1,186 @@
+"""Banner schedule, loaded from banners.json.
+
+The file holds a version number and one entry per banner:
+    
+    {"name": "Hinata SP Banner", "type": "SP", "start": "2025-12-24", "end": "2026-01-06"}
+
+Dates without a time start at 00:00:00 and end at 23:59:59 of the given
+day. The parsed schedule and its index are kept per process and reloaded
+when the file changes, checked at most every RELOAD_INTERVAL seconds, so
+schedule updates need neither a deploy nor a worker restart. BANNER_SCHEDULE
+points at another file.
+"""
+import bisect
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
 from datetime import datetime, timedelta
 
-BANNERS = [
-    ("Hinata SP Banner", "SP", datetime(2025, 12, 24, 0, 0, 0), datetime(2026, 1, 6, 23, 59, 59)),
-    ("Atsumu UR Rebanner", "UR", datetime(2025, 12, 31, 0, 0, 0), datetime(2026, 1, 13, 23, 59, 59)),
-    ("Kenma SP Banner", "SP", datetime(2026, 1, 7, 0, 0, 0), datetime(2026, 1, 20, 23, 59, 59)),
-    ("Osamu UR Rebanner", "UR", datetime(2026, 1, 14, 0, 0, 0), datetime(2026, 1, 27, 23, 59, 59)),
-    ("Nishinoya SP Banner", "SP", datetime(2026, 1, 21, 0, 0, 0), datetime(2026, 2, 3, 23, 59, 59)),
-    ("Hoshiumi UR Rebanner", "UR", datetime(2026, 1, 28, 0, 0, 0), datetime(2026, 2, 10, 23, 59, 59)),
-    ("Sugawara SP Banner", "SP", datetime(2026, 2, 4, 0, 0, 0), datetime(2026, 2, 17, 23, 59, 59)),
-    ("Hirugami UR Rebanner", "UR", datetime(2026, 2, 11, 0, 0, 0), datetime(2026, 2, 24, 23, 59, 59)),
-    ("Bokuto SP Banner", "SP", datetime(2026, 2, 18, 0, 0, 0), datetime(2026, 3, 3, 23, 59, 59)),
-    ("Sakusa UR Rebanner", "UR", datetime(2026, 2, 25, 0, 0, 0), datetime(2026, 3, 10, 23, 59, 59)),
-    ("Akaashi SP Banner", "SP", datetime(2026, 3, 4, 0, 0, 0), datetime(2026, 3, 17, 23, 59, 59)),
-    ("Komori UR Rebanner", "UR", datetime(2026, 3, 11, 0, 0, 0), datetime(2026, 3, 24, 23, 59, 59)),
-    ("Aone SP Banner", "SP", datetime(2026, 3, 18, 0, 0, 0), datetime(2026, 3, 31, 23, 59, 59)),
-    ("Kageyama UR Rebanner", "UR", datetime(2026, 3, 25, 0, 0, 0), datetime(2026, 4, 7, 23, 59, 59)),
-    ("Tsukishima SP Banner", "SP", datetime(2026, 4, 1, 0, 0, 0), datetime(2026, 4, 14, 23, 59, 59)),
-    ("Hinata SP Rebanner", "SP", datetime(2026, 4, 8, 0, 0, 0), datetime(2026, 4, 21, 23, 59, 59)),
-    ("Kuroo SP Banner", "SP", datetime(2026, 4, 15, 0, 0, 0), datetime(2026, 4, 28, 23, 59, 59)),
-    ("Kenma SP Rebanner", "SP", datetime(2026, 4, 22, 0, 0, 0), datetime(2026, 5, 5, 23, 59, 59)),
-    ("Kunimi SP Banner", "SP", datetime(2026, 4, 29, 0, 0, 0), datetime(2026, 5, 12, 23, 59, 59)),
-    ("Nishinoya SP Rebanner", "SP", datetime(2026, 5, 6, 0, 0, 0), datetime(2026, 5, 19, 23, 59, 59)),
-    ("Koganegawa SP Banner", "SP", datetime(2026, 5, 13, 0, 0, 0), datetime(2026, 5, 26, 23, 59, 59)),
-    ("Sugawara SP Rebanner", "SP", datetime(2026, 5, 20, 0, 0, 0), datetime(2026, 6, 2, 23, 59, 59)),
-    ("Oikawa SP Banner", "SP", datetime(2026, 5, 27, 0, 0, 0), datetime(2026, 6, 9, 23, 59, 59)),
-    ("Bokuto SP Rebanner", "SP", datetime(2026, 6, 3, 0, 0, 0), datetime(2026, 6, 16, 23, 59, 59)),
-    ("Iwaizumi SP Banner", "SP", datetime(2026, 6, 10, 0, 0, 0), datetime(2026, 6, 23, 23, 59, 59)),
-    ("Akaashi SP Rebanner", "SP", datetime(2026, 6, 17, 0, 0, 0), datetime(2026, 6, 30, 23, 59, 59)),
-    ("Ushijima SP Banner", "SP", datetime(2026, 6, 24, 0, 0, 0), datetime(2026, 7, 7, 23, 59, 59)),
-    ("Ginjima SP Banner", "SP", datetime(2026, 7, 1, 0, 0, 0), datetime(2026, 7, 14, 23, 59, 59)),
-    ("Tendo SP Banner", "SP", datetime(2026, 7, 8, 0, 0, 0), datetime(2026, 7, 21, 23, 59, 59)),
-    ("Aone SP Rebanner", "SP", datetime(2026, 7, 15, 0, 0, 0), datetime(2026, 7, 28, 23, 59, 59)),
-    ("Atsumu SP Banner", "SP", datetime(2026, 7, 22, 0, 0, 0), datetime(2026, 8, 4, 23, 59, 59)),
-    ("Tsukishima SP Rebanner", "SP", datetime(2026, 7, 29, 0, 0, 0), datetime(2026, 8, 11, 23, 59, 59)),
-    ("Osamu SP Banner", "SP", datetime(2026, 8, 5, 0, 0, 0), datetime(2026, 8, 18, 23, 59, 59)),
-    ("Kuroo SP Rebanner", "SP", datetime(2026, 8, 12, 0, 0, 0), datetime(2026, 8, 25, 23, 59, 59)),
-    ("Hoshiumi SP Banner", "SP", datetime(2026, 8, 19, 0, 0, 0), datetime(2026, 9, 1, 23, 59, 59)),
-    ("Kunimi SP Rebanner", "SP", datetime(2026, 8, 26, 0, 0, 0), datetime(2026, 9, 8, 23, 59, 59)),
-    ("Hirugami SP Banner", "SP", datetime(2026, 9, 2, 0, 0, 0), datetime(2026, 9, 15, 23, 59, 59)),
-    ("Koganegawa SP Rebanner", "SP", datetime(2026, 9, 9, 0, 0, 0), datetime(2026, 9, 22, 23, 59, 59)),
-    ("Kenma SP 2 Banner", "SP", datetime(2026, 9, 16, 0, 0, 0), datetime(2026, 9, 29, 23, 59, 59)),
-    ("Oikawa SP Rebanner", "SP", datetime(2026, 9, 30, 0, 0, 0), datetime(2026, 10, 13, 23, 59, 59)),
-    ("Lev SP Banner", "SP", datetime(2026, 10, 7, 0, 0, 0), datetime(2026, 10, 20, 23, 59, 59)),
-    ("Iwaizumi SP Rebanner", "SP", datetime(2026, 10, 14, 0, 0, 0), datetime(2026, 10, 27, 23, 59, 59)),
-    ("Yamamoto SP Banner", "SP", datetime(2026, 10, 21, 0, 0, 0), datetime(2026, 11, 3, 23, 59, 59)),
-    ("Ushijima SP Rebanner", "SP", datetime(2026, 10, 28, 0, 0, 0), datetime(2026, 11, 10, 23, 59, 59)),
-    ("Tanaka SP Banner", "SP", datetime(2026, 11, 4, 0, 0, 0), datetime(2026, 11, 17, 23, 59, 59)),
-]
\ No newline at end of file
+SCHEDULE_PATH = os.environ.get(
+    'BANNER_SCHEDULE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'banners.json')
+)
+RELOAD_INTERVAL = 5.0
+
+BANNER_TYPES = ("UR", "SP")
+
+
+def get_banner_tag(banner_name):
+    """Determine if banner is a rebanner or new release"""
+    if "Rebanner" in banner_name:
+        return "rebanner"
+    else:
+        return "new release"
+
+
+def _parse_date(value, end_of_day):
+    moment = datetime.fromisoformat(value)
+    if end_of_day and len(value) == 10:
+        moment += timedelta(days=1, seconds=-1)
+    return moment
+
+
+def parse_schedule(data):
+    """(name, type, start_date, end_date) tuples from the decoded schedule file"""
+    banners = []
+    for entry in data['banners']:
+        banner = (
+            entry['name'], entry['type'],
+            _parse_date(entry['start'], False), _parse_date(entry['end'], True)
+        )
+        if banner[1] not in BANNER_TYPES:
+            raise ValueError(f"{banner[0]}: unknown banner type {banner[1]!r}")
+        if banner[3] < banner[2]:
+            raise ValueError(f"{banner[0]}: ends before it starts")
+        banners.append(banner)
+    return banners
+
+
+class BannerIndex:
+    """Name lookup and start-date ordering for a banner schedule.
+    
+    Range queries bisect the start dates, so they cost the number of
+    matching banners rather than the length of the schedule.
+    """
+    
+    def __init__(self, banners):
+        self.banners = banners
+        self.by_name = {}
+        for banner in banners:
+            # Keep the first entry for duplicate names, like the linear scans did
+            self.by_name.setdefault(banner[0], banner)
+        
+        self.by_start = sorted(banners, key=lambda b: b[2])
+        self.starts = [b[2] for b in self.by_start]
+        self.ends = [b[3] for b in self.by_start]
+        self.is_new_release = [get_banner_tag(b[0]) == "new release" for b in self.by_start]
+        # Longest banner, bounding how early an active banner can have started
+        self.max_duration = max((b[3] - b[2] for b in banners), default=timedelta(0))
+    
+    def get(self, banner_name):
+        return self.by_name.get(banner_name)
+    
+    def starting_between(self, window_start, window_end, tag=None, banner_type=None):
+        """Banners starting inside [window_start, window_end] in start order,
+        optionally only one tag ("new release" or "rebanner") or type"""
+        first = bisect.bisect_left(self.starts, window_start)
+        last = bisect.bisect_right(self.starts, window_end)
+        return [
+            banner for i, banner in enumerate(self.by_start[first:last], first)
+            if (tag is None or self.is_new_release[i] == (tag == "new release"))
+            and (banner_type is None or banner[1] == banner_type)
+        ]
+    
+    def active_between(self, window_start, window_end):
+        """Banners running at any time in [window_start, window_end], in start order"""
+        # Clamped, as a window open to the start of time has nothing before it
+        earliest = window_start - min(self.max_duration, window_start - datetime.min)
+        first = bisect.bisect_left(self.starts, earliest)
+        last = bisect.bisect_right(self.starts, window_end)
+        return [self.by_start[i] for i in range(first, last) if self.ends[i] >= window_start]
+    
+    def count_new_releases(self, window_start, window_end):
+        """Count UR and SP new releases that start and end inside [window_start, window_end]"""
+        ur_count = 0
+        sp_count = 0
+        
+        # Only banners starting inside the window can also end inside it
+        first = bisect.bisect_left(self.starts, window_start)
+        last = bisect.bisect_right(self.starts, window_end)
+        for i in range(first, last):
+            if self.is_new_release[i] and self.ends[i] <= window_end:
+                if self.by_start[i][1] == "UR":
+                    ur_count += 1
+                else:  # SP
+                    sp_count += 1
+        
+        return ur_count, sp_count
+
+
+class BannerSchedule:
+    """One version of the schedule file, parsed and indexed"""
+    
+    def __init__(self, path, raw, signature):
+        data = json.loads(raw)
+        self.path = path
+        self.signature = signature
+        self.version = data.get('version')
+        # Content hash, so caches keyed on it never mix two schedules
+        self.digest = hashlib.sha256(raw).hexdigest()[:12]
+        self.banners = parse_schedule(data)
+        self.index = BannerIndex(self.banners)
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def load_schedule(path=SCHEDULE_PATH):
+    signature = _signature(path)
+    with open(path, 'rb') as f:
+        return BannerSchedule(path, f.read(), signature)
+
+
+_schedule = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def current_schedule(path=SCHEDULE_PATH):
+    """The schedule in path, reloaded if the file changed since the last check.
+    
+    A file that fails to load is reported on stderr and the previous
+    schedule stays in use.
+    """
+    global _schedule, _checked_at
+    if _schedule is not None and _schedule.path == path and time.monotonic() - _checked_at < RELOAD_INTERVAL:
+        return _schedule
+    
+    with _lock:
+        if _schedule is None or _schedule.path != path:
+            _schedule = load_schedule(path)
+        else:
+            signature = _schedule.signature
+            try:
+                signature = _signature(path)
+                if signature != _schedule.signature:
+                    _schedule = load_schedule(path)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"Keeping banner schedule {_schedule.digest}, reload of {path} failed: {e}",
+                      file=sys.stderr)
+                # Report a broken file once, not on every check
+                _schedule.signature = signature
+        _checked_at = time.monotonic()
+        return _schedule
+
+
+def current_banners():
+    """(name, type, start_date, end_date) tuples of the current schedule"""
+    return current_schedule().banners
+
+
+# Schedule at import time; use current_banners() to follow reloads
+BANNERS = current_banners()
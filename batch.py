@@ -0,0 +1,169 @@
+import numpy as np
+
+from aggregate import Histogram, ResultAggregator, histogram_mean, histogram_percentile
+
+
+class BatchAggregator:
+    """Per-profile aggregators plus how many members reach their targets per simulation"""
+    
+    def __init__(self, num_profiles):
+        self.profiles = [ResultAggregator() for _ in range(num_profiles)]
+        self.members_reaching = {}  # banner name -> Histogram of members reaching it per simulation
+        self.members_reaching_all = Histogram()
+    
+    def merge(self, other):
+        for aggregator, other_aggregator in zip(self.profiles, other.profiles):
+            aggregator.merge(other_aggregator)
+        for name, histogram in other.members_reaching.items():
+            self.members_reaching.setdefault(name, Histogram()).merge(histogram)
+        self.members_reaching_all.merge(other.members_reaching_all)
+
+
+class ProfileBatch:
+    """Many player profiles simulated together with the NumPy engine.
+    
+    Simulation i of profile p is row p * n + i of one set of state arrays.
+    The banners of every profile's plan form one timeline, and each entry
+    simulates the rows of all profiles targeting that banner next in a
+    single simulate_banner_batch call. Every profile still visits its
+    banners in its own plan order: the timeline repeatedly takes the
+    earliest (start date, then name) of the profiles' next steps, so a
+    banner appears again only when two profiles order same-day banners
+    differently. Rows with the same i form one joint outcome for the whole
+    group, which gives the distribution of how many members reach each
+    target.
+    """
+    
+    # Rows per simulate_banner_batch call; larger calls are slower per row
+    BLOCK_ROWS = 16384
+    
+    def __init__(self, simulator, plans, initial_states):
+        self.sim = simulator
+        self.plans = plans
+        self.initial_states = np.array(initial_states, dtype=np.int64).reshape(len(plans), 5)
+        
+        self.members_targeting = {}
+        for profile, plan in enumerate(plans):
+            names = [step['banner_name'] for step in plan.steps]
+            if len(set(names)) != len(names):
+                # Rows are addressed per profile, so a banner can only be visited once
+                raise ValueError(f"Profile {profile} targets the same banner more than once")
+            for name in names:
+                self.members_targeting[name] = self.members_targeting.get(name, 0) + 1
+        
+        self.timeline = []
+        positions = [0] * len(plans)
+        while True:
+            heads = {}
+            for profile, plan in enumerate(plans):
+                if positions[profile] < len(plan.steps):
+                    step = plan.steps[positions[profile]]
+                    heads.setdefault((step['start_date'], step['banner_name']), []).append((profile, step))
+            if not heads:
+                break
+            (_, banner_name), entries = min(heads.items(), key=lambda item: item[0])
+            for profile, _ in entries:
+                positions[profile] += 1
+            self.timeline.append((banner_name, entries))
+    
+    def simulate_chunk(self, num_simulations, seed_sequence):
+        """Simulate num_simulations of every profile and return a BatchAggregator"""
+        n = num_simulations
+        rng = np.random.default_rng(seed_sequence)
+        aggregator = BatchAggregator(len(self.plans))
+        
+        state = np.repeat(self.initial_states, n, axis=0)
+        diamonds = state[:, 0].copy()
+        tickets = {"UR": state[:, 1].copy(), "SP": state[:, 2].copy()}
+        pity = {"UR": state[:, 3].copy(), "SP": state[:, 4].copy()}
+        sim_success = np.ones(len(state), dtype=bool)
+        reaching = {name: np.zeros(n, dtype=np.int64) for name in self.members_targeting}
+        
+        for banner_name, entries in self.timeline:
+            steps = [step for _, step in entries]
+            banner_type = steps[0]['banner_type']
+            rows = (np.array([profile for profile, _ in entries])[:, None] * n + np.arange(n)).ravel()
+            
+            def per_row(key):
+                return np.repeat(np.array([step[key] for step in steps], dtype=np.int64), n)
+            
+            diamonds[rows] += per_row('total_diamonds_gained')
+            tickets["UR"][rows] += per_row('free_ur_tickets_gained')
+            tickets["SP"][rows] += per_row('free_sp_tickets_gained')
+            
+            result = self._simulate_rows(
+                diamonds[rows], tickets[banner_type][rows], pity[banner_type][rows],
+                per_row('target_copies'), banner_type, rng
+            )
+            diamonds[rows] = result['diamonds_remaining']
+            tickets[banner_type][rows] = result['tickets_remaining']
+            pity[banner_type][rows] = result['final_pity']
+            sim_success[rows] &= result['success']
+            
+            for j, (profile, step) in enumerate(entries):
+                part = slice(j * n, (j + 1) * n)
+                profile_rows = rows[part]
+                aggregator.profiles[profile].add_banner(step, result['success'][part], {
+                    'total_pulls': result['total_pulls'][part],
+                    'diamonds_spent': result['diamonds_spent'][part],
+                    'tickets_used': result['tickets_used'][part],
+                    'remaining_diamonds': diamonds[profile_rows],
+                    'remaining_ur_tickets': tickets["UR"][profile_rows],
+                    'remaining_sp_tickets': tickets["SP"][profile_rows],
+                    'milestone_tickets_gained': result['milestone_tickets'][part],
+                    'milestone_copies': result['milestone_copies'][part],
+                    'base_copies': result['copies_obtained'][part] - result['milestone_copies'][part]
+                })
+            
+            reaching[banner_name] += result['success'].reshape(len(entries), n).sum(axis=0)
+        
+        for banner_name, members in reaching.items():
+            aggregator.members_reaching[banner_name] = Histogram()
+            aggregator.members_reaching[banner_name].add(members)
+        for profile, profile_aggregator in enumerate(aggregator.profiles):
+            profile_aggregator.add_success(sim_success[profile * n:(profile + 1) * n])
+        aggregator.members_reaching_all.add(sim_success.reshape(len(self.plans), n).sum(axis=0))
+        return aggregator
+    
+    def _simulate_rows(self, diamonds, tickets, pity, target_copies, banner_type, rng):
+        """simulate_banner_batch over BLOCK_ROWS rows at a time, which keeps the
+        working arrays small enough to stay in cache"""
+        blocks = [
+            self.sim.simulate_banner_batch(
+                diamonds[start:start + self.BLOCK_ROWS], tickets[start:start + self.BLOCK_ROWS],
+                pity[start:start + self.BLOCK_ROWS], target_copies[start:start + self.BLOCK_ROWS],
+                banner_type, rng
+            )
+            for start in range(0, len(diamonds), self.BLOCK_ROWS)
+        ]
+        if len(blocks) == 1:
+            return blocks[0]
+        return {key: np.concatenate([block[key] for block in blocks]) for key in blocks[0]}
+    
+    def analyze(self, aggregator, num_simulations):
+        """Per-profile analyses in the run_monte_carlo shape plus group views per banner"""
+        banners = {}
+        for banner_name, members in self.members_targeting.items():
+            reaching = aggregator.members_reaching[banner_name]
+            banners[banner_name] = dict(_member_counts(reaching, members), members_targeting=members)
+        
+        return {
+            'total_simulations': num_simulations,
+            'profiles': [
+                self.sim.analyze_aggregate(profile_aggregator, plan.targeted_banners)
+                for plan, profile_aggregator in zip(self.plans, aggregator.profiles)
+            ],
+            'banners': banners,
+            'members_reaching_all_targets': _member_counts(aggregator.members_reaching_all, len(self.plans))
+        }
+
+
+def _member_counts(histogram, members):
+    """Statistics of how many of members succeed per simulation, and how often all of them do"""
+    return {
+        'avg_members': histogram_mean(histogram),
+        'p10_members': histogram_percentile(histogram, 10),
+        'p50_members': histogram_percentile(histogram, 50),
+        'p90_members': histogram_percentile(histogram, 90),
+        'all_members_rate': (1 - histogram.fraction_at_most(members - 1)) * 100
+    }
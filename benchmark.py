@@ -0,0 +1,286 @@
+"""Benchmarks for the simulator hot paths and the /simulate endpoint.
+    
+    python benchmark.py run [--output results.json] [--quick]
+    python benchmark.py compare baseline.json results.json [--threshold 0.15]
+
+run times every benchmark with fixed seeds and writes throughput, p50/p95
+latency and peak traced memory to a JSON file. compare flags benchmarks
+whose p50 latency or peak memory grew by more than the threshold, and
+exits with status 1 when there is any regression.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+SEED = 12345
+
+# Starting pity for the low and high pity variants of each plan
+PITY_STARTS = {'low_pity': (0, 0), 'high_pity': (120, 120)}
+
+# Banners of the reference schedule, one a week from tomorrow, alternating types
+REFERENCE_BANNERS = 10
+REFERENCE_DURATION_DAYS = 14
+
+
+def write_reference_schedule(path, today=None):
+    """Write a schedule of REFERENCE_BANNERS banners starting tomorrow.
+    
+    Every plan compiles against the current date, so on the real schedule
+    the workloads would shrink as banners end. Dates relative to today
+    give the same banners, durations and income days on every run.
+    """
+    if today is None:
+        today = date.today()
+    banners = []
+    for i in range(REFERENCE_BANNERS):
+        start = today + timedelta(days=1 + 7 * i)
+        banners.append({
+            'name': f"Reference Banner {i + 1}",
+            'type': 'UR' if i % 2 == 0 else 'SP',
+            'start': start.isoformat(),
+            'end': (start + timedelta(days=REFERENCE_DURATION_DAYS - 1)).isoformat()
+        })
+    with open(path, 'w') as f:
+        json.dump({'version': 1, 'banners': banners}, f, indent=2)
+
+
+# The simulator and the app read BANNER_SCHEDULE when imported
+REFERENCE_SCHEDULE = os.path.join(tempfile.gettempdir(), 'benchmark-banners.json')
+write_reference_schedule(REFERENCE_SCHEDULE)
+os.environ['BANNER_SCHEDULE'] = REFERENCE_SCHEDULE
+
+import numpy as np  # noqa: E402
+
+from main import GachaSimulator  # noqa: E402
+
+
+def reference_plans():
+    """One, five and every banner of the reference schedule, one copy each"""
+    names = [f"Reference Banner {i + 1}" for i in range(REFERENCE_BANNERS)]
+    return {
+        'one_banner': [(name, 1) for name in names[:1]],
+        'five_banners': [(name, 1) for name in names[:5]],
+        'all_banners': [(name, 1) for name in names]
+    }
+
+
+def simulation_args(targeted_banners, pity, num_simulations):
+    ur_pity, sp_pity = pity
+    return (60000, 20, 20, ur_pity, sp_pity, 10, 10, targeted_banners, 300, num_simulations)
+
+
+def measure(function, repeats, units):
+    """Time repeats calls of function, then one more under tracemalloc for peak memory"""
+    function()  # Warm up tables and caches
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - start)
+    
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    p50 = float(np.percentile(latencies, 50))
+    return {
+        'repeats': repeats,
+        'units': units,
+        'p50_seconds': p50,
+        'p95_seconds': float(np.percentile(latencies, 95)),
+        'mean_seconds': float(np.mean(latencies)),
+        'throughput_per_second': units / p50 if p50 > 0 else None,
+        'peak_memory_bytes': peak
+    }
+
+
+def benchmark_single_pull(repeats):
+    sim = GachaSimulator()
+    sim.random.seed(SEED)
+    pulls = 100000
+    
+    def run():
+        pity = 0
+        for _ in range(pulls):
+            _, pity = sim.simulate_single_pull(pity, "UR")
+    
+    return {'simulate_single_pull': measure(run, repeats, pulls)}
+
+
+def benchmark_banner(repeats):
+    results = {}
+    for pity_name, (ur_pity, _) in PITY_STARTS.items():
+        sim = GachaSimulator()
+        sim.random.seed(SEED)
+        banners = 10000
+        
+        def run():
+            for _ in range(banners):
+                sim.simulate_banner(30000, 10, ur_pity, 2, "UR")
+        
+        results[f"simulate_banner/{pity_name}"] = measure(run, repeats, banners)
+    return results
+
+
+def benchmark_monte_carlo(repeats, num_simulations, engines):
+    results = {}
+    for engine in engines:
+        sim = GachaSimulator(engine=engine)
+        for plan_name, targeted_banners in reference_plans().items():
+            for pity_name, pity in PITY_STARTS.items():
+                args = simulation_args(targeted_banners, pity, num_simulations)
+                results[f"run_monte_carlo/{engine}/{plan_name}/{pity_name}"] = measure(
+                    lambda: sim.run_monte_carlo(*args, seed=SEED), repeats, num_simulations
+                )
+    return results
+
+
+def benchmark_analyze(repeats, num_simulations):
+    results = {}
+    sim = GachaSimulator()
+    sim.random.seed(SEED)
+    for plan_name, targeted_banners in reference_plans().items():
+        plan = sim.compile_plan(targeted_banners, 10, 10, 300)
+        sim_results = sim._simulate_scalar(60000, 20, 20, 0, 0, plan, num_simulations)
+        results[f"analyze_results/{plan_name}"] = measure(
+            lambda: sim.analyze_results(sim_results, num_simulations, plan.targeted_banners),
+            repeats, num_simulations
+        )
+    return results
+
+
+def benchmark_endpoint(repeats, num_simulations, engines):
+    import app as app_module
+    client = app_module.app.test_client()
+    results = {}
+    for engine in engines:
+        for plan_name, targeted_banners in reference_plans().items():
+            body = {
+                'diamonds': 60000, 'ur_tickets': 20, 'sp_tickets': 20, 'free_ur': 10, 'free_sp': 10,
+                'daily_income': 300, 'num_sims': num_simulations, 'seed': SEED, 'engine': engine,
+                'targeted_banners': [{'name': name, 'copies': copies} for name, copies in targeted_banners]
+            }
+            
+            def run():
+                # Measure the simulation, not the caches
+                app_module.result_cache.clear()
+                if app_module.prefix_cache is not None:
+                    app_module.prefix_cache.clear()
+                response = client.post('/simulate', json=body)
+                assert response.status_code == 200, response.get_data(as_text=True)
+            
+            results[f"endpoint/{engine}/{plan_name}"] = measure(run, repeats, num_simulations)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    repeats = 3 if args.quick else args.repeats
+    num_simulations = 1000 if args.quick else args.sims
+    engines = args.engines.split(',')
+    
+    results = {}
+    for name, bench in (
+        ('simulate_single_pull', lambda: benchmark_single_pull(repeats)),
+        ('simulate_banner', lambda: benchmark_banner(repeats)),
+        ('run_monte_carlo', lambda: benchmark_monte_carlo(repeats, num_simulations, engines)),
+        ('analyze_results', lambda: benchmark_analyze(repeats, num_simulations)),
+        ('endpoint', lambda: benchmark_endpoint(repeats, num_simulations, engines)),
+    ):
+        print(f"Running {name}...", file=sys.stderr)
+        results.update(bench())
+    
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'seed': SEED,
+            'num_simulations': num_simulations,
+            'repeats': repeats
+        },
+        'results': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    
+    print(f"{'benchmark':60} {'p50 ms':>10} {'p95 ms':>10} {'per sec':>12} {'peak MB':>9}")
+    for name, result in results.items():
+        print(f"{name:60} {result['p50_seconds'] * 1000:10.2f} {result['p95_seconds'] * 1000:10.2f} "
+              f"{result['throughput_per_second']:12.0f} {result['peak_memory_bytes'] / 2**20:9.2f}")
+    print(f"Wrote {args.output}", file=sys.stderr)
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)['results']
+    with open(args.current) as f:
+        current = json.load(f)['results']
+    
+    regressions = []
+    print(f"{'benchmark':60} {'p50 change':>11} {'memory change':>14}")
+    for name in sorted(set(baseline) & set(current)):
+        time_ratio = current[name]['p50_seconds'] / baseline[name]['p50_seconds']
+        memory_ratio = current[name]['peak_memory_bytes'] / max(baseline[name]['peak_memory_bytes'], 1)
+        flags = []
+        if time_ratio > 1 + args.threshold:
+            flags.append('SLOWER')
+        if memory_ratio > 1 + args.threshold:
+            flags.append('MORE MEMORY')
+        if flags:
+            regressions.append(name)
+        print(f"{name:60} {(time_ratio - 1) * 100:+10.1f}% {(memory_ratio - 1) * 100:+13.1f}%  {' '.join(flags)}")
+    
+    for name in sorted(set(baseline) - set(current)):
+        print(f"{name:60} missing from {args.current}")
+    
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.threshold:.0%}")
+        return 1
+    print("No regressions")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    run_parser = commands.add_parser('run', help='Run the benchmarks and write a JSON report')
+    run_parser.add_argument('--output', default='benchmark-results.json')
+    run_parser.add_argument('--repeats', type=int, default=7)
+    run_parser.add_argument('--sims', type=int, default=10000, help='Simulations per Monte Carlo run')
+    run_parser.add_argument('--engines', default='scalar,numpy', help='Comma separated engines')
+    run_parser.add_argument('--quick', action='store_true', help='Fewer repeats and simulations')
+    
+    compare_parser = commands.add_parser('compare', help='Flag regressions against a baseline report')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.15,
+                                help='Allowed relative slowdown or memory growth')
+    
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == '__main__':
+    main()
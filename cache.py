@@ -0,0 +1,236 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+from banners import current_schedule
+
+
+def _normalize_number(value):
+    """Treat 20000, 20000.0 and "20000" as the same input"""
+    if isinstance(value, bool) or value is None:
+        return value
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return value
+    return int(number) if number.is_integer() else number
+
+
+def canonical_key(data, today=None, schedule=None):
+    """Canonical cache key for a /simulate request body.
+    
+    Targets are sorted and numbers normalized so equivalent plans share a key.
+    The current date is part of the key because income depends on the days
+    left until each banner, and so is the banner schedule's content hash
+    (schedule), so a schedule reload never serves results of the old one.
+    """
+    if today is None:
+        today = date.today()
+    if schedule is None:
+        schedule = current_schedule().digest
+    
+    targets = sorted(
+        (str(b['name']), _normalize_number(b['copies'])) for b in data.get('targeted_banners', [])
+    )
+    canonical = {
+        'date': today.isoformat(),
+        'schedule': schedule,
+        'targets': targets,
+        'engine': data.get('engine', 'scalar'),
+        'sampling': data.get('sampling'),
+        'seed': data.get('seed'),
+    }
+    for field, default in (('diamonds', 0), ('ur_tickets', 0), ('sp_tickets', 0), ('ur_pity', 0),
+                           ('sp_pity', 0), ('free_ur', 0), ('free_sp', 0), ('daily_income', 0),
+                           ('num_sims', 10000), ('precision', None), ('confidence', 0.95),
+                           ('max_sims', None), ('histograms', False), ('downscale', False)):
+        canonical[field] = _normalize_number(data.get(field, default))
+    
+    return json.dumps(canonical, sort_keys=True, separators=(',', ':'))
+
+
+def _json_default(value):
+    # NumPy scalars and anything else with a Python equivalent
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class ResultCache:
+    """In-process LRU cache with a TTL and an optional on-disk layer.
+    
+    Values must be JSON serializable when a disk directory is used.
+    """
+    
+    def __init__(self, max_entries=256, ttl=3600, disk_dir=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+    
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, hashlib.sha256(key.encode()).hexdigest() + '.json')
+    
+    def get(self, key):
+        """Return the cached value for key, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if now - stored_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+        
+        if self.disk_dir:
+            value = self._read_disk(key, now)
+            if value is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self.hits += 1
+                    self._store(key, value, now)
+                return value
+        
+        with self._lock:
+            self.misses += 1
+        return None
+    
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._store(key, value, now)
+        
+        if self.disk_dir:
+            path = self._disk_path(key)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({'stored_at': now, 'key': key, 'value': value}, f, default=_json_default)
+            os.replace(tmp_path, path)
+    
+    def _store(self, key, value, stored_at):
+        self._entries[key] = (stored_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def _read_disk(self, key, now):
+        path = self._disk_path(key)
+        try:
+            with open(path) as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        
+        if record.get('key') != key or now - record.get('stored_at', 0) > self.ttl:
+            return None
+        return record['value']
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'disk_dir': self.disk_dir,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+def _nbytes(value):
+    """Memory held by the NumPy arrays a snapshot references, which is nearly all of it"""
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return sum(_nbytes(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_nbytes(item) for item in value)
+    if hasattr(value, '__dict__'):
+        return _nbytes(vars(value))
+    return 0
+
+
+class PrefixCache:
+    """LRU cache of simulation snapshots keyed by a plan prefix.
+    
+    Keys are (base_key, prefix) pairs, where prefix is a tuple of per-banner
+    step keys. longest_prefix finds the longest cached prefix of a plan.
+    Snapshots hold per-simulation state, so besides max_entries the cache is
+    bounded by max_bytes, and a snapshot larger than that is not kept.
+    """
+    
+    def __init__(self, max_entries=16, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+    
+    def longest_prefix(self, base_key, steps):
+        """Return (length, value) for the longest cached prefix of steps, or (0, None)"""
+        steps = tuple(steps)
+        with self._lock:
+            for length in range(len(steps), 0, -1):
+                key = (base_key, steps[:length])
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return length, self._entries[key]
+            self.misses += 1
+        return 0, None
+    
+    def set(self, base_key, steps, value):
+        key = (base_key, tuple(steps))
+        size = _nbytes(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._bytes += size - self._sizes.get(key, 0)
+            self._entries[key] = value
+            self._sizes[key] = size
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                evicted, _ = self._entries.popitem(last=False)
+                self._bytes -= self._sizes.pop(evicted)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._bytes = 0
+    
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,191 @@
+"""Headless batch runs of simulation plans.
+
+    python cli.py [plans.jsonl ...] [--sims 10000] [--seed 1] [--workers 4]
+    python cli.py --interactive
+
+reads one plan per line from the files (or stdin, also for "-"), in the
+/simulate request format, and writes one JSON result per line to stdout as
+each plan finishes:
+
+    {"line": 1, "id": "...", "result": {...}}    or    {"line": 2, "id": null, "error": "..."}
+
+Plans run in parallel over --workers processes. At most a few plans per
+worker are in flight and input is read lazily, so memory stays flat however
+long the input is. With --ordered, results come out in input order instead
+of completion order. Progress goes to stderr.
+
+Fields a plan does not set fall back to the command line: num_sims to
+--sims, seed to --seed, engine to --engine and sampling to --sampling.
+Plans sharing a seed replay the same random numbers, which keeps what-if
+comparisons free of sampling noise.
+"""
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+
+# Plans in flight per worker, enough to keep every worker busy
+IN_FLIGHT_PER_WORKER = 4
+PROGRESS_INTERVAL = 0.5
+
+# One simulator per engine and sampling mode per process, so hit-time tables are built once
+_simulators = {}
+
+
+def plan_arguments(data, defaults):
+    """run_monte_carlo arguments for a plan in the /simulate request format"""
+    targeted_banners = [(b['name'], b['copies']) for b in data.get('targeted_banners', [])]
+    args = (
+        data.get('diamonds', 0), data.get('ur_tickets', 0), data.get('sp_tickets', 0),
+        data.get('ur_pity', 0), data.get('sp_pity', 0), data.get('free_ur', 0), data.get('free_sp', 0),
+        targeted_banners, data.get('daily_income', 0), data.get('num_sims', defaults['num_sims'])
+    )
+    return args, {'seed': data.get('seed', defaults['seed'])}
+
+
+def run_plan(line_number, text, defaults):
+    """Output record for one input line"""
+    from main import GachaSimulator
+    record = {'line': line_number, 'id': None}
+    try:
+        data = json.loads(text)
+        record['id'] = data.get('id')
+        engine = data.get('engine', defaults['engine'])
+        sampling = data.get('sampling', defaults['sampling'])
+        if (engine, sampling) not in _simulators:
+            _simulators[engine, sampling] = GachaSimulator(engine=engine, sampling=sampling)
+        args, kwargs = plan_arguments(data, defaults)
+        record['result'] = _simulators[engine, sampling].run_monte_carlo(*args, **kwargs)
+    except Exception as e:
+        # A bad plan is reported in its own output line and the run goes on
+        record['error'] = str(e)
+    return record
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d')
+    # NumPy scalars
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def read_plans(paths):
+    """(line number, text) of every non-blank line, read lazily"""
+    line_number = 0
+    for path in paths or ['-']:
+        f = sys.stdin if path == '-' else open(path, encoding='utf-8')
+        try:
+            for text in f:
+                line_number += 1
+                if text.strip():
+                    yield line_number, text
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+
+class Progress:
+    """Plans done, errors and throughput, redrawn on one stderr line"""
+    
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.start = time.perf_counter()
+        self.shown_at = 0.0
+        self.done = 0
+        self.errors = 0
+    
+    def update(self, record, final=False):
+        if record is not None:
+            self.done += 1
+            self.errors += 'error' in record
+        now = time.perf_counter()
+        if not self.enabled or (not final and now - self.shown_at < PROGRESS_INTERVAL):
+            return
+        self.shown_at = now
+        elapsed = now - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        print(f"\r{self.done} plans, {self.errors} errors, {rate:.1f} plans/s, {elapsed:.0f}s",
+              end='\n' if final else '', file=sys.stderr, flush=True)
+
+
+def run(paths, defaults, workers=1, ordered=False, output=sys.stdout, progress=None):
+    """Run every plan in paths, writing one JSON line per plan to output"""
+    if progress is None:
+        progress = Progress(False)
+    
+    def emit(record):
+        output.write(json.dumps(record, default=_json_default) + '\n')
+        output.flush()
+        progress.update(record)
+    
+    plans = read_plans(paths)
+    if workers <= 1:
+        for line_number, text in plans:
+            emit(run_plan(line_number, text, defaults))
+        return
+    
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = {}
+        finished = {}  # line number -> record, only held back with ordered output
+        exhausted = False
+        while True:
+            while not exhausted and len(in_flight) + len(finished) < workers * IN_FLIGHT_PER_WORKER:
+                try:
+                    line_number, text = next(plans)
+                except StopIteration:
+                    exhausted = True
+                    break
+                in_flight[pool.submit(run_plan, line_number, text, defaults)] = line_number
+            if not in_flight:
+                break
+            
+            done, _ = wait(in_flight, timeout=PROGRESS_INTERVAL, return_when=FIRST_COMPLETED)
+            progress.update(None)
+            for future in done:
+                line_number = in_flight.pop(future)
+                if not ordered:
+                    emit(future.result())
+                    continue
+                finished[line_number] = future.result()
+            if ordered:
+                # Emit every finished record with no earlier plan still running
+                pending = min(in_flight.values(), default=None)
+                for line_number in sorted(finished):
+                    if pending is not None and line_number > pending:
+                        break
+                    emit(finished.pop(line_number))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='*', help='JSONL plan files, stdin when none or "-"')
+    parser.add_argument('--sims', type=int, default=10000, help='Simulations for plans without num_sims')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for plans without one')
+    parser.add_argument('--workers', type=int, default=1, help='Plans run in parallel')
+    parser.add_argument('--engine', default='numpy', help='Engine for plans without one (default numpy)')
+    parser.add_argument('--sampling', default=None,
+                        help='Sampling mode for plans without one: plain, antithetic, stratified or qmc')
+    parser.add_argument('--ordered', action='store_true', help='Write results in input order')
+    parser.add_argument('--quiet', action='store_true', help='No progress on stderr')
+    parser.add_argument('--interactive', action='store_true', help='Prompt for one plan and print a report')
+    args = parser.parse_args(argv)
+    
+    if args.interactive:
+        from main import interactive
+        interactive()
+        return
+    
+    defaults = {'num_sims': args.sims, 'seed': args.seed, 'engine': args.engine, 'sampling': args.sampling}
+    progress = Progress(not args.quiet)
+    try:
+        run(args.paths, defaults, args.workers, args.ordered, progress=progress)
+    finally:
+        progress.update(None, final=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+import numpy as np
+
+
+class StateSpaceTooLarge(Exception):
+    """Raised when the exact engine would have to track too many distinct states"""
+
+
+def weighted_mean(distribution):
+    """Expected value of a (values, probabilities) distribution"""
+    values, probs = distribution
+    return float(np.dot(values, probs) / np.sum(probs))
+
+
+def weighted_percentile(distribution, q):
+    """Smallest value whose cumulative probability reaches q percent"""
+    values, probs = distribution
+    cdf = np.cumsum(probs) / np.sum(probs)
+    index = np.searchsorted(cdf, q / 100 - 1e-12)
+    return float(values[min(index, len(values) - 1)])
+
+
+def _distribution(values, probs):
+    """Collapse per-row values into sorted unique values with summed probabilities"""
+    unique_values, inverse = np.unique(values, return_inverse=True)
+    return unique_values, np.bincount(inverse, weights=probs, minlength=len(unique_values))
+
+
+class ExactEngine:
+    """Exact Markov-chain engine for GachaSimulator.
+    
+    Carries the joint distribution of (diamonds, UR/SP tickets, UR/SP pity,
+    all-banners-successful) through every targeted banner. Within a banner the
+    spending order is fixed (tickets first, milestone tickets at 10 and 50
+    pulls), so resources after n pulls are a deterministic function of n and
+    only (copies, pity) has to be tracked as a probability distribution.
+    """
+    
+    # Probability mass below this is dropped to keep the state space small
+    EPSILON = 1e-15
+    
+    # Outcome rows a banner may produce per allowed state; the rows hold every
+    # (start state, pulls) pair before merging, so they are bounded separately
+    ROWS_PER_STATE = 10
+    
+    def __init__(self, simulator, max_states=200000):
+        self.sim = simulator
+        self.max_states = max_states
+        self.max_rows = max_states * self.ROWS_PER_STATE
+    
+    def _budget(self, tickets, units):
+        """Total pulls available from tickets, diamond pulls and milestone tickets
+        (none when the balance is negative)"""
+        budget = np.maximum(tickets, 0) + np.maximum(units, 0)
+        budget = budget + 2 * (budget >= 10)
+        budget = budget + 5 * (budget >= 50)
+        return budget
+    
+    def _spending(self, tickets, n):
+        """Ticket and diamond pulls used for n pulls on one banner, tickets first"""
+        first = np.minimum(n, 10)
+        ticket_pulls = np.minimum(first, tickets)
+        remaining = tickets - ticket_pulls + 2 * (n >= 10)
+        
+        second = np.clip(n - 10, 0, 40)
+        used = np.minimum(second, remaining)
+        ticket_pulls = ticket_pulls + used
+        remaining = remaining - used + 5 * (n >= 50)
+        
+        third = np.maximum(n - 50, 0)
+        used = np.minimum(third, remaining)
+        ticket_pulls = ticket_pulls + used
+        remaining = remaining - used
+        
+        milestone_tickets = 2 * (n >= 10) + 5 * (n >= 50)
+        return ticket_pulls, n - ticket_pulls, remaining, milestone_tickets
+    
+    def _banner_outcomes(self, start_pity, budgets, target_copies, banner_type):
+        """Distribution of how pulling on one banner ends for every start state.
+        
+        Returns rows of (state index, pulls, final pity, copies, probability).
+        """
+        rates = self.sim.build_rate_table(banner_type)
+        hard_pity = len(rates)
+        num_states = len(start_pity)
+        
+        pities, pity_row = np.unique(start_pity, return_inverse=True)
+        max_budget = int(budgets.max()) if num_states else 0
+        
+        # alive[start, copies, pity]: still pulling after n pulls
+        alive = np.zeros((len(pities), target_copies, hard_pity))
+        alive[np.arange(len(pities)), 0, pities] = 1.0
+        # Mass reaching the target on pull n, one column per pull from 0
+        stop_by_hit = [np.zeros(len(pities))]
+        
+        state_index, pulls, final_pity, copies, probs = [], [], [], [], []
+        collected = 0
+        
+        def check_rows(rows):
+            # Raised before the arrays are built, as they dwarf the merged states
+            if rows > self.max_rows:
+                raise StateSpaceTooLarge(f"{rows} outcome rows on one banner (limit {self.max_rows})")
+        
+        def collect_failures(n):
+            # States whose resources run out after exactly n pulls
+            nonlocal collected
+            for s in np.flatnonzero(budgets == n):
+                c, p = np.nonzero(alive[pity_row[s]] > self.EPSILON)
+                collected += len(c)
+                check_rows(collected)
+                state_index.append(np.full(len(c), s))
+                pulls.append(np.full(len(c), n))
+                final_pity.append(p)
+                copies.append(c)
+                probs.append(alive[pity_row[s], c, p])
+        
+        collect_failures(0)
+        
+        # Hard pity bounds every copy, so all mass stops long before large budgets
+        last = 0
+        for n in range(1, max_budget + 1):
+            if alive.sum() < self.EPSILON:
+                break
+            last = n
+            hits = alive * rates
+            misses = alive - hits
+            hit_mass = hits.sum(axis=2)
+            
+            alive = np.zeros_like(alive)
+            alive[:, :, 1:] = misses[:, :, :-1]
+            alive[:, 1:, 0] = hit_mass[:, :-1]
+            stop_by_hit.append(hit_mass[:, -1])
+            
+            if n == 200:
+                # Free milestone copy: states one copy short are done with their current pity
+                for s in np.flatnonzero(budgets >= 200):
+                    p = np.flatnonzero(alive[pity_row[s], -1] > self.EPSILON)
+                    collected += len(p)
+                    check_rows(collected)
+                    state_index.append(np.full(len(p), s))
+                    pulls.append(np.full(len(p), 200))
+                    final_pity.append(p)
+                    copies.append(np.full(len(p), target_copies))
+                    probs.append(alive[pity_row[s], -1, p])
+                alive[:, 1:] = alive[:, :-1].copy()
+                alive[:, 0] = 0.0
+            
+            collect_failures(n)
+        
+        # Success by a featured pull: pity resets, and a hit on pull 200 also gets the milestone copy
+        stop_by_hit = np.stack(stop_by_hit, axis=1)
+        reached = np.minimum(budgets, last)
+        check_rows(collected + int(reached.sum()))
+        rows = np.repeat(np.arange(num_states), reached)
+        offsets = np.repeat(np.cumsum(reached) - reached, reached)
+        n = np.arange(len(rows)) - offsets + 1
+        state_index.append(rows)
+        pulls.append(n)
+        final_pity.append(np.zeros(len(rows), dtype=np.int64))
+        copies.append(target_copies + (n == 200))
+        probs.append(stop_by_hit[pity_row[rows], n])
+        
+        result = [np.concatenate(x) for x in (state_index, pulls, final_pity, copies, probs)]
+        keep = result[4] > self.EPSILON
+        return [x[keep] for x in result]
+    
+    def run(self, initial_diamonds, initial_ur_tickets, initial_sp_tickets,
+            initial_ur_pity, initial_sp_pity, plan, num_simulations, histograms=False):
+        """Compute exact success rates and percentiles in the analyze_results shape"""
+        sim = self.sim
+        max_pity = sim.UR_HARD_PITY - 1
+        
+        # One row per distinct state
+        state = {
+            'diamonds': np.array([initial_diamonds], dtype=np.int64),
+            'ur_tickets': np.array([initial_ur_tickets], dtype=np.int64),
+            'sp_tickets': np.array([initial_sp_tickets], dtype=np.int64),
+            'ur_pity': np.array([min(initial_ur_pity, max_pity)], dtype=np.int64),
+            'sp_pity': np.array([min(initial_sp_pity, max_pity)], dtype=np.int64),
+            'success': np.array([1], dtype=np.int64),
+        }
+        prob = np.array([1.0])
+        banner_stats = {}
+        
+        for step in plan.steps:
+            banner_type = step['banner_type']
+            target_copies = step['target_copies']
+            tickets_key = 'ur_tickets' if banner_type == "UR" else 'sp_tickets'
+            pity_key = 'ur_pity' if banner_type == "UR" else 'sp_pity'
+            
+            state['ur_tickets'] = state['ur_tickets'] + step['free_ur_tickets_gained']
+            state['sp_tickets'] = state['sp_tickets'] + step['free_sp_tickets_gained']
+            state['diamonds'] = state['diamonds'] + step['total_diamonds_gained']
+            
+            tickets = state[tickets_key]
+            
+            if target_copies <= 0:
+                # Nothing to pull for: every state is already successful
+                rows = np.arange(len(prob))
+                pulls = np.zeros(len(prob), dtype=np.int64)
+                final_pity = state[pity_key]
+                copies = np.zeros(len(prob), dtype=np.int64)
+                row_prob = prob
+            else:
+                budgets = self._budget(tickets, state['diamonds'] // sim.PULL_COST)
+                rows, pulls, final_pity, copies, row_prob = self._banner_outcomes(
+                    state[pity_key], budgets, target_copies, banner_type
+                )
+                row_prob = row_prob * prob[rows]
+            
+            ticket_pulls, diamond_pulls, tickets_remaining, milestone_tickets = self._spending(
+                tickets[rows], pulls
+            )
+            milestone_copies = (pulls >= 200).astype(np.int64)
+            banner_success = copies >= target_copies
+            
+            new_state = {key: values[rows] for key, values in state.items()}
+            new_state['diamonds'] = new_state['diamonds'] - diamond_pulls * sim.PULL_COST
+            new_state[tickets_key] = tickets_remaining
+            new_state[pity_key] = final_pity
+            new_state['success'] = new_state['success'] & banner_success
+            
+            banner_stats[step['banner_name']] = {
+                'total_pulls': _distribution(pulls, row_prob),
+                'diamonds_spent': _distribution(diamond_pulls * sim.PULL_COST, row_prob),
+                'tickets_used': _distribution(ticket_pulls, row_prob),
+                'success_count': float(row_prob[banner_success].sum()) * num_simulations,
+                'remaining_diamonds': _distribution(new_state['diamonds'], row_prob),
+                'remaining_ur_tickets': _distribution(new_state['ur_tickets'], row_prob),
+                'remaining_sp_tickets': _distribution(new_state['sp_tickets'], row_prob),
+                'start_date': step['start_date'],
+                'end_date': step['end_date'],
+                'duration_days': step['duration_days'],
+                'total_diamonds_gained': ([step['total_diamonds_gained']], [1.0]),
+                'free_ur_tickets_gained': ([step['free_ur_tickets_gained']], [1.0]),
+                'free_sp_tickets_gained': ([step['free_sp_tickets_gained']], [1.0]),
+                'milestone_tickets_gained': _distribution(milestone_tickets, row_prob),
+                'milestone_copies': _distribution(milestone_copies, row_prob),
+                'base_copies': _distribution(copies - milestone_copies, row_prob),
+                'banner_tag': step['banner_tag']
+            }
+            
+            # Merge rows that ended in the same state
+            keys = np.stack([new_state[key] for key in state])
+            order = np.lexsort(keys)
+            keys = keys[:, order]
+            starts = np.concatenate(([True], np.any(keys[:, 1:] != keys[:, :-1], axis=0)))
+            if starts.sum() > self.max_states:
+                raise StateSpaceTooLarge(
+                    f"{starts.sum()} states after {step['banner_name']} (limit {self.max_states})"
+                )
+            state = dict(zip(state, keys[:, starts]))
+            prob = np.add.reduceat(row_prob[order], np.flatnonzero(starts))
+        
+        success_rate = float(prob[state['success'] == 1].sum()) * 100
+        return sim._build_analysis(
+            success_rate, num_simulations, plan.targeted_banners, banner_stats,
+            mean=weighted_mean, percentile=weighted_percentile,
+            # Probabilities scaled to expected counts out of num_simulations
+            distribution=(lambda d: (np.asarray(d[0]), np.asarray(d[1]) * num_simulations)) if histograms else None
+        )
@@ -0,0 +1,131 @@
+"""Binary encodings of /simulate results.
+
+Both carry the JSON result unchanged except for the per-banner
+'histograms', whose 'values' and 'counts' lists become typed arrays:
+
+application/x-msgpack
+    The result as a MessagePack map. Each array is a map of 'dtype'
+    (NumPy notation, e.g. '<i8') and 'data', its little-endian bytes.
+    Needs the msgpack package.
+
+application/vnd.gacha.arrays
+    b'GSIM', then the uint32 little-endian length of a UTF-8 JSON header,
+    the header, zero padding to a multiple of 8 bytes and the array data.
+    In the header each array is a map of 'dtype', 'offset' (bytes from the
+    start of the array data, always a multiple of 8) and 'length', so a
+    client can view it directly as a typed array.
+
+Integer arrays use the narrowest of int8/16/32/64 that holds them, counts
+that are not whole numbers (exact engine) are float64. NumPy is only
+imported once something is encoded or decoded, so negotiating a format
+leaves it unloaded.
+"""
+import json
+import struct
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = 'application/json'
+MSGPACK = 'application/x-msgpack'
+ARRAYS = 'application/vnd.gacha.arrays'
+
+ARRAYS_MAGIC = b'GSIM'
+
+
+def available_formats():
+    """Response formats in order of preference when a client accepts several"""
+    formats = [JSON, ARRAYS]
+    if msgpack is not None:
+        formats.insert(1, MSGPACK)
+    return formats
+
+
+# Integer types tried from narrowest to widest
+INTEGER_DTYPES = ('<i1', '<i2', '<i4', '<i8')
+
+
+def _array(values):
+    """Little-endian array of the narrowest integer type holding values, or
+    float64 for the exact engine's expected counts"""
+    import numpy as np
+    array = np.asarray(values)
+    if array.dtype.kind == 'f' and not np.array_equal(array, np.round(array)):
+        return array.astype('<f8', copy=False)
+    if array.size == 0:
+        return array.astype('<i1')
+    low, high = int(array.min()), int(array.max())
+    for dtype in INTEGER_DTYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return array.astype(dtype, copy=False)
+    return array.astype('<i8', copy=False)
+
+
+def _map_arrays(results, encode_array):
+    """Copy of results with every histogram array replaced by encode_array(array)"""
+    encoded = dict(results, banner_statistics={})
+    for banner_name, banner_stats in results['banner_statistics'].items():
+        banner_stats = dict(banner_stats)
+        if 'histograms' in banner_stats:
+            banner_stats['histograms'] = {
+                metric: {key: encode_array(_array(values)) for key, values in histogram.items()}
+                for metric, histogram in banner_stats['histograms'].items()
+            }
+        encoded['banner_statistics'][banner_name] = banner_stats
+    return encoded
+
+
+def encode_msgpack(results):
+    return msgpack.packb(
+        _map_arrays(results, lambda array: {'dtype': array.dtype.str, 'data': array.tobytes()}),
+        use_bin_type=True
+    )
+
+
+def encode_arrays(results):
+    chunks = []
+    offset = 0
+    
+    def describe(array):
+        nonlocal offset
+        # Pad every array to 8 bytes so each offset is aligned for any item size
+        padding = -array.nbytes % 8
+        chunks.append(array.tobytes() + b'\0' * padding)
+        descriptor = {'dtype': array.dtype.str, 'offset': offset, 'length': len(array)}
+        offset += array.nbytes + padding
+        return descriptor
+    
+    header = json.dumps(_map_arrays(results, describe), separators=(',', ':')).encode('utf-8')
+    padding = -(len(ARRAYS_MAGIC) + 4 + len(header)) % 8
+    return b''.join([ARRAYS_MAGIC, struct.pack('<I', len(header)), header, b'\0' * padding] + chunks)
+
+
+def decode_arrays(payload):
+    """Inverse of encode_arrays, with NumPy arrays for the histograms"""
+    import numpy as np
+    
+    if payload[:4] != ARRAYS_MAGIC:
+        raise ValueError("Not an application/vnd.gacha.arrays payload")
+    (header_length,) = struct.unpack_from('<I', payload, 4)
+    header_end = 8 + header_length
+    results = json.loads(payload[8:header_end])
+    data_start = header_end + (-header_end % 8)
+    for banner_stats in results['banner_statistics'].values():
+        for histogram in banner_stats.get('histograms', {}).values():
+            for key, descriptor in histogram.items():
+                histogram[key] = np.frombuffer(
+                    payload, dtype=descriptor['dtype'], count=descriptor['length'],
+                    offset=data_start + descriptor['offset']
+                )
+    return results
+
+
+def encode(results, mimetype):
+    if mimetype == MSGPACK:
+        return encode_msgpack(results)
+    if mimetype == ARRAYS:
+        return encode_arrays(results)
+    raise ValueError(f"Unsupported format {mimetype}")
@@ -0,0 +1,268 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import _json_default
+
+
+class QueueFull(Exception):
+    """Raised when too many jobs are already waiting or running"""
+
+
+class JobTimeout(Exception):
+    """Raised inside a job that ran past its time limit"""
+
+
+class JobStore:
+    """SQLite table of jobs, so statuses and results survive a restart.
+    
+    Several processes may share the file. Each unfinished job has an owner,
+    the JobQueue running it, which renews a heartbeat while it is alive;
+    only jobs whose owner stopped renewing it can be claimed by another.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    request TEXT NOT NULL,
+                    simulations_run INTEGER NOT NULL DEFAULT 0,
+                    requested_simulations INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    owner TEXT,
+                    heartbeat REAL
+                )"""
+            )
+            # Stores created before jobs had owners
+            columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            for column, column_type in (('owner', 'TEXT'), ('heartbeat', 'REAL')):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+    
+    def create(self, job_id, payload, requested_simulations, owner=None):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, request, requested_simulations, created_at, owner, heartbeat) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, 'queued', json.dumps(payload), requested_simulations, now, owner, now)
+            )
+    
+    def update(self, job_id, **fields):
+        if 'result' in fields and fields['result'] is not None:
+            fields['result'] = json.dumps(fields['result'], default=_json_default)
+        columns = ', '.join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+    
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+    
+    def delete(self, job_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+    
+    def heartbeat(self, owner):
+        """Renew the lease on owner's unfinished jobs and return the ids of its jobs
+        cancelled from another process"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET heartbeat = ? WHERE owner = ? AND status IN ('queued', 'running')",
+                (time.time(), owner)
+            )
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE owner = ? AND status = 'cancelled'", (owner,)
+            ).fetchall()
+        return [row['id'] for row in rows]
+    
+    def claim_abandoned(self, owner, stale_before):
+        """Take over the unfinished jobs whose owner's last heartbeat was before
+        stale_before, resetting them to queued. Returns the claimed jobs."""
+        with self._lock, self._conn:
+            # Taken under SQLite's write lock, so two processes never claim the same job
+            self._conn.execute("BEGIN IMMEDIATE")
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE status IN ('queued', 'running') "
+                "AND (owner IS NULL OR (owner != ? AND (heartbeat IS NULL OR heartbeat < ?))) "
+                "ORDER BY created_at",
+                (owner, stale_before)
+            ).fetchall()
+            self._conn.executemany(
+                "UPDATE jobs SET status = 'queued', simulations_run = 0, started_at = NULL, owner = ?, "
+                "heartbeat = ? WHERE id = ?",
+                [(owner, time.time(), row['id']) for row in rows]
+            )
+        return [self._to_dict(row) for row in rows]
+    
+    def prune(self, older_than):
+        """Drop finished jobs that ended before the older_than timestamp"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE status NOT IN ('queued', 'running') AND finished_at < ?",
+                (older_than,)
+            )
+    
+    def _to_dict(self, row):
+        job = dict(row)
+        job['request'] = json.loads(job['request'])
+        if job['result'] is not None:
+            job['result'] = json.loads(job['result'])
+        return job
+
+
+class JobQueue:
+    """Runs jobs on a bounded thread pool with a queue-depth limit and time limit.
+    
+    run_job(payload, should_stop) must return an iterator of (simulations_run,
+    result) pairs, one per batch; the last result is the job result.
+    Cancellation and the time limit are checked between batches, and
+    should_stop() lets a long batch check them from inside the run.
+    
+    Every lease / 3 seconds a background thread renews this queue's jobs in
+    the store, picks up cancellations made by other processes, and takes
+    over jobs whose owner has not renewed them for lease seconds (a process
+    that exited or crashed), which then start over.
+    """
+    
+    def __init__(self, store, run_job, max_workers=2, max_pending=32, timeout=600, retention=86400,
+                 lease=30):
+        self.store = store
+        self.run_job = run_job
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.retention = retention
+        self.lease = lease
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex}"
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        self._pending = {}  # job id -> cancel event
+        
+        self._claim_abandoned()
+        threading.Thread(target=self._keep_alive, daemon=True).start()
+    
+    def submit(self, payload, requested_simulations):
+        """Queue a job and return its id, or raise QueueFull"""
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                raise QueueFull(f"{len(self._pending)} jobs pending (limit {self.max_pending})")
+            job_id = uuid.uuid4().hex
+            self.store.create(job_id, payload, requested_simulations, self.owner)
+            self._schedule_locked(job_id, payload)
+        
+        self.store.prune(time.time() - self.retention)
+        return job_id
+    
+    def cancel(self, job_id):
+        """Cancel a pending job, or delete a finished one. Returns False if unknown."""
+        job = self.store.get(job_id)
+        if job is None:
+            return False
+        
+        with self._lock:
+            cancel_event = self._pending.get(job_id)
+        if cancel_event is not None:
+            cancel_event.set()
+            if job['status'] == 'queued':
+                # Never started; the worker will skip it
+                self.store.update(job_id, status='cancelled', finished_at=time.time())
+        elif job['status'] in ('queued', 'running'):
+            # Owned by another process, which stops it at its next heartbeat
+            self.store.update(job_id, status='cancelled', finished_at=time.time())
+        else:
+            self.store.delete(job_id)
+        return True
+    
+    def get(self, job_id):
+        return self.store.get(job_id)
+    
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            'pending': pending,
+            'max_pending': self.max_pending,
+            'max_workers': self.max_workers,
+            'timeout_seconds': self.timeout
+        }
+    
+    def _claim_abandoned(self):
+        for job in self.store.claim_abandoned(self.owner, time.time() - self.lease):
+            self._schedule(job['id'], job['request'])
+    
+    def _keep_alive(self):
+        while True:
+            time.sleep(self.lease / 3)
+            try:
+                cancelled = self.store.heartbeat(self.owner)
+                with self._lock:
+                    for job_id in cancelled:
+                        if job_id in self._pending:
+                            self._pending[job_id].set()
+                self._claim_abandoned()
+            except sqlite3.Error as e:
+                print(f"Job heartbeat failed: {e}", file=sys.stderr)
+    
+    def _schedule(self, job_id, payload):
+        with self._lock:
+            self._schedule_locked(job_id, payload)
+    
+    def _schedule_locked(self, job_id, payload):
+        cancel_event = threading.Event()
+        self._pending[job_id] = cancel_event
+        self._executor.submit(self._run, job_id, payload, cancel_event)
+    
+    def _run(self, job_id, payload, cancel_event):
+        try:
+            job = self.store.get(job_id)
+            if cancel_event.is_set() or job is None or job['status'] != 'queued':
+                return  # Cancelled, possibly by another process
+            
+            started_at = time.time()
+            deadline = started_at + self.timeout
+            self.store.update(job_id, status='running', started_at=started_at)
+            
+            def should_stop():
+                return cancel_event.is_set() or time.time() > deadline
+            
+            batches = self.run_job(payload, should_stop)
+            result = None
+            try:
+                for simulations_run, result in batches:
+                    if cancel_event.is_set():
+                        self.store.update(job_id, status='cancelled', finished_at=time.time())
+                        return
+                    if time.time() > deadline:
+                        raise JobTimeout(f"Job exceeded the {self.timeout} second limit")
+                    self.store.update(job_id, simulations_run=simulations_run)
+            finally:
+                # Stops the remaining batches when leaving early
+                close = getattr(batches, 'close', None)
+                if close is not None:
+                    close()
+            
+            self.store.update(job_id, status='completed', result=result, finished_at=time.time())
+        except JobTimeout as e:
+            self.store.update(job_id, status='timed_out', error=str(e), finished_at=time.time())
+        except Exception as e:
+            self.store.update(job_id, status='failed', error=str(e), finished_at=time.time())
+        finally:
+            with self._lock:
+                self._pending.pop(job_id, None)
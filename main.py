@@ -1,11 +1,55 @@
+import bisect
+import copy
 import random
 import numpy as np
 from datetime import datetime, timedelta
-from collections import defaultdict
-from banners import BANNERS
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from banners import current_banners
+from batch import BatchAggregator, ProfileBatch
+from aggregate import ResultAggregator, SimulationResults, histogram_mean, histogram_percentile
+from exact import ExactEngine, StateSpaceTooLarge
+from metrics import PhaseTimer
+from plan import compile_plan, get_banner_tag
+from tables import hit_time_table
+from sampling import SAMPLING_MODES, SampledNumbers, variance_report
+from solver import BudgetSolver
+from sweep import BUDGET_PARAMETERS, CommonRandomNumbers, expand_grid
 
 class GachaSimulator:
-    def __init__(self):
+    # Available simulation engines
+    ENGINES = ("scalar", "numpy", "exact")
+    
+    # Simulations per independently seeded chunk. Fixed so that a seed gives the
+    # same results whatever the number of workers.
+    CHUNK_SIZE = 10000
+    
+    # Simulations per batch between precision checks when a target precision is set
+    ADAPTIVE_BATCH_SIZE = 2000
+    
+    # Largest run whose per-banner state is kept in a prefix cache
+    PREFIX_CACHE_MAX_SIMS = 200000
+    
+    # Per-banner values whose full distribution is returned with histograms=True
+    HISTOGRAM_METRICS = ('total_pulls', 'diamonds_spent', 'remaining_diamonds',
+                         'remaining_ur_tickets', 'remaining_sp_tickets')
+    
+    def __init__(self, engine="scalar", max_exact_states=200000, sampling=None):
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown engine '{engine}', expected one of {self.ENGINES}")
+        if sampling is not None and sampling not in SAMPLING_MODES:
+            raise ValueError(f"Unknown sampling mode '{sampling}', expected one of {SAMPLING_MODES}")
+        
+        # Variance-reduced sampling (see sampling.SampledNumbers) replaces the
+        # random streams of the sampling engines; it always runs on NumPy
+        self.sampling = sampling
+        
+        # "scalar" simulates one pull at a time, "numpy" advances every simulation at once,
+        # "exact" computes the probabilities directly and falls back to "numpy" when
+        # more than max_exact_states distinct states would have to be tracked
+        self.engine = engine
+        self.max_exact_states = max_exact_states
+        
         # Constants
         self.PULL_COST = 150
         
@@ -23,8 +67,11 @@ class GachaSimulator:
         self.SP_PITY_INCREMENT = 0.0032  # 0.32%
         self.SP_HARD_PITY = 140
         
-        # Hardcoded banner schedule (name, type, start_date, end_date)
-        self.BANNERS = BANNERS
+        # Hit-time CDF tables per banner type, built on first use
+        self._hit_time_tables = {}
+        
+        # Random source for the scalar engine, reseeded per chunk by run_monte_carlo
+        self.random = random.Random()
     
     def calculate_ur_rate(self, pity_count):
         """Calculate UR drop rate based on current pity count"""
@@ -44,6 +91,19 @@ class GachaSimulator:
         rate = self.SP_BASE_RATE + (pulls_into_pity * self.SP_PITY_INCREMENT)
         return min(rate, 0.1578)  # Cap at 15.78%
     
+    def build_rate_table(self, banner_type):
+        """Build the featured drop rate for every pity count, including hard pity"""
+        if banner_type == "UR":
+            hard_pity = self.UR_HARD_PITY
+            rate_fn = self.calculate_ur_rate
+        else:  # SP
+            hard_pity = self.SP_HARD_PITY
+            rate_fn = self.calculate_sp_rate
+        
+        rates = np.array([rate_fn(p) for p in range(hard_pity)], dtype=np.float64)
+        rates[hard_pity - 1] = 1.0  # Guaranteed on the last pull before hard pity
+        return rates
+    
     def simulate_single_pull(self, pity_count, banner_type):
         """Simulate a single pull and return if featured obtained and new pity"""
         if banner_type == "UR":
@@ -55,15 +115,81 @@ class GachaSimulator:
                 return True, 0
             rate = self.calculate_sp_rate(pity_count)
         
-        got_featured = random.random() < rate
+        got_featured = self.random.random() < rate
         
         if got_featured:
             return True, 0
         else:
             return False, pity_count + 1
     
+    def get_hit_time_table(self, banner_type):
+        """CDF of pulls until the next featured copy for every starting pity.
+        
+        Row p, column k-1 holds the probability of getting the featured copy
+        within k pulls when starting at pity p. Built once per process for
+        the same rates (see tables.py).
+        """
+        if banner_type not in self._hit_time_tables:
+            self._hit_time_tables[banner_type] = hit_time_table(self, banner_type)
+        return self._hit_time_tables[banner_type]
+    
+    def draw_hit_time(self, pity_count, banner_type):
+        """Draw how many pulls until the next featured copy, starting at pity_count"""
+        rows = self.get_hit_time_table(banner_type)['rows']
+        row = rows[min(pity_count, len(rows) - 1)]
+        return bisect.bisect_right(row, self.random.random()) + 1
+    
+    def draw_hit_times(self, pity, banner_type, rng):
+        """Vectorized draw_hit_time for an array of starting pity counts"""
+        return self.hit_times_from_uniforms(pity, banner_type, rng.random(len(pity)))
+    
+    def hit_times_from_uniforms(self, pity, banner_type, uniforms):
+        """Pulls until the next featured copy for given pity counts and uniform draws"""
+        table = self.get_hit_time_table(banner_type)
+        hard_pity = table['cdf'].shape[0]
+        pity = np.minimum(pity, hard_pity - 1)
+        positions = np.searchsorted(table['flat'], pity + uniforms, side='right')
+        return positions - pity * hard_pity + 1
+    
+    def _pulls_to_next_milestone(self, pulls_on_this_banner):
+        """Pulls until the next 10/50/200 milestone, or a large number past the last one"""
+        for milestone in (10, 50, 200):
+            if pulls_on_this_banner < milestone:
+                return milestone - pulls_on_this_banner
+        return 1 << 30
+    
     def simulate_banner(self, diamonds, tickets, pity, target_copies, banner_type):
-        """Simulate pulling on a single banner until target copies obtained"""
+        """Simulate pulling on a single banner until target copies obtained.
+        
+        Instead of rolling every pull, draws the position of the next featured
+        copy from the hit-time table and skips straight to it, stopping early
+        at milestones or when resources run out.
+        """
+        (success, total_pulls, pulls_with_diamonds, tickets_used, milestone_tickets, milestone_copies,
+         copies_obtained, diamonds_remaining, tickets_remaining, final_pity) = self._pull_banner(
+            diamonds, tickets, pity, target_copies, banner_type
+        )
+        return {
+            'success': success,
+            'total_pulls': total_pulls,
+            'pulls_with_diamonds': pulls_with_diamonds,
+            'tickets_used': tickets_used,
+            'milestone_tickets': milestone_tickets,
+            'milestone_copies': milestone_copies,
+            'copies_obtained': copies_obtained,
+            'diamonds_remaining': diamonds_remaining,
+            'tickets_remaining': tickets_remaining,
+            'final_pity': final_pity,
+            'diamonds_spent': pulls_with_diamonds * self.PULL_COST
+        }
+    
+    def _pull_banner(self, diamonds, tickets, pity, target_copies, banner_type):
+        """simulate_banner as a plain tuple, for the scalar engine's inner loop.
+        
+        Returns (success, total_pulls, pulls_with_diamonds, tickets_used,
+        milestone_tickets, milestone_copies, copies_obtained,
+        diamonds_remaining, tickets_remaining, final_pity).
+        """
         total_pulls = 0
         pulls_with_diamonds = 0
         pulls_on_this_banner = 0
@@ -75,32 +201,37 @@ class GachaSimulator:
         current_pity = pity
         current_diamonds = diamonds
         current_tickets = tickets
+        next_hit = 0  # Pulls until the next featured copy, 0 when not drawn yet
         
         while copies_obtained < target_copies:
             # Check if we have any resources left
-            can_pull_with_ticket = current_tickets > 0
-            can_pull_with_diamonds = current_diamonds >= self.PULL_COST
+            available_pulls = current_tickets + current_diamonds // self.PULL_COST
             
-            if not can_pull_with_ticket and not can_pull_with_diamonds:
+            if available_pulls <= 0:
                 # No resources left
                 break
             
-            # Use tickets first, then diamonds
-            if can_pull_with_ticket:
-                current_tickets -= 1
-                tickets_used += 1
-            elif can_pull_with_diamonds:
-                current_diamonds -= self.PULL_COST
-                pulls_with_diamonds += 1
+            if next_hit == 0:
+                next_hit = self.draw_hit_time(current_pity, banner_type)
             
-            total_pulls += 1
-            pulls_on_this_banner += 1
+            pulls = min(next_hit, available_pulls, self._pulls_to_next_milestone(pulls_on_this_banner))
             
-            # Simulate pull
-            got_featured, current_pity = self.simulate_single_pull(current_pity, banner_type)
+            # Use tickets first, then diamonds
+            pulls_with_tickets = min(pulls, max(current_tickets, 0))
+            current_tickets -= pulls_with_tickets
+            tickets_used += pulls_with_tickets
+            current_diamonds -= (pulls - pulls_with_tickets) * self.PULL_COST
+            pulls_with_diamonds += pulls - pulls_with_tickets
+            
+            total_pulls += pulls
+            pulls_on_this_banner += pulls
+            next_hit -= pulls
             
-            if got_featured:
+            if next_hit == 0:
                 copies_obtained += 1
+                current_pity = 0
+            else:
+                current_pity += pulls
             
             # Check milestone rewards (no carryover, only for this banner)
             if pulls_on_this_banner == 10:
@@ -113,6 +244,94 @@ class GachaSimulator:
                 milestone_copies += 1
                 copies_obtained += 1
         
+        return (copies_obtained >= target_copies, total_pulls, pulls_with_diamonds, tickets_used,
+                milestone_tickets, milestone_copies, copies_obtained, current_diamonds,
+                current_tickets, current_pity)
+    
+    def simulate_banner_batch(self, diamonds, tickets, pity, target_copies, banner_type, rng=None,
+                              hits=None):
+        """Simulate pulling on a single banner for many simulations at once.
+        
+        Takes one entry per simulation in each resource array and returns the
+        same keys as simulate_banner, with NumPy arrays as values. Like
+        simulate_banner, each step skips ahead to the next featured copy,
+        milestone or resource exhaustion.
+        
+        hits, a sweep.HitCursor, replaces rng with common random numbers and
+        carries the pending featured copy over to the next banner of the type.
+        """
+        if rng is None and hits is None:
+            rng = np.random.default_rng()
+        
+        current_diamonds = np.array(diamonds, dtype=np.int64)
+        num_sims = current_diamonds.shape[0]
+        current_tickets = np.broadcast_to(np.asarray(tickets, dtype=np.int64), (num_sims,)).copy()
+        current_pity = np.broadcast_to(np.asarray(pity, dtype=np.int64), (num_sims,)).copy()
+        target_copies = np.broadcast_to(np.asarray(target_copies, dtype=np.int64), (num_sims,))
+        
+        total_pulls = np.zeros(num_sims, dtype=np.int64)
+        pulls_with_diamonds = np.zeros(num_sims, dtype=np.int64)
+        tickets_used = np.zeros(num_sims, dtype=np.int64)
+        milestone_tickets = np.zeros(num_sims, dtype=np.int64)
+        milestone_copies = np.zeros(num_sims, dtype=np.int64)
+        copies_obtained = np.zeros(num_sims, dtype=np.int64)
+        next_hit = np.zeros(num_sims, dtype=np.int64) if hits is None else hits.pending[banner_type].copy()
+        
+        active = np.flatnonzero(copies_obtained < target_copies)
+        
+        while True:
+            # Check if we have any resources left
+            available_pulls = current_tickets[active] + current_diamonds[active] // self.PULL_COST
+            keep = available_pulls > 0
+            active = active[keep]
+            available_pulls = available_pulls[keep]
+            
+            if active.size == 0:
+                break
+            
+            needs_draw = active[next_hit[active] == 0]
+            if needs_draw.size:
+                if hits is None:
+                    next_hit[needs_draw] = self.draw_hit_times(current_pity[needs_draw], banner_type, rng)
+                else:
+                    next_hit[needs_draw] = hits.draw(self, needs_draw, current_pity[needs_draw], banner_type)
+            
+            pulls_so_far = total_pulls[active]
+            to_milestone = np.select(
+                [pulls_so_far < 10, pulls_so_far < 50, pulls_so_far < 200],
+                [10 - pulls_so_far, 50 - pulls_so_far, 200 - pulls_so_far],
+                1 << 30
+            )
+            pulls = np.minimum(np.minimum(next_hit[active], available_pulls), to_milestone)
+            
+            # Use tickets first, then diamonds
+            pulls_with_tickets = np.minimum(pulls, np.maximum(current_tickets[active], 0))
+            current_tickets[active] -= pulls_with_tickets
+            tickets_used[active] += pulls_with_tickets
+            current_diamonds[active] -= (pulls - pulls_with_tickets) * self.PULL_COST
+            pulls_with_diamonds[active] += pulls - pulls_with_tickets
+            
+            pulls_so_far += pulls
+            total_pulls[active] = pulls_so_far
+            next_hit[active] -= pulls
+            
+            got_featured = next_hit[active] == 0
+            copies_obtained[active] += got_featured
+            current_pity[active] = np.where(got_featured, 0, current_pity[active] + pulls)
+            
+            # Check milestone rewards (no carryover, only for this banner)
+            bonus_tickets = 2 * (pulls_so_far == 10) + 5 * (pulls_so_far == 50)
+            milestone_tickets[active] += bonus_tickets
+            current_tickets[active] += bonus_tickets
+            at_200 = pulls_so_far == 200
+            milestone_copies[active] += at_200
+            copies_obtained[active] += at_200
+            
+            active = active[copies_obtained[active] < target_copies[active]]
+        
+        if hits is not None:
+            hits.pending[banner_type] = next_hit
+        
         return {
             'success': copies_obtained >= target_copies,
             'total_pulls': total_pulls,
@@ -127,38 +346,405 @@ class GachaSimulator:
             'diamonds_spent': pulls_with_diamonds * self.PULL_COST
         }
     
+    @property
+    def BANNERS(self):
+        """Banner schedule (name, type, start_date, end_date), following reloads of banners.json"""
+        return current_banners()
+    
     def get_banner_tag(self, banner_name):
         """Determine if banner is a rebanner or new release"""
-        if "Rebanner" in banner_name:
-            return "rebanner"
-        else:
-            return "new release"
+        return get_banner_tag(banner_name)
+    
+    def compile_plan(self, targeted_banners, free_ur_tickets, free_sp_tickets, daily_income, now=None):
+        """Compile the per-banner income and ticket schedule for a request once"""
+        return compile_plan(
+            targeted_banners, free_ur_tickets, free_sp_tickets, daily_income, now
+        )
     
     def run_monte_carlo(self, initial_diamonds, initial_ur_tickets, initial_sp_tickets,
                        initial_ur_pity, initial_sp_pity, free_ur_tickets, free_sp_tickets,
-                       targeted_banners, daily_income, num_simulations=10000):
-        """Run Monte Carlo simulation"""
-        
-        # Sort targeted banners by date
-        sorted_targets = []
-        for banner_name, target_copies in targeted_banners:
-            banner_info = None
-            for b in self.BANNERS:
-                if b[0] == banner_name:
-                    banner_info = b
+                       targeted_banners, daily_income, num_simulations=10000, seed=None, workers=1,
+                       target_precision=None, confidence=0.95, prefix_cache=None, timer=None,
+                       histograms=False, should_stop=None):
+        """Run Monte Carlo simulation.
+        
+        Simulations are split into CHUNK_SIZE chunks, each with its own random
+        stream spawned from seed, and spread over workers processes. The same
+        seed gives identical results for any number of workers.
+        
+        With target_precision (confidence interval half-width in percentage
+        points), simulations run in batches until the overall and every
+        per-banner success rate reach it, with num_simulations as the cap.
+        should_stop, a callable, is checked after every batch and ends the run
+        early with the batches so far when it returns True.
+        
+        With a cache.PrefixCache, the NumPy engine stores the simulation state
+        after every banner and a later run sharing a plan prefix (same inputs,
+        seed and num_simulations) only simulates the banners after it.
+        
+        A metrics.PhaseTimer passed as timer gets the time spent in the plan,
+        simulate and analyze phases and the number of simulations and pulls.
+        
+        With histograms, every banner's statistics also hold the full
+        distribution of each HISTOGRAM_METRICS value as sorted 'values' and
+        their 'counts' (expected counts, as floats, for the exact engine).
+        
+        A simulator created with a sampling mode draws its random numbers
+        with sampling.SampledNumbers, and the analysis gets a 'sampling'
+        entry with the measured standard error next to plain sampling's.
+        """
+        if timer is None:
+            timer = PhaseTimer()
+        
+        # Everything that does not depend on pull outcomes is worked out once here
+        with timer.phase('plan'):
+            plan = self.compile_plan(targeted_banners, free_ur_tickets, free_sp_tickets, daily_income)
+        initial_state = (initial_diamonds, initial_ur_tickets, initial_sp_tickets,
+                         initial_ur_pity, initial_sp_pity)
+        
+        if self.engine == "exact":
+            try:
+                with timer.phase('simulate'):
+                    analysis = ExactEngine(self, self.max_exact_states).run(
+                        *initial_state, plan, num_simulations, histograms=histograms
+                    )
+                timer.count('simulations', num_simulations)
+                return analysis
+            except StateSpaceTooLarge:
+                # Too many states to track exactly, sample instead
+                pass
+        
+        if target_precision is not None:
+            with timer.phase('simulate'):
+                aggregator = self._run_adaptive(
+                    initial_state, plan, num_simulations, seed, workers, target_precision, confidence,
+                    should_stop
+                )
+            self._count_work(timer, aggregator)
+            with timer.phase('analyze'):
+                analysis = self.analyze_aggregate(aggregator, plan.targeted_banners, histograms=histograms)
+            intervals = aggregator.success_intervals(confidence)
+            analysis['simulations_run'] = aggregator.num_sims
+            analysis['success_rate_ci'] = list(intervals['overall'])
+            analysis['target_precision'] = target_precision
+            analysis['precision_reached'] = self._precision_reached(aggregator, target_precision, confidence)
+            for banner_name, banner_stats in analysis['banner_statistics'].items():
+                banner_stats['success_rate_ci'] = list(intervals[banner_name])
+            return analysis
+        
+        chunk_sizes = [min(self.CHUNK_SIZE, num_simulations - start)
+                       for start in range(0, num_simulations, self.CHUNK_SIZE)]
+        seeds = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+        
+        with timer.phase('simulate'):
+            if (prefix_cache is not None and self.engine != "scalar" and self.sampling is None
+                    and num_simulations <= self.PREFIX_CACHE_MAX_SIMS):
+                aggregator = self._run_from_prefix(
+                    initial_state, plan, chunk_sizes, seeds, seed, workers, prefix_cache
+                )
+            else:
+                if workers > 1 and len(chunk_sizes) > 1:
+                    pool = _get_process_pool(workers)
+                    chunks = pool.map(
+                        _simulate_chunk, repeat(self), repeat(initial_state), repeat(plan), chunk_sizes, seeds
+                    )
+                else:
+                    chunks = (self._simulate_chunk(initial_state, plan, size, chunk_seed)
+                              for size, chunk_seed in zip(chunk_sizes, seeds))
+                
+                # Chunks are folded in as they finish, so memory does not grow with num_simulations
+                aggregator = ResultAggregator()
+                for chunk in chunks:
+                    aggregator.merge(chunk)
+        self._count_work(timer, aggregator)
+        
+        with timer.phase('analyze'):
+            return self.analyze_aggregate(aggregator, plan.targeted_banners, histograms=histograms)
+    
+    def _count_work(self, timer, aggregator):
+        timer.count('simulations', aggregator.num_sims)
+        timer.count('pulls', aggregator.total_pulls())
+    
+    def iter_monte_carlo(self, initial_diamonds, initial_ur_tickets, initial_sp_tickets,
+                         initial_ur_pity, initial_sp_pity, free_ur_tickets, free_sp_tickets,
+                         targeted_banners, daily_income, num_simulations=10000, seed=None, workers=1,
+                         batch_size=None, histograms=False):
+        """Yield a partial analysis after every batch of simulations.
+        
+        Each analysis has the run_monte_carlo shape plus simulations_run; the
+        last one covers all num_simulations. Closing the generator stops the
+        remaining batches.
+        """
+        plan = self.compile_plan(targeted_banners, free_ur_tickets, free_sp_tickets, daily_income)
+        initial_state = (initial_diamonds, initial_ur_tickets, initial_sp_tickets,
+                         initial_ur_pity, initial_sp_pity)
+        
+        if self.engine == "exact":
+            try:
+                analysis = ExactEngine(self, self.max_exact_states).run(
+                    *initial_state, plan, num_simulations, histograms=histograms
+                )
+                analysis['simulations_run'] = num_simulations
+                yield analysis
+                return
+            except StateSpaceTooLarge:
+                # Too many states to track exactly, sample instead
+                pass
+        
+        for aggregator in self._iter_batches(initial_state, plan, num_simulations, seed, workers,
+                                             batch_size or self.ADAPTIVE_BATCH_SIZE):
+            analysis = self.analyze_aggregate(aggregator, plan.targeted_banners, histograms=histograms)
+            analysis['simulations_run'] = aggregator.num_sims
+            yield analysis
+    
+    def run_sweep(self, initial_diamonds, initial_ur_tickets, initial_sp_tickets,
+                  initial_ur_pity, initial_sp_pity, free_ur_tickets, free_sp_tickets,
+                  targeted_banners, daily_income, sweep, num_simulations=10000, seed=None,
+                  full_statistics=False):
+        """Run the plan at every point of a grid over one or two parameters.
+        
+        When only diamonds and daily income are swept, the whole curve comes
+        from one run with unlimited diamonds (see BudgetSolver.budget_curve)
+        and each point holds only its success_rate. Otherwise, or with
+        full_statistics, every point gets a full analysis and replays the same
+        simulations with common random numbers, so differences between points
+        come from the parameters rather than noise; that costs a full run per
+        point. Always uses the NumPy engine. See sweep.expand_grid for the
+        sweep format.
+        """
+        base = {
+            'initial_diamonds': initial_diamonds,
+            'initial_ur_tickets': initial_ur_tickets,
+            'initial_sp_tickets': initial_sp_tickets,
+            'initial_ur_pity': initial_ur_pity,
+            'initial_sp_pity': initial_sp_pity,
+            'free_ur_tickets': free_ur_tickets,
+            'free_sp_tickets': free_sp_tickets,
+            'targeted_banners': targeted_banners,
+            'daily_income': daily_income
+        }
+        grid = expand_grid(base, sweep)
+        
+        now = datetime.now()
+        if not full_statistics and all(axis['parameter'] in BUDGET_PARAMETERS for axis in sweep):
+            plan = self.compile_plan(targeted_banners, free_ur_tickets, free_sp_tickets, daily_income, now)
+            initial_state = (initial_diamonds, initial_ur_tickets, initial_sp_tickets,
+                             initial_ur_pity, initial_sp_pity)
+            budgets = [(arguments['initial_diamonds'], arguments['daily_income']) for _, arguments in grid]
+            rates = BudgetSolver(self).budget_curve(initial_state, plan, budgets, num_simulations, seed)
+            return {
+                'parameters': list(grid[0][0]),
+                'total_simulations': num_simulations,
+                'points': [{'success_rate': rate, 'parameters': point} for (point, _), rate in zip(grid, rates)]
+            }
+        
+        runs = []
+        for point, arguments in grid:
+            plan = self.compile_plan(arguments['targeted_banners'], arguments['free_ur_tickets'],
+                                     arguments['free_sp_tickets'], arguments['daily_income'], now)
+            initial_state = (arguments['initial_diamonds'], arguments['initial_ur_tickets'],
+                             arguments['initial_sp_tickets'], arguments['initial_ur_pity'],
+                             arguments['initial_sp_pity'])
+            runs.append((point, plan, initial_state, ResultAggregator()))
+        
+        chunk_sizes = [min(self.CHUNK_SIZE, num_simulations - start)
+                       for start in range(0, num_simulations, self.CHUNK_SIZE)]
+        for size, chunk_seed in zip(chunk_sizes, np.random.SeedSequence(seed).spawn(len(chunk_sizes))):
+            numbers = CommonRandomNumbers(size, chunk_seed)
+            for _, plan, initial_state, aggregator in runs:
+                self._simulate_batch(*initial_state, plan, size, None, aggregator, numbers.cursor())
+        
+        return {
+            'parameters': list(grid[0][0]),
+            'total_simulations': num_simulations,
+            'points': [
+                dict(self.analyze_aggregate(aggregator, plan.targeted_banners), parameters=point)
+                for point, plan, _, aggregator in runs
+            ]
+        }
+    
+    def solve_budget(self, initial_diamonds, initial_ur_tickets, initial_sp_tickets,
+                     initial_ur_pity, initial_sp_pity, free_ur_tickets, free_sp_tickets,
+                     targeted_banners, daily_income, target_success_rate, solve_for="diamonds",
+                     num_simulations=10000, seed=None):
+        """Find what a plan needs to reach target_success_rate percent.
+        
+        solve_for is "diamonds" (minimum starting diamonds), "daily_income"
+        (minimum daily income) or "copies" (maximum copies of each banner).
+        Always uses the NumPy engine; see solver.BudgetSolver.
+        """
+        now = datetime.now()
+        initial_state = (initial_diamonds, initial_ur_tickets, initial_sp_tickets,
+                         initial_ur_pity, initial_sp_pity)
+        solver = BudgetSolver(self)
+        
+        if solve_for == "copies":
+            return solver.maximum_copies(
+                initial_state,
+                lambda targets: self.compile_plan(targets, free_ur_tickets, free_sp_tickets, daily_income, now),
+                targeted_banners, target_success_rate, num_simulations, seed
+            )
+        
+        plan = self.compile_plan(targeted_banners, free_ur_tickets, free_sp_tickets, daily_income, now)
+        if solve_for == "diamonds":
+            return solver.minimum_diamonds(initial_state, plan, target_success_rate, num_simulations, seed)
+        if solve_for == "daily_income":
+            return solver.minimum_daily_income(initial_state, plan, target_success_rate, num_simulations, seed)
+        raise ValueError(f"Unknown solve_for '{solve_for}', expected diamonds, daily_income or copies")
+    
+    def run_batch(self, profiles, num_simulations=10000, seed=None, workers=1):
+        """Run many player profiles at once, e.g. the members of a guild.
+        
+        Each profile is a dict with the run_sweep base keys (initial_diamonds,
+        ..., targeted_banners, daily_income). All profiles share one banner
+        timeline and are simulated together; the result holds every profile's
+        analysis plus, per banner, how many members reach their target.
+        Always uses the NumPy engine; see batch.ProfileBatch.
+        """
+        if not profiles:
+            raise ValueError("At least one profile is required")
+        now = datetime.now()
+        plans = [
+            self.compile_plan(p['targeted_banners'], p['free_ur_tickets'], p['free_sp_tickets'],
+                              p['daily_income'], now)
+            for p in profiles
+        ]
+        initial_states = [
+            (p['initial_diamonds'], p['initial_ur_tickets'], p['initial_sp_tickets'],
+             p['initial_ur_pity'], p['initial_sp_pity'])
+            for p in profiles
+        ]
+        batch = ProfileBatch(self, plans, initial_states)
+        
+        chunk_sizes = [min(self.CHUNK_SIZE, num_simulations - start)
+                       for start in range(0, num_simulations, self.CHUNK_SIZE)]
+        seeds = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+        if workers > 1 and len(chunk_sizes) > 1:
+            chunks = _get_process_pool(workers).map(_simulate_profiles_chunk, repeat(batch), chunk_sizes, seeds)
+        else:
+            chunks = (batch.simulate_chunk(size, chunk_seed) for size, chunk_seed in zip(chunk_sizes, seeds))
+        
+        aggregator = BatchAggregator(len(profiles))
+        for chunk in chunks:
+            aggregator.merge(chunk)
+        return batch.analyze(aggregator, num_simulations)
+    
+    def _iter_batches(self, initial_state, plan, max_simulations, seed, workers, batch_size):
+        """Run batch_size batches, yielding the running aggregator after each one.
+        
+        Batches are folded in order, so a seed yields the same sequence
+        whatever the number of workers.
+        """
+        seed_sequence = np.random.SeedSequence(seed)
+        aggregator = ResultAggregator()
+        scheduled = 0
+        
+        while scheduled < max_simulations:
+            batch_sizes = []
+            for _ in range(max(1, workers)):
+                size = min(batch_size, max_simulations - scheduled)
+                if size <= 0:
                     break
-            if banner_info:
-                sorted_targets.append((banner_name, target_copies, banner_info[2]))  # Add start_date
+                batch_sizes.append(size)
+                scheduled += size
+            seeds = seed_sequence.spawn(len(batch_sizes))
+            
+            if workers > 1 and len(batch_sizes) > 1:
+                batches = _get_process_pool(workers).map(
+                    _simulate_chunk, repeat(self), repeat(initial_state), repeat(plan), batch_sizes, seeds
+                )
+            else:
+                batches = (self._simulate_chunk(initial_state, plan, size, batch_seed)
+                           for size, batch_seed in zip(batch_sizes, seeds))
+            
+            for batch in batches:
+                aggregator.merge(batch)
+                yield aggregator
+    
+    def _run_adaptive(self, initial_state, plan, max_simulations, seed, workers,
+                      target_precision, confidence, should_stop=None):
+        """Run ADAPTIVE_BATCH_SIZE batches until the target precision or max_simulations is
+        reached, or should_stop() returns True"""
+        aggregator = ResultAggregator()
+        for aggregator in self._iter_batches(initial_state, plan, max_simulations, seed, workers,
+                                             self.ADAPTIVE_BATCH_SIZE):
+            if self._precision_reached(aggregator, target_precision, confidence):
+                break
+            if should_stop is not None and should_stop():
+                break
+        return aggregator
+    
+    def _precision_reached(self, aggregator, target_precision, confidence):
+        """Check that every success rate interval is at most target_precision wide on each side"""
+        for low, high in aggregator.success_intervals(confidence).values():
+            if (high - low) / 2 > target_precision:
+                return False
+        return True
+    
+    def _run_from_prefix(self, initial_state, plan, chunk_sizes, seeds, seed, workers, prefix_cache):
+        """Resume every chunk from the longest cached plan prefix, caching the state after each later banner"""
+        base_key = (self.engine, tuple(initial_state), sum(chunk_sizes), seed)
+        cached_steps, resume = prefix_cache.longest_prefix(base_key, plan.step_keys)
+        if resume is None:
+            resume = [None] * len(chunk_sizes)
+        
+        # Plans are mostly edited at the end (last target changed, or a banner
+        # added), so only the plan without its last banner and the whole plan
+        # are worth a snapshot
+        snapshot_steps = sorted({step for step in (len(plan) - 1, len(plan)) if step > cached_steps})
         
-        # Sort by start date
-        sorted_targets.sort(key=lambda x: x[2])
-        # Remove the date from the tuple
-        targeted_banners = [(name, copies) for name, copies, _ in sorted_targets]
+        if workers > 1 and len(chunk_sizes) > 1:
+            chunks = _get_process_pool(workers).map(
+                _simulate_chunk_from, repeat(self), repeat(initial_state), repeat(plan), chunk_sizes, seeds, resume,
+                repeat(snapshot_steps)
+            )
+        else:
+            chunks = (self._simulate_chunk_from(initial_state, plan, size, chunk_seed, chunk_resume, snapshot_steps)
+                      for size, chunk_seed, chunk_resume in zip(chunk_sizes, seeds, resume))
         
-        # Create set of targeted banner names for quick lookup
-        targeted_banner_names = {name for name, _ in targeted_banners}
+        aggregator = ResultAggregator()
+        snapshots = []
+        for chunk, chunk_snapshots in chunks:
+            aggregator.merge(chunk)
+            snapshots.append(chunk_snapshots)
         
-        results = []
+        for step in snapshot_steps:
+            prefix_cache.set(base_key, plan.step_keys[:step], [chunk[step] for chunk in snapshots])
+        return aggregator
+    
+    def _simulate_chunk_from(self, initial_state, plan, num_simulations, seed_sequence, resume, snapshot_steps):
+        """Run one NumPy engine chunk from a snapshot (or the start), returning the
+        aggregator and a snapshot after each of the snapshot_steps first banners"""
+        aggregator = ResultAggregator()
+        snapshots = dict.fromkeys(snapshot_steps)
+        rng = np.random.default_rng(seed_sequence)
+        self._simulate_batch(*initial_state, plan, num_simulations, rng, aggregator,
+                             resume=resume, snapshots=snapshots)
+        return aggregator, snapshots
+    
+    def _simulate_chunk(self, initial_state, plan, num_simulations, seed_sequence):
+        """Run one independently seeded chunk of simulations into a ResultAggregator"""
+        aggregator = ResultAggregator()
+        
+        if self.sampling is not None:
+            numbers = SampledNumbers(num_simulations, seed_sequence, self.sampling)
+            aggregator.track_replicates(numbers.replicate_ids)
+            self._simulate_batch(*initial_state, plan, num_simulations, None, aggregator, numbers.cursor())
+        elif self.engine in ("numpy", "exact"):
+            rng = np.random.default_rng(seed_sequence)
+            self._simulate_batch(*initial_state, plan, num_simulations, rng, aggregator)
+        else:
+            self.random = random.Random(int.from_bytes(seed_sequence.generate_state(4).tobytes(), 'little'))
+            aggregator.add_simulation_results(self._simulate_scalar(*initial_state, plan, num_simulations))
+        
+        return aggregator
+    
+    def _simulate_scalar(self, initial_diamonds, initial_ur_tickets, initial_sp_tickets,
+                         initial_ur_pity, initial_sp_pity, plan, num_simulations):
+        """Simulate one pull sequence at a time, returning a SimulationResults"""
+        rows = []
+        pull_banner = self._pull_banner
+        pull_cost = self.PULL_COST
         
         for sim in range(num_simulations):
             diamonds = initial_diamonds
@@ -167,186 +753,142 @@ class GachaSimulator:
             ur_pity = initial_ur_pity
             sp_pity = initial_sp_pity
             
-            current_date = datetime.now()
-            sim_success = True
-            banner_results = []
-            last_banner_end_date = current_date
-            
-            for banner_name, target_copies in targeted_banners:
-                # Find banner info
-                banner_info = None
-                for b in self.BANNERS:
-                    if b[0] == banner_name:
-                        banner_info = b
-                        break
-                
-                if not banner_info:
-                    continue
-                
-                _, banner_type, start_date, end_date = banner_info
-                
-                # Skip banners that have already ended
-                if end_date < current_date:
-                    continue
-                
-                # Get banner tag (rebanner or new release)
-                banner_tag = self.get_banner_tag(banner_name)
-                
-                # Track diamonds at start of this banner (before adding income)
-                diamonds_before_income = diamonds
-                
-                # Calculate free tickets from all banners (selected or not) between last banner and this one
-                free_ur_gained = 0
-                free_sp_gained = 0
-                
-                for b in self.BANNERS:
-                    b_name, b_type, b_start, b_end = b
-                    # Check if banner falls between last targeted banner and current targeted banner
-                    if b_start >= last_banner_end_date and b_end <= start_date:
-                        b_tag = self.get_banner_tag(b_name)
-                        if b_tag == "new release":
-                            if b_type == "UR":
-                                free_ur_gained += free_ur_tickets
-                            else:  # SP
-                                free_sp_gained += free_sp_tickets
-                
-                # Add free tickets from current banner if it's a new release
-                if banner_tag == "new release":
-                    if banner_type == "UR":
-                        free_ur_gained += free_ur_tickets
-                    else:
-                        free_sp_gained += free_sp_tickets
-                
-                # Add the free tickets to inventory
+            for banner_type, target_copies, diamonds_gained, free_ur_gained, free_sp_gained in plan.schedule:
+                # Add the free tickets and income granted since the last banner
                 ur_tickets += free_ur_gained
                 sp_tickets += free_sp_gained
+                diamonds += diamonds_gained
                 
-                # Calculate days until banner starts and add daily income
-                if start_date > current_date:
-                    days_diff = (start_date - current_date).days
-                    diamonds += days_diff * daily_income
-                    current_date = start_date
-                
-                # Calculate actual days remaining in banner based on current date
-                # If banner already started, use current_date; otherwise use start_date
-                effective_start = max(current_date, start_date)
-                
-                # Calculate days remaining, ensuring at least 1 day if banner is still active
-                banner_duration_days = max(1, (end_date - effective_start).days)
-                
-                # Add diamonds earned during the remaining banner duration
-                diamonds += banner_duration_days * daily_income
-                
-                # Calculate total diamonds gained since last banner
-                total_diamonds_gained = diamonds - diamonds_before_income
-                
-                # Determine which tickets and pity to use
+                # Simulate banner with the tickets and pity of its type
                 if banner_type == "UR":
-                    tickets = ur_tickets
-                    pity = ur_pity
+                    (success, total_pulls, pulls_with_diamonds, tickets_used, milestone_tickets,
+                     milestone_copies, copies_obtained, diamonds, ur_tickets, ur_pity) = pull_banner(
+                        diamonds, ur_tickets, ur_pity, target_copies, banner_type
+                    )
                 else:
-                    tickets = sp_tickets
-                    pity = sp_pity
-                
-                # Simulate banner - now properly uses ALL available resources
-                result = self.simulate_banner(
-                    diamonds, tickets, pity, target_copies, banner_type
-                )
-                
-                # Update resources
-                diamonds = result['diamonds_remaining']
-                
-                # Update tickets and pity based on banner type
-                if banner_type == "UR":
-                    ur_tickets = result['tickets_remaining']
-                    ur_pity = result['final_pity']
-                else:
-                    sp_tickets = result['tickets_remaining']
-                    sp_pity = result['final_pity']
-                
-                result['banner_name'] = banner_name
-                result['banner_type'] = banner_type
-                result['banner_tag'] = banner_tag
-                result['banner_start_date'] = start_date
-                result['banner_end_date'] = end_date
-                result['banner_duration_days'] = banner_duration_days
-                result['total_diamonds_gained'] = total_diamonds_gained
-                result['free_ur_tickets_gained'] = free_ur_gained
-                result['free_sp_tickets_gained'] = free_sp_gained
-                result['milestone_tickets_gained'] = result['milestone_tickets']
-                result['remaining_diamonds'] = diamonds
-                result['remaining_ur_tickets'] = ur_tickets
-                result['remaining_sp_tickets'] = sp_tickets
-                result['remaining_ur_pity'] = ur_pity
-                result['remaining_sp_pity'] = sp_pity
-                banner_results.append(result)
-                
-                if not result['success']:
-                    sim_success = False
+                    (success, total_pulls, pulls_with_diamonds, tickets_used, milestone_tickets,
+                     milestone_copies, copies_obtained, diamonds, sp_tickets, sp_pity) = pull_banner(
+                        diamonds, sp_tickets, sp_pity, target_copies, banner_type
+                    )
                 
-                # Move current date to end of banner and update last banner end date
-                current_date = end_date
-                last_banner_end_date = end_date
+                # Only the values that vary between simulations, in SimulationResults.DTYPE order
+                rows.append((success, total_pulls, pulls_with_diamonds * pull_cost, tickets_used,
+                             milestone_tickets, milestone_copies, copies_obtained, diamonds,
+                             ur_tickets, sp_tickets, ur_pity, sp_pity))
+        
+        values = np.array(rows, dtype=SimulationResults.DTYPE).reshape(num_simulations, len(plan))
+        return SimulationResults(plan.steps, values)
+    
+    def _simulate_batch(self, initial_diamonds, initial_ur_tickets, initial_sp_tickets,
+                        initial_ur_pity, initial_sp_pity, plan, num_simulations, rng, aggregator,
+                        hits=None, resume=None, snapshots=None):
+        """Run every simulation at once with the NumPy engine, adding the results to aggregator.
+        
+        resume is a snapshot to continue from instead of the initial state.
+        snapshots, when given, is a dict keyed by banner counts: each gets a
+        snapshot after that many banners.
+        """
+        if resume is None:
+            first_step = 0
+            diamonds = np.full(num_simulations, initial_diamonds, dtype=np.int64)
+            ur_tickets = np.full(num_simulations, initial_ur_tickets, dtype=np.int64)
+            sp_tickets = np.full(num_simulations, initial_sp_tickets, dtype=np.int64)
+            ur_pity = np.full(num_simulations, initial_ur_pity, dtype=np.int64)
+            sp_pity = np.full(num_simulations, initial_sp_pity, dtype=np.int64)
+            sim_success = np.ones(num_simulations, dtype=bool)
+        else:
+            first_step = resume['step']
+            diamonds, ur_tickets, sp_tickets, ur_pity, sp_pity = resume['state']
+            sim_success = resume['success'].copy()
+            rng.bit_generator.state = resume['rng_state']
+            aggregator.merge(copy.deepcopy(resume['aggregator']))
+        
+        for index in range(first_step, len(plan.steps)):
+            step = plan.steps[index]
+            banner_name = step['banner_name']
+            banner_type = step['banner_type']
+            target_copies = step['target_copies']
+            
+            # Rebind rather than update in place: earlier banners keep references to these arrays
+            ur_tickets = ur_tickets + step['free_ur_tickets_gained']
+            sp_tickets = sp_tickets + step['free_sp_tickets_gained']
+            diamonds = diamonds + step['total_diamonds_gained']
             
-            results.append({
-                'success': sim_success,
-                'banner_results': banner_results,
-                'final_diamonds': diamonds,
-                'final_ur_tickets': ur_tickets,
-                'final_sp_tickets': sp_tickets
+            if banner_type == "UR":
+                tickets, pity = ur_tickets, ur_pity
+            else:
+                tickets, pity = sp_tickets, sp_pity
+            
+            result = self.simulate_banner_batch(
+                diamonds, tickets, pity, target_copies, banner_type, rng, hits
+            )
+            
+            diamonds = result['diamonds_remaining']
+            if banner_type == "UR":
+                ur_tickets = result['tickets_remaining']
+                ur_pity = result['final_pity']
+            else:
+                sp_tickets = result['tickets_remaining']
+                sp_pity = result['final_pity']
+            
+            sim_success &= result['success']
+            
+            aggregator.add_banner(step, result['success'], {
+                'total_pulls': result['total_pulls'],
+                'diamonds_spent': result['diamonds_spent'],
+                'tickets_used': result['tickets_used'],
+                'remaining_diamonds': diamonds,
+                'remaining_ur_tickets': ur_tickets,
+                'remaining_sp_tickets': sp_tickets,
+                'milestone_tickets_gained': result['milestone_tickets'],
+                'milestone_copies': result['milestone_copies'],
+                'base_copies': result['copies_obtained'] - result['milestone_copies']
             })
+            
+            if snapshots is not None and index + 1 in snapshots:
+                snapshots[index + 1] = {
+                    'step': index + 1,
+                    'state': (diamonds, ur_tickets, sp_tickets, ur_pity, sp_pity),
+                    'success': sim_success.copy(),
+                    'rng_state': rng.bit_generator.state,
+                    'aggregator': copy.deepcopy(aggregator)
+                }
         
-        return self.analyze_results(results, num_simulations, targeted_banners)
+        aggregator.add_success(sim_success)
+        return aggregator
     
     def analyze_results(self, results, num_sims, targeted_banners):
-        """Analyze simulation results"""
-        success_count = sum(1 for r in results if r['success'])
-        success_rate = (success_count / num_sims) * 100
-        
-        # Per-banner statistics
-        banner_stats = defaultdict(lambda: {
-            'total_pulls': [],
-            'diamonds_spent': [],
-            'tickets_used': [],
-            'success_count': 0,
-            'remaining_diamonds': [],
-            'remaining_ur_tickets': [],
-            'remaining_sp_tickets': [],
-            'start_date': None,
-            'end_date': None,
-            'duration_days': 0,
-            'total_diamonds_gained': [],
-            'free_ur_tickets_gained': [],
-            'free_sp_tickets_gained': [],
-            'milestone_tickets_gained': [],
-            'milestone_copies': [],
-            'banner_tag': None
-        })
-        
-        for result in results:
-            for banner_result in result['banner_results']:
-                name = banner_result['banner_name']
-                banner_stats[name]['total_pulls'].append(banner_result['total_pulls'])
-                banner_stats[name]['diamonds_spent'].append(banner_result['diamonds_spent'])
-                banner_stats[name]['tickets_used'].append(banner_result['tickets_used'])
-                banner_stats[name]['remaining_diamonds'].append(banner_result['remaining_diamonds'])
-                banner_stats[name]['remaining_ur_tickets'].append(banner_result['remaining_ur_tickets'])
-                banner_stats[name]['remaining_sp_tickets'].append(banner_result['remaining_sp_tickets'])
-                banner_stats[name]['total_diamonds_gained'].append(banner_result['total_diamonds_gained'])
-                banner_stats[name]['free_ur_tickets_gained'].append(banner_result['free_ur_tickets_gained'])
-                banner_stats[name]['free_sp_tickets_gained'].append(banner_result['free_sp_tickets_gained'])
-                banner_stats[name]['milestone_tickets_gained'].append(banner_result['milestone_tickets_gained'])
-                banner_stats[name]['milestone_copies'].append(banner_result['milestone_copies'])
-                base_copies = banner_result['copies_obtained'] - banner_result['milestone_copies']
-                banner_stats[name].setdefault('base_copies', []).append(base_copies)
-                banner_stats[name]['start_date'] = banner_result['banner_start_date']
-                banner_stats[name]['end_date'] = banner_result['banner_end_date']
-                banner_stats[name]['duration_days'] = banner_result['banner_duration_days']
-                banner_stats[name]['banner_tag'] = banner_result['banner_tag']
-                if banner_result['success']:
-                    banner_stats[name]['success_count'] += 1
-        
-        # Calculate percentiles
+        """Analyze a SimulationResults (or a list of per-simulation result dicts)"""
+        aggregator = ResultAggregator()
+        if isinstance(results, SimulationResults):
+            aggregator.add_simulation_results(results)
+        else:
+            aggregator.add_results(results)
+        return self.analyze_aggregate(aggregator, targeted_banners, num_sims)
+    
+    def analyze_aggregate(self, aggregator, targeted_banners, num_sims=None, histograms=False):
+        """Analyze simulations collected in a ResultAggregator"""
+        if num_sims is None:
+            num_sims = aggregator.num_sims
+        success_rate = (aggregator.success_count / num_sims) * 100
+        analysis = self._build_analysis(
+            success_rate, num_sims, targeted_banners, aggregator.banner_stats(),
+            mean=histogram_mean, percentile=histogram_percentile,
+            distribution=(lambda histogram: (histogram.values, histogram.counts)) if histograms else None
+        )
+        if aggregator.replicate_sizes:
+            analysis['sampling'] = variance_report(aggregator, self.sampling)
+        return analysis
+    
+    def _build_analysis(self, success_rate, num_sims, targeted_banners, banner_stats,
+                        mean=np.mean, percentile=np.percentile, distribution=None):
+        """Calculate per-banner percentiles from collected per-simulation values.
+        
+        mean and percentile can be swapped for engines whose values are
+        weighted distributions rather than samples. When distribution is
+        given, it maps collected values to (sorted values, counts) arrays,
+        which are added as the banner's 'histograms'.
+        """
         analysis = {
             'success_rate': success_rate,
             'total_simulations': num_sims,
@@ -357,39 +899,71 @@ class GachaSimulator:
             if banner_name in banner_stats:
                 stats = banner_stats[banner_name]
                 analysis['banner_statistics'][banner_name] = {
-                    'avg_pulls': np.mean(stats['total_pulls']),
-                    'median_pulls': np.median(stats['total_pulls']),
-                    'p10_pulls': np.percentile(stats['total_pulls'], 10),
-                    'p50_pulls': np.percentile(stats['total_pulls'], 50),
-                    'p90_pulls': np.percentile(stats['total_pulls'], 90),
-                    'avg_diamonds': np.mean(stats['diamonds_spent']),
-                    'median_diamonds': np.median(stats['diamonds_spent']),
-                    'p10_diamonds': np.percentile(stats['diamonds_spent'], 10),
-                    'p50_diamonds': np.percentile(stats['diamonds_spent'], 50),
-                    'p90_diamonds': np.percentile(stats['diamonds_spent'], 90),
+                    'avg_pulls': mean(stats['total_pulls']),
+                    'median_pulls': percentile(stats['total_pulls'], 50),
+                    'p10_pulls': percentile(stats['total_pulls'], 10),
+                    'p50_pulls': percentile(stats['total_pulls'], 50),
+                    'p90_pulls': percentile(stats['total_pulls'], 90),
+                    'avg_diamonds': mean(stats['diamonds_spent']),
+                    'median_diamonds': percentile(stats['diamonds_spent'], 50),
+                    'p10_diamonds': percentile(stats['diamonds_spent'], 10),
+                    'p50_diamonds': percentile(stats['diamonds_spent'], 50),
+                    'p90_diamonds': percentile(stats['diamonds_spent'], 90),
                     'success_rate': (stats['success_count'] / num_sims) * 100,
-                    'avg_remaining_diamonds': np.mean(stats['remaining_diamonds']),
-                    'median_remaining_diamonds': np.median(stats['remaining_diamonds']),
-                    'avg_remaining_ur_tickets': np.mean(stats['remaining_ur_tickets']),
-                    'median_remaining_ur_tickets': np.median(stats['remaining_ur_tickets']),
-                    'avg_remaining_sp_tickets': np.mean(stats['remaining_sp_tickets']),
-                    'median_remaining_sp_tickets': np.median(stats['remaining_sp_tickets']),
-                    'total_diamonds_gained': int(np.mean(stats['total_diamonds_gained'])),
-                    'free_ur_tickets_gained': int(np.mean(stats['free_ur_tickets_gained'])),
-                    'free_sp_tickets_gained': int(np.mean(stats['free_sp_tickets_gained'])),
-                    'milestone_tickets_gained': float(np.mean(stats['milestone_tickets_gained'])),
-                    'milestone_copies_rate': float(np.mean(stats['milestone_copies'])),
-                    'avg_base_copies': float(np.mean(stats['base_copies'])) if 'base_copies' in stats else 0,
+                    'avg_remaining_diamonds': mean(stats['remaining_diamonds']),
+                    'median_remaining_diamonds': percentile(stats['remaining_diamonds'], 50),
+                    'avg_remaining_ur_tickets': mean(stats['remaining_ur_tickets']),
+                    'median_remaining_ur_tickets': percentile(stats['remaining_ur_tickets'], 50),
+                    'avg_remaining_sp_tickets': mean(stats['remaining_sp_tickets']),
+                    'median_remaining_sp_tickets': percentile(stats['remaining_sp_tickets'], 50),
+                    'total_diamonds_gained': int(mean(stats['total_diamonds_gained'])),
+                    'free_ur_tickets_gained': int(mean(stats['free_ur_tickets_gained'])),
+                    'free_sp_tickets_gained': int(mean(stats['free_sp_tickets_gained'])),
+                    'milestone_tickets_gained': float(mean(stats['milestone_tickets_gained'])),
+                    'milestone_copies_rate': float(mean(stats['milestone_copies'])),
+                    'avg_base_copies': float(mean(stats['base_copies'])) if 'base_copies' in stats else 0,
                     'start_date': stats['start_date'],
                     'end_date': stats['end_date'],
                     'duration_days': stats['duration_days'],
                     'banner_tag': stats['banner_tag']
                 }
+                if distribution is not None:
+                    analysis['banner_statistics'][banner_name]['histograms'] = {
+                        metric: dict(zip(('values', 'counts'), distribution(stats[metric])))
+                        for metric in self.HISTOGRAM_METRICS
+                    }
         
         return analysis
 
 
-def main():
+_process_pools = {}
+
+
+def _get_process_pool(workers):
+    """Reuse one process pool per worker count across requests"""
+    if workers not in _process_pools:
+        _process_pools[workers] = ProcessPoolExecutor(max_workers=workers)
+    return _process_pools[workers]
+
+
+def _simulate_chunk(simulator, initial_state, plan, num_simulations, seed_sequence):
+    """Process pool entry point for GachaSimulator._simulate_chunk"""
+    return simulator._simulate_chunk(initial_state, plan, num_simulations, seed_sequence)
+
+
+def _simulate_chunk_from(simulator, initial_state, plan, num_simulations, seed_sequence, resume, snapshot_steps):
+    """Process pool entry point for GachaSimulator._simulate_chunk_from"""
+    return simulator._simulate_chunk_from(initial_state, plan, num_simulations, seed_sequence, resume,
+                                          snapshot_steps)
+
+
+def _simulate_profiles_chunk(batch, num_simulations, seed_sequence):
+    """Process pool entry point for batch.ProfileBatch.simulate_chunk"""
+    return batch.simulate_chunk(num_simulations, seed_sequence)
+
+
+def interactive():
+    """Prompt for one plan and print a formatted report (python cli.py --interactive)"""
     print("=" * 70)
     print("Haikyuu Fly High Gacha Monte Carlo Simulation")
     print("=" * 70)
@@ -491,5 +1065,11 @@ def main():
         print(f"    Avg SP Tickets: {stats['avg_remaining_sp_tickets']:.1f} | Median: {stats['median_remaining_sp_tickets']:.1f}")
 
 
+def main():
+    """Command line entry point, see cli.py"""
+    from cli import main as cli_main
+    cli_main()
+
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
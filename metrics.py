@@ -0,0 +1,112 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+
+class PhaseTimer:
+    """Wall time per named phase and counters for one request"""
+    
+    def __init__(self):
+        self.phases = {}
+        self.counters = {}
+    
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+    
+    def count(self, name, value):
+        self.counters[name] = self.counters.get(name, 0) + value
+    
+    def server_timing(self, total=None):
+        """Server-Timing header value, durations in milliseconds"""
+        entries = []
+        for name, seconds in self.phases.items():
+            entry = f"{name};dur={seconds * 1000:.2f}"
+            if name == 'simulate' and self.counters.get('simulations') and seconds > 0:
+                entry += f';desc="{self.counters["simulations"] / seconds:.0f} sims/s"'
+            entries.append(entry)
+        if total is not None:
+            entries.append(f"total;dur={total * 1000:.2f}")
+        return ', '.join(entries)
+
+
+class Histogram:
+    """Cumulative bucket counts in the Prometheus layout"""
+    
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Counters, gauges and histograms rendered in the Prometheus text format"""
+    
+    LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+    SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}  # name -> (type, help, {labels: value})
+    
+    def _series(self, name, metric_type, help_text):
+        if name not in self._metrics:
+            self._metrics[name] = (metric_type, help_text, {})
+        return self._metrics[name][2]
+    
+    def inc(self, name, value=1, help_text='', **labels):
+        with self._lock:
+            series = self._series(name, 'counter', help_text)
+            key = tuple(sorted(labels.items()))
+            series[key] = series.get(key, 0) + value
+    
+    def set_max(self, name, value, help_text='', **labels):
+        """Gauge that keeps the largest value seen"""
+        with self._lock:
+            series = self._series(name, 'gauge', help_text)
+            key = tuple(sorted(labels.items()))
+            series[key] = max(series.get(key, value), value)
+    
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, help_text='', **labels):
+        with self._lock:
+            series = self._series(name, 'histogram', help_text)
+            key = tuple(sorted(labels.items()))
+            if key not in series:
+                series[key] = Histogram(buckets)
+            series[key].observe(value)
+    
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, (metric_type, help_text, series) in sorted(self._metrics.items()):
+                if help_text:
+                    lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for key, value in sorted(series.items()):
+                    if metric_type == 'histogram':
+                        cumulative = 0
+                        for bound, count in zip(value.buckets + ('+Inf',), value.counts):
+                            cumulative += count
+                            lines.append(f"{name}_bucket{_labels(key + (('le', bound),))} {cumulative}")
+                        lines.append(f"{name}_sum{_labels(key)} {value.sum}")
+                        lines.append(f"{name}_count{_labels(key)} {value.count}")
+                    else:
+                        lines.append(f"{name}{_labels(key)} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(key):
+    if not key:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in key) + '}'
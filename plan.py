@@ -0,0 +1,137 @@
+from datetime import datetime
+
+import numpy as np
+
+from banners import BannerIndex, current_schedule, get_banner_tag
+
+
+_index_cache = {}
+
+
+def get_banner_index(banners=None):
+    """Return the index for a banner list, building it once per list.
+    
+    Without a list, the index of the current schedule, which follows reloads.
+    """
+    if banners is None:
+        return current_schedule().index
+    cached = _index_cache.get(id(banners))
+    if cached is None or cached.banners is not banners:
+        cached = BannerIndex(banners)
+        _index_cache[id(banners)] = cached
+    return cached
+
+
+class CompiledPlan:
+    """Per-banner schedule of a request, independent of pull outcomes.
+    
+    steps holds one dict per targeted banner still running, in chronological
+    order. The same values are also kept as NumPy arrays (one entry per step)
+    so engines can consume them without touching the banner schedule.
+    """
+    
+    def __init__(self, steps, daily_income, now):
+        self.steps = steps
+        self.daily_income = daily_income
+        self.now = now
+        
+        self.targeted_banners = [(step['banner_name'], step['target_copies']) for step in steps]
+        self.banner_types = [step['banner_type'] for step in steps]
+        self.is_ur = np.array([t == "UR" for t in self.banner_types], dtype=bool)
+        self.target_copies = np.array([step['target_copies'] for step in steps], dtype=np.int64)
+        self.income_days = np.array([step['income_days'] for step in steps], dtype=np.int64)
+        self.diamonds_gained = np.array([step['total_diamonds_gained'] for step in steps], dtype=np.int64)
+        self.free_ur_tickets = np.array([step['free_ur_tickets_gained'] for step in steps], dtype=np.int64)
+        self.free_sp_tickets = np.array([step['free_sp_tickets_gained'] for step in steps], dtype=np.int64)
+        
+        # Everything a step contributes to a simulation, so equal prefixes of
+        # two plans can share cached simulation state
+        self.step_keys = [
+            (step['banner_name'], step['target_copies'], step['start_date'], step['end_date'],
+             step['duration_days'], step['total_diamonds_gained'], step['free_ur_tickets_gained'],
+             step['free_sp_tickets_gained'])
+            for step in steps
+        ]
+        
+        # Plain tuples for the scalar engine's per-simulation loop
+        self.schedule = [
+            (step['banner_type'], step['target_copies'], step['total_diamonds_gained'],
+             step['free_ur_tickets_gained'], step['free_sp_tickets_gained'])
+            for step in steps
+        ]
+    
+    def __len__(self):
+        return len(self.steps)
+
+
+def compile_plan(targeted_banners, free_ur_tickets, free_sp_tickets, daily_income,
+                 now=None, banners=None):
+    """Turn a request into a CompiledPlan.
+    
+    Sorts the targets by start date, drops unknown and already ended banners,
+    and works out the income and free tickets granted before each one.
+    """
+    index = get_banner_index(banners)
+    if now is None:
+        now = datetime.now()
+    
+    # Sort targeted banners by start date, ignoring unknown names
+    sorted_targets = []
+    for banner_name, target_copies in targeted_banners:
+        banner_info = index.get(banner_name)
+        if banner_info:
+            sorted_targets.append((banner_info, target_copies))
+    sorted_targets.sort(key=lambda x: x[0][2])
+    
+    current_date = now
+    last_banner_end_date = now
+    steps = []
+    
+    for banner_info, target_copies in sorted_targets:
+        banner_name, banner_type, start_date, end_date = banner_info
+        
+        # Skip banners that have already ended
+        if end_date < current_date:
+            continue
+        
+        banner_tag = get_banner_tag(banner_name)
+        
+        # Free tickets from new releases between the last targeted banner and this one
+        ur_releases, sp_releases = index.count_new_releases(last_banner_end_date, start_date)
+        free_ur_gained = ur_releases * free_ur_tickets
+        free_sp_gained = sp_releases * free_sp_tickets
+        
+        if banner_tag == "new release":
+            if banner_type == "UR":
+                free_ur_gained += free_ur_tickets
+            else:
+                free_sp_gained += free_sp_tickets
+        
+        # Days of income until the banner starts plus days during the banner
+        income_days = 0
+        if start_date > current_date:
+            income_days += (start_date - current_date).days
+            current_date = start_date
+        
+        effective_start = max(current_date, start_date)
+        banner_duration_days = max(1, (end_date - effective_start).days)
+        income_days += banner_duration_days
+        
+        steps.append({
+            'banner_name': banner_name,
+            'banner_type': banner_type,
+            'banner_tag': banner_tag,
+            'target_copies': target_copies,
+            'start_date': start_date,
+            'end_date': end_date,
+            'duration_days': banner_duration_days,
+            'income_days': income_days,
+            'total_diamonds_gained': income_days * daily_income,
+            'free_ur_tickets_gained': free_ur_gained,
+            'free_sp_tickets_gained': free_sp_gained
+        })
+        
+        current_date = end_date
+        last_banner_end_date = end_date
+    
+    return CompiledPlan(steps, daily_income, now)
@@ -0,0 +1,109 @@
+import numpy as np
+
+from sweep import HitCursor
+
+# "plain" draws independent uniforms, the others reduce the variance of the estimates
+SAMPLING_MODES = ("plain", "antithetic", "stratified", "qmc")
+
+# Independently randomized groups per chunk; the spread of their success
+# rates measures the variance actually achieved
+REPLICATES_PER_CHUNK = 16
+
+_primes = []
+
+
+def _prime(index):
+    """The index-th prime (0-based), extending the list as needed"""
+    candidate = _primes[-1] + 1 if _primes else 2
+    while len(_primes) <= index:
+        if all(candidate % p for p in _primes if p * p <= candidate):
+            _primes.append(candidate)
+        candidate += 1
+    return _primes[index]
+
+
+class SampledNumbers:
+    """Uniform draws behind each simulation's featured copies, for one chunk.
+    
+    Same layout as sweep.CommonRandomNumbers: row j of a banner type's table
+    holds the uniform behind each simulation's (j+1)-th featured copy of that
+    type, and it maps to a hit time through the inverse CDF, so the first row
+    decides the first-hit pity position. The simulations are split into
+    replicate groups and every row is generated per group by mode:
+    
+    antithetic  the second half of a group mirrors the first (1 - u)
+    stratified  one draw in each of the group's equal-width strata, in random
+                order (a Latin hypercube over the featured copies)
+    qmc         a Kronecker lattice with the square roots of the primes as
+                generators, scrambled by a random shift per group and row
+    
+    Each group is an unbiased estimator on its own, so the spread between
+    groups gives an honest variance for every mode.
+    """
+    
+    def __init__(self, num_sims, seed_sequence, mode, replicates=REPLICATES_PER_CHUNK):
+        if mode not in SAMPLING_MODES:
+            raise ValueError(f"Unknown sampling mode '{mode}', expected one of {SAMPLING_MODES}")
+        self.num_sims = num_sims
+        self.mode = mode
+        replicates = max(1, min(replicates, num_sims // 2))
+        self.bounds = np.linspace(0, num_sims, replicates + 1).astype(np.int64)
+        self.replicate_ids = np.repeat(np.arange(replicates), np.diff(self.bounds))
+        self._rngs = {
+            banner_type: np.random.default_rng(child)
+            for banner_type, child in zip(("UR", "SP"), seed_sequence.spawn(2))
+        }
+        self._tables = {banner_type: np.empty((0, num_sims)) for banner_type in self._rngs}
+    
+    def _row(self, banner_type, hit_index):
+        rng = self._rngs[banner_type]
+        # UR and SP rows interleave as lattice dimensions
+        generator = np.sqrt(_prime(2 * hit_index + (banner_type == "SP"))) % 1.0
+        row = np.empty(self.num_sims)
+        for start, end in zip(self.bounds[:-1], self.bounds[1:]):
+            size = end - start
+            if self.mode == "plain":
+                row[start:end] = rng.random(size)
+            elif self.mode == "antithetic":
+                half = rng.random((size + 1) // 2)
+                row[start:end] = np.concatenate([half, 1.0 - half])[:size]
+            elif self.mode == "stratified":
+                row[start:end] = (rng.permutation(size) + rng.random(size)) / size
+            else:
+                row[start:end] = (rng.random() + np.arange(1, size + 1) * generator) % 1.0
+        return row
+    
+    def uniforms(self, banner_type, rows, hit_index):
+        table = self._tables[banner_type]
+        needed = int(hit_index.max()) + 1
+        if needed > table.shape[0]:
+            table = np.vstack([table] + [self._row(banner_type, j) for j in range(table.shape[0], needed)])
+            self._tables[banner_type] = table
+        return table[hit_index, rows]
+    
+    def cursor(self):
+        return HitCursor(self)
+
+
+def variance_report(aggregator, mode):
+    """Measured standard error of the overall success rate, compared with plain sampling"""
+    sizes = np.concatenate(aggregator.replicate_sizes)
+    successes = np.concatenate(aggregator.replicate_successes)
+    num_sims = int(sizes.sum())
+    rate = successes.sum() / num_sims
+    
+    plain_variance = float(rate * (1 - rate) / num_sims)
+    variance = None
+    if len(sizes) > 1:
+        # Between-group variance, pooled over groups of slightly different sizes
+        variance = float(np.sum(sizes * (successes / sizes - rate) ** 2) / ((len(sizes) - 1) * num_sims))
+    reduction = plain_variance / variance if variance else None
+    
+    return {
+        'mode': mode,
+        'replicates': len(sizes),
+        'standard_error': float(np.sqrt(variance)) * 100 if variance is not None else None,
+        'plain_standard_error': float(np.sqrt(plain_variance)) * 100,
+        'variance_reduction': reduction,
+        'equivalent_plain_simulations': int(num_sims * reduction) if reduction else None
+    }
@@ -0,0 +1,159 @@
+import numpy as np
+
+from aggregate import Histogram, ResultAggregator
+from sweep import CommonRandomNumbers
+
+
+class BudgetSolver:
+    """Answers "how much do I need" questions for GachaSimulator.
+    
+    For a fixed pull sequence, success only depends on whether the diamond
+    balance stays non-negative after every banner, and the diamond pulls a
+    banner needs do not depend on the starting diamonds or income (tickets
+    are always spent first). One run with unlimited diamonds therefore gives
+    every simulation's exact requirement, and the minimum budget for a
+    success rate is a quantile of those requirements, with no search.
+    """
+    
+    # Stands in for unlimited diamonds while measuring requirements
+    UNLIMITED_DIAMONDS = 1 << 40
+    
+    # Most copies of one banner maximum_copies tries
+    COPIES_LIMIT = 10
+    
+    def __init__(self, simulator):
+        self.sim = simulator
+    
+    def _diamond_pulls(self, initial_state, plan, num_simulations, rng):
+        """Diamond pulls each simulation makes on every banner when diamonds are unlimited"""
+        _, initial_ur_tickets, initial_sp_tickets, initial_ur_pity, initial_sp_pity = initial_state
+        diamonds = np.full(num_simulations, self.UNLIMITED_DIAMONDS, dtype=np.int64)
+        tickets = {
+            "UR": np.full(num_simulations, initial_ur_tickets, dtype=np.int64),
+            "SP": np.full(num_simulations, initial_sp_tickets, dtype=np.int64)
+        }
+        pity = {
+            "UR": np.full(num_simulations, initial_ur_pity, dtype=np.int64),
+            "SP": np.full(num_simulations, initial_sp_pity, dtype=np.int64)
+        }
+        
+        diamond_pulls = np.zeros((len(plan), num_simulations), dtype=np.int64)
+        for k, step in enumerate(plan.steps):
+            banner_type = step['banner_type']
+            tickets["UR"] = tickets["UR"] + step['free_ur_tickets_gained']
+            tickets["SP"] = tickets["SP"] + step['free_sp_tickets_gained']
+            
+            result = self.sim.simulate_banner_batch(
+                diamonds, tickets[banner_type], pity[banner_type], step['target_copies'], banner_type, rng
+            )
+            diamond_pulls[k] = result['pulls_with_diamonds']
+            tickets[banner_type] = result['tickets_remaining']
+            pity[banner_type] = result['final_pity']
+        
+        return diamond_pulls
+    
+    def _requirements(self, initial_state, plan, num_simulations, seed, requirement):
+        """Histogram of requirement(cumulative diamond cost) over seeded chunks"""
+        histogram = Histogram()
+        chunk_sizes = [min(self.sim.CHUNK_SIZE, num_simulations - start)
+                       for start in range(0, num_simulations, self.sim.CHUNK_SIZE)]
+        for size, chunk_seed in zip(chunk_sizes, np.random.SeedSequence(seed).spawn(len(chunk_sizes))):
+            if len(plan) == 0:
+                histogram.add(0, size)
+                continue
+            rng = np.random.default_rng(chunk_seed)
+            cost = np.cumsum(self._diamond_pulls(initial_state, plan, size, rng), axis=0) * self.sim.PULL_COST
+            histogram.add(np.maximum(requirement(cost).max(axis=0), 0))
+        return histogram
+    
+    def minimum_diamonds(self, initial_state, plan, target_success_rate, num_simulations, seed=None):
+        """Smallest starting diamonds reaching target_success_rate percent"""
+        gained = np.cumsum(plan.diamonds_gained)[:, None]
+        histogram = self._requirements(initial_state, plan, num_simulations, seed,
+                                       lambda cost: cost - gained)
+        return self._result('minimum_diamonds', histogram, target_success_rate, num_simulations)
+    
+    def minimum_daily_income(self, initial_state, plan, target_success_rate, num_simulations, seed=None):
+        """Smallest daily income reaching target_success_rate percent from the starting diamonds"""
+        days = np.cumsum(plan.income_days)[:, None]
+        initial_diamonds = initial_state[0]
+        histogram = self._requirements(initial_state, plan, num_simulations, seed,
+                                       lambda cost: -((initial_diamonds - cost) // days))
+        return self._result('minimum_daily_income', histogram, target_success_rate, num_simulations)
+    
+    def budget_curve(self, initial_state, plan, budgets, num_simulations, seed=None):
+        """Success rate (percent) at each (initial_diamonds, daily_income) pair in budgets.
+        
+        A simulation succeeds at a budget when every banner's cumulative diamond
+        cost is covered by the starting diamonds plus the income up to it, so all
+        budgets are read from the same unlimited-diamond run.
+        """
+        budgets = np.asarray(budgets, dtype=np.int64).reshape(-1, 2)
+        days = np.cumsum(plan.income_days)[:, None]
+        successes = np.zeros(len(budgets), dtype=np.int64)
+        chunk_sizes = [min(self.sim.CHUNK_SIZE, num_simulations - start)
+                       for start in range(0, num_simulations, self.sim.CHUNK_SIZE)]
+        for size, chunk_seed in zip(chunk_sizes, np.random.SeedSequence(seed).spawn(len(chunk_sizes))):
+            if len(plan) == 0:
+                successes += size
+                continue
+            rng = np.random.default_rng(chunk_seed)
+            cost = np.cumsum(self._diamond_pulls(initial_state, plan, size, rng), axis=0) * self.sim.PULL_COST
+            for i, (diamonds, daily_income) in enumerate(budgets):
+                successes[i] += np.count_nonzero((cost <= diamonds + daily_income * days).all(axis=0))
+        return (successes / num_simulations * 100).tolist()
+    
+    def _result(self, key, histogram, target_success_rate, num_simulations):
+        value = histogram.smallest_covering(target_success_rate / 100)
+        return {
+            key: value,
+            'target_success_rate': target_success_rate,
+            'success_rate': histogram.fraction_at_most(value) * 100,
+            'total_simulations': num_simulations
+        }
+    
+    def success_rate(self, initial_state, plan, num_simulations, seed=None):
+        """Overall success rate with common random numbers, so that plans run
+        with the same seed can be compared without sampling noise"""
+        aggregator = ResultAggregator()
+        chunk_sizes = [min(self.sim.CHUNK_SIZE, num_simulations - start)
+                       for start in range(0, num_simulations, self.sim.CHUNK_SIZE)]
+        for size, chunk_seed in zip(chunk_sizes, np.random.SeedSequence(seed).spawn(len(chunk_sizes))):
+            numbers = CommonRandomNumbers(size, chunk_seed)
+            self.sim._simulate_batch(*initial_state, plan, size, None, aggregator, numbers.cursor())
+        return aggregator.success_count / aggregator.num_sims * 100
+    
+    def maximum_copies(self, initial_state, compile_plan, targeted_banners, target_success_rate,
+                       num_simulations, seed=None, copies_limit=COPIES_LIMIT):
+        """Most copies of each banner, the others keeping their targets, that still
+        reach target_success_rate percent. None when even zero copies does not.
+        
+        Success only drops as copies go up, so each banner is a bisection over
+        [0, copies_limit], with every step replaying the same simulations.
+        """
+        maximum = {}
+        for banner_name, _ in targeted_banners:
+            def rate(copies):
+                plan = compile_plan([
+                    (name, copies if name == banner_name else target) for name, target in targeted_banners
+                ])
+                return self.success_rate(initial_state, plan, num_simulations, seed)
+            
+            if rate(0) < target_success_rate:
+                maximum[banner_name] = None
+                continue
+            
+            low, high = 0, copies_limit
+            while low < high:
+                middle = (low + high + 1) // 2
+                if rate(middle) >= target_success_rate:
+                    low = middle
+                else:
+                    high = middle - 1
+            maximum[banner_name] = low
+        
+        return {
+            'maximum_copies': maximum,
+            'target_success_rate': target_success_rate,
+            'total_simulations': num_simulations
+        }
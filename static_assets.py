@@ -0,0 +1,188 @@
+"""Static asset pipeline for index.html and the character art.
+
+    python static_assets.py [--webp]
+
+fingerprints every file in assets/ by content hash and writes the hashes
+into the ASSET_VERSIONS line of index.html, so the page requests
+/assets/<file>?v=<hash> and those URLs can be cached forever. index.html
+itself is precompressed to index.html.gz (and index.html.br when the brotli
+module is installed).
+
+The Flask app (app.py) serves these with ETags, the precompressed page and
+immutable caching for asset URLs whose v matches the file's hash. On Vercel
+(vercel.json) index.html and unversioned assets are served by the platform,
+which compresses and revalidates them itself; only versioned asset URLs are
+routed to the app, so the hash is still checked before they are cached
+forever. With --webp and Pillow installed, downscaled WebP
+copies of the character art are written to assets/webp/ and preferred by
+the page.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+ASSETS_DIR = os.path.join(ROOT, 'assets')
+INDEX_PATH = os.path.join(ROOT, 'index.html')
+
+# Banner images are shown at 80px; twice that keeps them sharp on high-DPI screens
+WEBP_WIDTH = 160
+WEBP_QUALITY = 80
+
+VERSIONS_LINE = re.compile(r'const ASSET_VERSIONS = .*?;')
+
+# Content encodings in order of preference, with the suffix of their precompressed file
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def asset_versions(directory=ASSETS_DIR):
+    """Content hash of every file under directory, keyed by its path relative to it"""
+    versions = {}
+    for parent, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(parent, name)
+            with open(path, 'rb') as f:
+                versions[os.path.relpath(path, directory).replace(os.sep, '/')] = content_hash(f.read())
+    return dict(sorted(versions.items()))
+
+
+def write_webp(directory=ASSETS_DIR, width=WEBP_WIDTH):
+    """Downscaled WebP copy of every PNG in directory, in directory/webp. Needs Pillow."""
+    from PIL import Image
+    
+    output = os.path.join(directory, 'webp')
+    os.makedirs(output, exist_ok=True)
+    paths = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.png'):
+            continue
+        with Image.open(os.path.join(directory, name)) as image:
+            if image.width > width:
+                image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+            paths.append(os.path.join(output, name[:-len('.png')] + '.webp'))
+            image.save(paths[-1], 'WEBP', quality=WEBP_QUALITY, method=6)
+    return paths
+
+
+def write_versions(versions, index_path=INDEX_PATH):
+    """Rewrite the ASSET_VERSIONS line of index.html, return whether it changed"""
+    with open(index_path, encoding='utf-8') as f:
+        page = f.read()
+    line = f"const ASSET_VERSIONS = {json.dumps(versions, separators=(',', ':'))};"
+    updated, count = VERSIONS_LINE.subn(lambda _: line, page, count=1)
+    if count == 0:
+        raise ValueError(f"{index_path} has no ASSET_VERSIONS line")
+    if updated == page:
+        return False
+    with open(index_path, 'w', encoding='utf-8') as f:
+        f.write(updated)
+    return True
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def decompress(data, encoding):
+    """Inverse of compress, ValueError when data is not valid or the codec is missing"""
+    if encoding == 'br':
+        if brotli is None:
+            raise ValueError("brotli is not installed")
+        try:
+            return brotli.decompress(data)
+        except brotli.error as e:
+            raise ValueError(str(e)) from e
+    try:
+        return gzip.decompress(data)
+    except (OSError, EOFError) as e:
+        raise ValueError(str(e)) from e
+
+
+def write_compressed(path):
+    """Precompressed copies of path next to it, return their paths"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    paths = []
+    for encoding, suffix in ENCODINGS:
+        if encoding == 'br' and brotli is None:
+            continue
+        paths.append(path + suffix)
+        with open(paths[-1], 'wb') as f:
+            f.write(compress(data, encoding))
+    return paths
+
+
+class StaticPage:
+    """A page held in memory with its compressed variants and their ETags.
+    
+    Precompressed files written by this module are used when they
+    decompress to the page, otherwise the page is gzipped once on load.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.load()
+    
+    def load(self):
+        self.mtime = os.stat(self.path).st_mtime
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        digest = content_hash(data)
+        self.variants = {None: (data, digest)}
+        for encoding, suffix in ENCODINGS:
+            try:
+                with open(self.path + suffix, 'rb') as f:
+                    compressed = f.read()
+                # A copy left over from an earlier page, whatever its mtime, is not used
+                if content_hash(decompress(compressed, encoding)) == digest:
+                    self.variants[encoding] = (compressed, f"{digest}-{encoding}")
+            except (OSError, ValueError):
+                pass
+        if 'gzip' not in self.variants:
+            self.variants['gzip'] = (compress(data, 'gzip'), f"{digest}-gzip")
+    
+    def reload_if_changed(self):
+        if os.stat(self.path).st_mtime != self.mtime:
+            self.load()
+    
+    def variant(self, accept_encodings):
+        """(body, encoding, etag) of the preferred variant the client accepts"""
+        for encoding, _ in ENCODINGS:
+            if encoding in self.variants and accept_encodings[encoding]:
+                return (self.variants[encoding][0], encoding, self.variants[encoding][1])
+        return (self.variants[None][0], None, self.variants[None][1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--webp', action='store_true', help='Also write downscaled WebP art (needs Pillow)')
+    args = parser.parse_args()
+    
+    if args.webp:
+        for path in write_webp():
+            print(f"Wrote {path}")
+    versions = asset_versions()
+    if write_versions(versions):
+        print(f"Updated ASSET_VERSIONS in {INDEX_PATH} ({len(versions)} files)")
+    for path in write_compressed(INDEX_PATH):
+        print(f"Wrote {path}")
+    if brotli is None:
+        print("brotli is not installed, skipped index.html.br")
+
+
+if __name__ == '__main__':
+    main()
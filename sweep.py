@@ -0,0 +1,117 @@
+from itertools import product
+
+import numpy as np
+
+
+# Sweepable request fields and the run_monte_carlo argument each one sets.
+# "copies" also needs the name of the banner whose target it changes.
+SWEEP_PARAMETERS = {
+    'diamonds': 'initial_diamonds',
+    'ur_tickets': 'initial_ur_tickets',
+    'sp_tickets': 'initial_sp_tickets',
+    'ur_pity': 'initial_ur_pity',
+    'sp_pity': 'initial_sp_pity',
+    'free_ur': 'free_ur_tickets',
+    'free_sp': 'free_sp_tickets',
+    'daily_income': 'daily_income',
+    'copies': 'targeted_banners'
+}
+
+# Parameters a sweep can read from one requirement run, see GachaSimulator.run_sweep
+BUDGET_PARAMETERS = ('diamonds', 'daily_income')
+
+# Upper bound on the number of grid points in one sweep
+MAX_SWEEP_POINTS = 400
+
+
+def expand_grid(base, sweep):
+    """List the run_monte_carlo arguments of every grid point.
+    
+    base maps run_monte_carlo argument names to values, sweep is a list of one
+    or two {'parameter', 'values'[, 'banner']} dicts. Returns (point, arguments)
+    pairs, where point maps each swept parameter to its value.
+    """
+    if not 1 <= len(sweep) <= 2:
+        raise ValueError("A sweep takes one or two parameters")
+    
+    labels = []
+    for axis in sweep:
+        parameter = axis.get('parameter')
+        if parameter not in SWEEP_PARAMETERS:
+            raise ValueError(f"Unknown sweep parameter '{parameter}', expected one of {tuple(SWEEP_PARAMETERS)}")
+        if not axis.get('values'):
+            raise ValueError(f"No values given for sweep parameter '{parameter}'")
+        if parameter == 'copies':
+            banner = axis.get('banner')
+            if banner not in [name for name, _ in base['targeted_banners']]:
+                raise ValueError(f"Sweep banner '{banner}' is not a targeted banner")
+            labels.append(f"copies:{banner}")
+        else:
+            labels.append(parameter)
+    if len(set(labels)) != len(labels):
+        raise ValueError("Each parameter can only be swept once")
+    
+    num_points = int(np.prod([len(axis['values']) for axis in sweep]))
+    if num_points > MAX_SWEEP_POINTS:
+        raise ValueError(f"{num_points} sweep points (limit {MAX_SWEEP_POINTS})")
+    
+    grid = []
+    for values in product(*(axis['values'] for axis in sweep)):
+        arguments = dict(base)
+        for axis, value in zip(sweep, values):
+            if axis['parameter'] == 'copies':
+                arguments['targeted_banners'] = [
+                    (name, value if name == axis['banner'] else copies)
+                    for name, copies in arguments['targeted_banners']
+                ]
+            else:
+                arguments[SWEEP_PARAMETERS[axis['parameter']]] = value
+        grid.append((dict(zip(labels, values)), arguments))
+    return grid
+
+
+class CommonRandomNumbers:
+    """Uniform draws shared by every point of a sweep.
+    
+    Row j of a banner type's table holds the uniform behind each simulation's
+    (j+1)-th featured copy of that type, so a simulation sees the same pull
+    outcomes at every grid point. Rows are generated on demand.
+    """
+    
+    def __init__(self, num_sims, seed_sequence):
+        self.num_sims = num_sims
+        self._rngs = {
+            banner_type: np.random.default_rng(child)
+            for banner_type, child in zip(("UR", "SP"), seed_sequence.spawn(2))
+        }
+        self._tables = {banner_type: np.empty((0, num_sims)) for banner_type in self._rngs}
+    
+    def uniforms(self, banner_type, rows, hit_index):
+        table = self._tables[banner_type]
+        needed = int(hit_index.max()) + 1
+        if needed > table.shape[0]:
+            # Grow geometrically so long sweeps do not reallocate per draw
+            grow = max(needed - table.shape[0], table.shape[0])
+            table = np.vstack([table, self._rngs[banner_type].random((grow, self.num_sims))])
+            self._tables[banner_type] = table
+        return table[hit_index, rows]
+    
+    def cursor(self):
+        return HitCursor(self)
+
+
+class HitCursor:
+    """One grid point's position in a CommonRandomNumbers stream"""
+    
+    def __init__(self, numbers):
+        self.numbers = numbers
+        self.hits_drawn = {banner_type: np.zeros(numbers.num_sims, dtype=np.int64) for banner_type in ("UR", "SP")}
+        # Pulls left until the featured copy already drawn, 0 when none is pending
+        self.pending = {banner_type: np.zeros(numbers.num_sims, dtype=np.int64) for banner_type in ("UR", "SP")}
+    
+    def draw(self, simulator, rows, pity, banner_type):
+        """Pulls until the next featured copy for the simulations in rows"""
+        hit_index = self.hits_drawn[banner_type][rows]
+        uniforms = self.numbers.uniforms(banner_type, rows, hit_index)
+        self.hits_drawn[banner_type][rows] = hit_index + 1
+        return simulator.hit_times_from_uniforms(pity, banner_type, uniforms)
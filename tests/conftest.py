@@ -0,0 +1,50 @@
+import json
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Plans compile against today's date, so the tests run on a schedule that
+# starts tomorrow instead of banners.json, whose banners end over time.
+# BANNER_SCHEDULE is read when banners is first imported.
+SCHEDULE_PATH = os.path.join(tempfile.mkdtemp(), 'banners.json')
+TEST_BANNERS = [f"Test Banner {i + 1}" for i in range(4)]
+SAME_DAY_BANNERS = ["Same Day Banner A", "Same Day Banner B"]
+
+with open(SCHEDULE_PATH, 'w') as f:
+    json.dump({'version': 1, 'banners': [
+        {
+            'name': name,
+            'type': 'UR' if i % 2 == 0 else 'SP',
+            'start': (date.today() + timedelta(days=1 + 7 * i)).isoformat(),
+            'end': (date.today() + timedelta(days=14 + 7 * i)).isoformat()
+        }
+        for i, name in enumerate(TEST_BANNERS)
+    ] + [
+        # Two banners starting the same day, after the weekly ones
+        {
+            'name': name,
+            'type': 'UR',
+            'start': (date.today() + timedelta(days=50)).isoformat(),
+            'end': (date.today() + timedelta(days=63)).isoformat()
+        }
+        for name in SAME_DAY_BANNERS
+    ]}, f)
+os.environ['BANNER_SCHEDULE'] = SCHEDULE_PATH
+
+
+@pytest.fixture
+def banner_names():
+    """Names of the test schedule's banners, UR and SP alternating, in start order"""
+    return list(TEST_BANNERS)
+
+
+@pytest.fixture
+def same_day_banners():
+    """Names of two UR banners of the test schedule that start on the same day"""
+    return list(SAME_DAY_BANNERS)
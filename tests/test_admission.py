@@ -0,0 +1,51 @@
+import pytest
+
+import app as app_module
+from admission import ACCEPT, DOWNSCALE, QUEUE, REJECT, CostModel, admit
+
+
+@pytest.fixture
+def client():
+    app_module.result_cache.clear()
+    return app_module.app.test_client()
+
+
+def plan_args(banner_names, copies=1, diamonds=60000, num_sims=10000):
+    return (diamonds, 10, 10, 0, 0, 0, 0, [(name, copies) for name in banner_names], 300, num_sims)
+
+
+def test_cost_grows_with_simulations_and_banners(banner_names):
+    model = CostModel()
+    small = model.estimate(plan_args(banner_names[:1]), 'numpy')
+    assert model.estimate(plan_args(banner_names[:1], num_sims=20000), 'numpy').units == 2 * small.units
+    assert model.estimate(plan_args(banner_names[:3]), 'numpy').units > small.units
+    assert model.estimate(plan_args(banner_names[:1]), 'scalar').seconds > small.seconds
+
+
+def test_admit_decisions(banner_names):
+    model = CostModel()
+    estimate = model.estimate(plan_args(banner_names, num_sims=10 ** 7), 'numpy')
+    assert admit(model, estimate)[0] == ACCEPT
+    decision, num_sims = admit(model, estimate, latency_budget=1, downscale=True)
+    assert decision == DOWNSCALE and 0 < num_sims < 10 ** 7
+    assert model.estimate(plan_args(banner_names, num_sims=num_sims), 'numpy').seconds <= 1
+    assert admit(model, estimate, latency_budget=1, queue=True) == (QUEUE, 10 ** 7)
+    assert admit(model, estimate, latency_budget=1)[0] == REJECT
+
+
+def test_exact_cost_does_not_scale_with_simulations(banner_names):
+    model = CostModel()
+    few = model.estimate(plan_args(banner_names, copies=2, diamonds=300000, num_sims=100), 'exact')
+    assert few.fixed > 0
+    assert model.simulations_within(few, seconds=few.fixed / few.throughput / 2) == 0
+
+
+def test_exact_rejection_suggests_numpy(client, banner_names, monkeypatch):
+    monkeypatch.setattr(app_module, 'SIM_LATENCY_BUDGET', 0.001)
+    response = client.post('/simulate', json={
+        'diamonds': 300000, 'engine': 'exact', 'num_sims': 100, 'downscale': True,
+        'targeted_banners': [{'name': name, 'copies': 2} for name in banner_names]
+    })
+    assert response.status_code == 413
+    error = response.get_json()['error']
+    assert '"engine": "numpy"' in error and 'simulations fit' not in error
@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+
+from aggregate import Histogram
+
+
+@pytest.mark.parametrize("values", [
+    [5],
+    [3, 1, 2],
+    [0, 0, 0, 7, 7, 200],
+    np.random.default_rng(0).integers(-50, 500, size=1001),
+])
+def test_percentile_matches_numpy(values):
+    histogram = Histogram()
+    # Added in two parts, so merged counts are covered too
+    histogram.add(np.asarray(values[:len(values) // 2]))
+    histogram.add(np.asarray(values[len(values) // 2:]))
+    for q in (0, 1, 10, 25, 33.3, 50, 75, 90, 99, 100):
+        assert histogram.percentile(q) == pytest.approx(np.percentile(values, q))
@@ -0,0 +1,57 @@
+import json
+import os
+from datetime import date, timedelta
+
+import pytest
+
+import banners
+from app import app
+
+
+def write_schedule(path, entries):
+    with open(path, 'w') as f:
+        json.dump({'version': 1, 'banners': entries}, f)
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+def test_banners_window_keeps_banners_running_in_it(client, banner_names):
+    day = (date.today() + timedelta(days=3)).isoformat()
+    response = client.get(f'/banners?start={day}&end={day}')
+    assert response.status_code == 200
+    # Only the first weekly banner has started three days from now
+    assert [row[0] for row in response.get_json()['banners']] == banner_names[:1]
+
+
+@pytest.mark.parametrize("end", ["9999-12-31", "9999-12-31T12:00", "not a date"])
+def test_banners_window_end_never_overflows(client, end):
+    response = client.get(f'/banners?end={end}')
+    if end == "9999-12-31":
+        assert response.status_code == 200
+    else:
+        assert response.status_code == 400
+        assert 'YYYY-MM-DD' in response.get_json()['error']
+
+
+def test_schedule_reloads_when_file_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(banners, 'RELOAD_INTERVAL', 0)
+    path = str(tmp_path / 'banners.json')
+    write_schedule(path, [{'name': 'First', 'type': 'UR', 'start': '2030-01-01', 'end': '2030-01-14'}])
+    first = banners.current_schedule(path)
+    assert [b[0] for b in first.banners] == ['First']
+    assert banners.current_schedule(path) is first
+    
+    write_schedule(path, [{'name': 'Second', 'type': 'SP', 'start': '2030-02-01', 'end': '2030-02-14'}])
+    # Guarantee a new signature even on filesystems with coarse mtimes
+    os.utime(path, ns=(0, 0))
+    second = banners.current_schedule(path)
+    assert [b[0] for b in second.banners] == ['Second']
+    assert second.digest != first.digest
+    
+    # A broken file keeps the last good schedule
+    with open(path, 'w') as f:
+        f.write('{')
+    assert banners.current_schedule(path) is second
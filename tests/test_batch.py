@@ -0,0 +1,47 @@
+import math
+
+import pytest
+
+from main import GachaSimulator
+
+NUM_SIMS = 20000
+
+
+def profile(targeted_banners, diamonds=15000):
+    return {
+        'initial_diamonds': diamonds, 'initial_ur_tickets': 0, 'initial_sp_tickets': 0,
+        'initial_ur_pity': 0, 'initial_sp_pity': 0, 'free_ur_tickets': 0, 'free_sp_tickets': 0,
+        'targeted_banners': targeted_banners, 'daily_income': 0
+    }
+
+
+def test_each_profile_matches_its_own_run(banner_names, same_day_banners):
+    first, second = same_day_banners
+    # Budget for about one copy, so the order of the same-day banners decides which one succeeds
+    profiles = [
+        profile([(first, 1), (second, 1)]),
+        profile([(second, 1), (first, 1)]),
+        profile([(name, 1) for name in banner_names[:2]], diamonds=30000),
+    ]
+    sim = GachaSimulator(engine="numpy")
+    batch = sim.run_batch(profiles, num_simulations=NUM_SIMS, seed=1)
+    
+    for p, batch_results in zip(profiles, batch['profiles']):
+        single = sim.run_monte_carlo(*p.values(), NUM_SIMS, seed=2)
+        for name, stats in single['banner_statistics'].items():
+            rate = stats['success_rate']
+            tolerance = 5 * math.sqrt(max(rate * (100 - rate), 1) / NUM_SIMS) * math.sqrt(2)
+            assert batch_results['banner_statistics'][name]['success_rate'] == pytest.approx(rate, abs=tolerance)
+    
+    assert batch['banners'][first]['members_targeting'] == 2
+    # First in plan order is the likelier success
+    assert batch['profiles'][0]['banner_statistics'][first]['success_rate'] > \
+        batch['profiles'][0]['banner_statistics'][second]['success_rate'] + 10
+    assert batch['profiles'][1]['banner_statistics'][second]['success_rate'] > \
+        batch['profiles'][1]['banner_statistics'][first]['success_rate'] + 10
+
+
+def test_duplicate_targets_are_rejected(banner_names):
+    with pytest.raises(ValueError):
+        GachaSimulator(engine="numpy").run_batch([profile([(banner_names[0], 1), (banner_names[0], 2)])],
+                                                 num_simulations=100, seed=1)
@@ -0,0 +1,77 @@
+from datetime import date
+
+import pytest
+
+import app as app_module
+from cache import ResultCache, canonical_key
+
+TODAY = date(2030, 1, 1)
+BASE = {'diamonds': 20000, 'seed': 1, 'targeted_banners': [{'name': 'A', 'copies': 1}, {'name': 'B', 'copies': 2}]}
+
+
+def key(data, today=TODAY, schedule='schedule'):
+    return canonical_key(data, today=today, schedule=schedule)
+
+
+@pytest.mark.parametrize("equivalent", [
+    dict(BASE, targeted_banners=BASE['targeted_banners'][::-1]),
+    dict(BASE, diamonds=20000.0),
+    dict(BASE, diamonds="20000"),
+    dict(BASE, num_sims=10000, engine='scalar', ur_pity=0, histograms=False),
+])
+def test_equivalent_requests_share_a_key(equivalent):
+    assert key(equivalent) == key(BASE)
+
+
+@pytest.mark.parametrize("different", [
+    dict(BASE, diamonds=20001),
+    dict(BASE, seed=2),
+    dict(BASE, engine='numpy'),
+    dict(BASE, sampling='qmc'),
+    dict(BASE, targeted_banners=[{'name': 'A', 'copies': 2}, {'name': 'B', 'copies': 1}]),
+    dict(BASE, histograms=True),
+])
+def test_different_requests_get_different_keys(different):
+    assert key(different) != key(BASE)
+
+
+def test_key_changes_with_the_day_and_the_schedule():
+    assert key(BASE, today=date(2030, 1, 2)) != key(BASE)
+    assert key(BASE, schedule='reloaded') != key(BASE)
+
+
+def test_result_cache_evicts_least_recently_used():
+    cache = ResultCache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+
+
+def test_result_cache_expires_entries():
+    cache = ResultCache(ttl=-1)
+    cache.set('a', 1)
+    assert cache.get('a') is None
+
+
+def test_result_cache_disk_layer_survives_a_new_process(tmp_path):
+    ResultCache(disk_dir=str(tmp_path)).set('a', {'success_rate': 50.0})
+    fresh = ResultCache(disk_dir=str(tmp_path))
+    assert fresh.get('a') == {'success_rate': 50.0}
+    assert fresh.stats()['disk_hits'] == 1
+
+
+def test_simulate_serves_equivalent_requests_from_the_cache(banner_names):
+    app_module.result_cache.clear()
+    client = app_module.app.test_client()
+    body = {'diamonds': 30000, 'num_sims': 2000, 'seed': 1, 'engine': 'numpy',
+            'targeted_banners': [{'name': name, 'copies': 1} for name in banner_names[:2]]}
+    first = client.post('/simulate', json=body)
+    assert first.headers['X-Cache'] == 'MISS'
+    
+    reordered = dict(body, diamonds='30000', targeted_banners=body['targeted_banners'][::-1])
+    second = client.post('/simulate', json=reordered)
+    assert second.headers['X-Cache'] == 'HIT'
+    assert second.get_json() == first.get_json()
@@ -0,0 +1,63 @@
+import math
+
+import pytest
+
+from cache import PrefixCache
+from main import GachaSimulator
+
+NUM_SIMS = 20000
+
+
+def plan_args(banner_names, banners=3):
+    """A plan that succeeds about half the time, so sampling error is largest"""
+    return (30000, 10, 10, 0, 0, 5, 5, [(name, 1) for name in banner_names[:banners]], 300)
+
+
+def test_engines_agree_within_sampling_error(banner_names):
+    args = plan_args(banner_names)
+    exact = GachaSimulator(engine="exact").run_monte_carlo(*args, NUM_SIMS, seed=1)
+    rate = exact['success_rate']
+    assert 10 < rate < 90
+    
+    # Five standard errors of a sampled rate against the exact one
+    tolerance = 5 * math.sqrt(rate * (100 - rate) / NUM_SIMS)
+    for engine in ("scalar", "numpy"):
+        results = GachaSimulator(engine=engine).run_monte_carlo(*args, NUM_SIMS, seed=1)
+        assert results['success_rate'] == pytest.approx(rate, abs=tolerance)
+        for name, stats in results['banner_statistics'].items():
+            expected = exact['banner_statistics'][name]['success_rate']
+            banner_tolerance = 5 * math.sqrt(max(expected * (100 - expected), 1) / NUM_SIMS)
+            assert stats['success_rate'] == pytest.approx(expected, abs=banner_tolerance)
+
+
+@pytest.mark.parametrize("engine", ["scalar", "numpy"])
+def test_seed_gives_same_result_for_any_workers(banner_names, engine):
+    sim = GachaSimulator(engine=engine)
+    # More than one chunk, so the second worker gets some of them
+    num_sims = GachaSimulator.CHUNK_SIZE * 2 + 500
+    single = sim.run_monte_carlo(*plan_args(banner_names), num_sims, seed=7, workers=1)
+    parallel = sim.run_monte_carlo(*plan_args(banner_names), num_sims, seed=7, workers=2)
+    assert single == parallel
+
+
+def test_prefix_cache_resume_matches_run_from_scratch(banner_names):
+    prefix_cache = PrefixCache()
+    sim = GachaSimulator(engine="numpy")
+    sim.run_monte_carlo(*plan_args(banner_names, 2), NUM_SIMS, seed=3, prefix_cache=prefix_cache)
+    resumed = sim.run_monte_carlo(*plan_args(banner_names, 4), NUM_SIMS, seed=3, prefix_cache=prefix_cache)
+    assert prefix_cache.stats()['hits'] > 0
+    
+    scratch = GachaSimulator(engine="numpy").run_monte_carlo(*plan_args(banner_names, 4), NUM_SIMS, seed=3)
+    assert resumed == scratch
+
+
+def test_exact_engine_falls_back_on_large_state_spaces(banner_names):
+    args = (3000000, 10, 10, 0, 0, 0, 0, [(name, 3) for name in banner_names], 300)
+    results = GachaSimulator(engine="exact").run_monte_carlo(*args, 2000, seed=1)
+    sampled = GachaSimulator(engine="numpy").run_monte_carlo(*args, 2000, seed=1)
+    assert results == sampled
+
+
+def test_exact_engine_handles_negative_diamonds(banner_names):
+    args = (-5000, 0, 0, 0, 0, 0, 0, [(banner_names[0], 1)], 0)
+    assert GachaSimulator(engine="exact").run_monte_carlo(*args, 1000)['success_rate'] == 0
@@ -0,0 +1,50 @@
+import pytest
+
+import app as app_module
+import formats
+
+
+@pytest.fixture
+def client():
+    app_module.result_cache.clear()
+    return app_module.app.test_client()
+
+
+def as_lists(results):
+    """results with the histogram arrays decode_arrays returns turned into lists"""
+    for banner_stats in results['banner_statistics'].values():
+        for histogram in banner_stats.get('histograms', {}).values():
+            for key, values in histogram.items():
+                histogram[key] = values.tolist()
+    return results
+
+
+@pytest.mark.parametrize("engine", ["numpy", "exact"])
+def test_arrays_format_round_trips_the_json_result(client, banner_names, engine):
+    body = {'diamonds': 30000, 'num_sims': 5000, 'seed': 1, 'engine': engine, 'histograms': True,
+            'targeted_banners': [{'name': name, 'copies': 1} for name in banner_names[:3]]}
+    expected = client.post('/simulate', json=body).get_json()
+    assert all(stats['histograms'] for stats in expected['banner_statistics'].values())
+    
+    response = client.post('/simulate', json=body, headers={'Accept': formats.ARRAYS})
+    assert response.mimetype == formats.ARRAYS
+    assert as_lists(formats.decode_arrays(response.get_data())) == expected
+
+
+def test_arrays_use_the_narrowest_type():
+    counts = [1, 300, 70000]
+    results = {'banner_statistics': {'A': {'histograms': {'pulls': {'values': [0, 1, 2], 'counts': counts}}},
+                                     'B': {'histograms': {'pulls': {'values': [5], 'counts': [0.25]}}}}}
+    payload = formats.encode_arrays(results)
+    decoded = formats.decode_arrays(payload)
+    
+    pulls = decoded['banner_statistics']['A']['histograms']['pulls']
+    assert pulls['values'].dtype == 'i1'
+    assert pulls['counts'].dtype == 'i4'
+    assert decoded['banner_statistics']['B']['histograms']['pulls']['counts'].dtype == 'f8'
+    assert as_lists(decoded) == results
+
+
+def test_decode_rejects_other_payloads():
+    with pytest.raises(ValueError):
+        formats.decode_arrays(b'{"banner_statistics": {}}')
@@ -0,0 +1,61 @@
+import time
+
+from jobs import JobQueue, JobStore
+
+LEASE = 0.6
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def make_runner(runs):
+    def run_job(payload, should_stop):
+        runs.append(payload['n'])
+        for i in range(payload['batches']):
+            if should_stop():
+                return
+            time.sleep(0.02)
+            yield i + 1, {'n': payload['n']}
+    return run_job
+
+
+def test_second_queue_leaves_live_jobs_alone(tmp_path):
+    runs = []
+    path = str(tmp_path / 'jobs.sqlite3')
+    first = JobQueue(JobStore(path), make_runner(runs), lease=LEASE)
+    job_id = first.submit({'n': 1, 'batches': 30}, 30)
+    
+    # Another worker process starting up while the job runs
+    JobQueue(JobStore(path), make_runner(runs), lease=LEASE)
+    wait_for(lambda: first.get(job_id)['status'] == 'completed')
+    time.sleep(LEASE)
+    assert runs == [1]
+
+
+def test_cancel_from_another_queue_stops_the_owner(tmp_path):
+    runs = []
+    path = str(tmp_path / 'jobs.sqlite3')
+    owner = JobQueue(JobStore(path), make_runner(runs), lease=LEASE)
+    other = JobQueue(JobStore(path), make_runner(runs), lease=LEASE)
+    job_id = owner.submit({'n': 1, 'batches': 1000}, 1000)
+    wait_for(lambda: owner.get(job_id)['status'] == 'running')
+    
+    assert other.cancel(job_id)
+    wait_for(lambda: owner.stats()['pending'] == 0)
+    assert owner.get(job_id)['status'] == 'cancelled'
+
+
+def test_jobs_of_a_dead_owner_are_taken_over(tmp_path):
+    runs = []
+    store = JobStore(str(tmp_path / 'jobs.sqlite3'))
+    store.create('orphan', {'n': 1, 'batches': 3}, 3, owner='exited-process')
+    store.update('orphan', status='running', simulations_run=2, heartbeat=time.time() - 10 * LEASE)
+    
+    queue = JobQueue(store, make_runner(runs), lease=LEASE)
+    wait_for(lambda: store.get('orphan')['status'] == 'completed')
+    assert store.get('orphan')['owner'] == queue.owner
+    assert runs == [1]
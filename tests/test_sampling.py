@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from main import GachaSimulator
+from sampling import SAMPLING_MODES, SampledNumbers
+
+NUM_SIMS = 20000
+
+
+def plan_args(banner_names):
+    return (30000, 10, 10, 0, 0, 5, 5, [(name, 1) for name in banner_names[:3]], 300)
+
+
+@pytest.mark.parametrize("mode", SAMPLING_MODES)
+def test_sampling_modes_are_unbiased(banner_names, mode):
+    exact = GachaSimulator(engine="exact").run_monte_carlo(*plan_args(banner_names), NUM_SIMS)
+    results = GachaSimulator(engine="numpy", sampling=mode).run_monte_carlo(
+        *plan_args(banner_names), NUM_SIMS, seed=1
+    )
+    report = results['sampling']
+    assert report['mode'] == mode
+    assert results['success_rate'] == pytest.approx(exact['success_rate'],
+                                                    abs=5 * report['plain_standard_error'])
+
+
+@pytest.mark.parametrize("mode", ["antithetic", "stratified", "qmc"])
+def test_variance_reduction_beats_plain_sampling(banner_names, mode):
+    results = GachaSimulator(engine="numpy", sampling=mode).run_monte_carlo(
+        *plan_args(banner_names), NUM_SIMS, seed=1
+    )
+    report = results['sampling']
+    assert report['variance_reduction'] > 1
+    assert report['standard_error'] < report['plain_standard_error']
+
+
+def test_rows_follow_their_mode():
+    num_sims = 1000
+    for mode in SAMPLING_MODES:
+        numbers = SampledNumbers(num_sims, np.random.SeedSequence(0), mode, replicates=4)
+        row = numbers._row("UR", 0)
+        assert ((0 <= row) & (row < 1)).all()
+        for start, end in zip(numbers.bounds[:-1], numbers.bounds[1:]):
+            group = row[start:end]
+            if mode == "antithetic":
+                half = len(group) // 2
+                np.testing.assert_allclose(group[half:], 1 - group[:half])
+            elif mode == "stratified":
+                # One draw in each of the group's strata
+                assert sorted(np.floor(group * len(group)).astype(int)) == list(range(len(group)))
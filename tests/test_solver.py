@@ -0,0 +1,53 @@
+import math
+
+import pytest
+
+from main import GachaSimulator
+
+NUM_SIMS = 20000
+TARGET = 80
+
+
+def plan_args(banner_names):
+    return [30000, 10, 10, 0, 0, 5, 5, [(name, 1) for name in banner_names[:3]], 300]
+
+
+def tolerance(rate, num_sims=NUM_SIMS):
+    """Five standard errors of the difference between two independent sampled rates"""
+    return 5 * math.sqrt(2 * rate * (100 - rate) / num_sims)
+
+
+@pytest.mark.parametrize("solve_for, index", [("diamonds", 0), ("daily_income", 8)])
+def test_solved_budget_reaches_target_in_a_separate_run(banner_names, solve_for, index):
+    sim = GachaSimulator(engine="numpy")
+    solved = sim.solve_budget(*plan_args(banner_names), TARGET, solve_for=solve_for,
+                              num_simulations=NUM_SIMS, seed=1)
+    budget = solved[f'minimum_{solve_for}']
+    assert solved['success_rate'] >= TARGET
+    
+    args = plan_args(banner_names)
+    args[index] = budget
+    rate = sim.run_monte_carlo(*args, NUM_SIMS, seed=2)['success_rate']
+    assert rate == pytest.approx(solved['success_rate'], abs=tolerance(solved['success_rate']))
+
+
+def test_maximum_copies_is_the_last_count_reaching_target(banner_names):
+    sim = GachaSimulator(engine="numpy")
+    args = plan_args(banner_names)
+    args[0] = 60000
+    solved = sim.solve_budget(*args, TARGET, solve_for="copies", num_simulations=5000, seed=1)
+    banner = banner_names[0]
+    copies = solved['maximum_copies'][banner]
+    assert 0 < copies < 10
+    
+    def rate(target):
+        targets = [(name, target if name == banner else c) for name, c in args[7]]
+        return sim.run_monte_carlo(*args[:7], targets, args[8], 5000, seed=2)['success_rate']
+    
+    assert rate(copies) > TARGET - tolerance(TARGET, 5000)
+    assert rate(copies + 1) < TARGET + tolerance(TARGET, 5000)
+
+
+def test_unknown_solve_for_is_rejected(banner_names):
+    with pytest.raises(ValueError):
+        GachaSimulator(engine="numpy").solve_budget(*plan_args(banner_names), TARGET, solve_for="tickets")
@@ -0,0 +1,26 @@
+import gzip
+
+import pytest
+
+import app as app_module
+from static_assets import StaticPage, asset_versions
+
+
+def test_stale_precompressed_page_is_not_served(tmp_path):
+    page = tmp_path / 'index.html'
+    page.write_bytes(b'<html>old</html>')
+    (tmp_path / 'index.html.gz').write_bytes(gzip.compress(b'<html>old</html>'))
+    page.write_bytes(b'<html>new</html>')  # The .gz is older content, whatever the mtimes
+    
+    body, encoding, _ = StaticPage(str(page)).variant({'gzip': True, 'br': False})
+    assert encoding == 'gzip'
+    assert gzip.decompress(body) == b'<html>new</html>'
+
+
+@pytest.mark.parametrize("version, immutable", [(None, False), ('stale', False), ('current', True)])
+def test_assets_are_immutable_only_at_their_hash(version, immutable):
+    filename, digest = next(iter(asset_versions().items()))
+    query = {None: '', 'stale': '?v=0123456789ab', 'current': f'?v={digest}'}[version]
+    response = app_module.app.test_client().get(f'/assets/{filename}{query}')
+    assert response.status_code == 200
+    assert response.cache_control.immutable == immutable
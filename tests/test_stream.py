@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+import app as app_module
+
+
+@pytest.fixture
+def client():
+    app_module.result_cache.clear()
+    return app_module.app.test_client()
+
+
+def stream_events(response):
+    events = []
+    for block in response.get_data(as_text=True).strip().split('\n\n'):
+        event, data = block.split('\n')
+        events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+
+@pytest.mark.parametrize("body", [
+    'not json',
+    {'targeted_banners': [{'copies': 1}]},
+    {'targeted_banners': 5},
+])
+def test_malformed_body_is_a_json_400(client, body):
+    if isinstance(body, str):
+        response = client.post('/simulate/stream', data=body, content_type='application/json')
+    else:
+        response = client.post('/simulate/stream', json=body)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_stream_result_does_not_replace_simulate_result(client, banner_names):
+    body = {'diamonds': 30000, 'num_sims': 30000, 'seed': 5, 'engine': 'numpy',
+            'targeted_banners': [{'name': name, 'copies': 1} for name in banner_names[:3]]}
+    expected = client.post('/simulate', json=body).get_json()
+    app_module.result_cache.clear()
+    
+    events = stream_events(client.post('/simulate/stream', json=body))
+    assert events[-1][0] == 'result'
+    response = client.post('/simulate', json=body)
+    assert response.headers['X-Cache'] == 'MISS'
+    assert response.get_json() == expected
@@ -0,0 +1,57 @@
+import math
+
+import pytest
+
+from main import GachaSimulator
+
+NUM_SIMS = 20000
+
+
+def base_args(banner_names):
+    return (30000, 10, 10, 0, 0, 5, 5, [(name, 1) for name in banner_names[:3]], 300)
+
+
+def tolerance(rate):
+    """Five standard errors of the difference between two independent sampled rates"""
+    return 5 * math.sqrt(2 * max(rate * (100 - rate), 1) / NUM_SIMS)
+
+
+@pytest.mark.parametrize("sweep", [
+    [{'parameter': 'diamonds', 'values': [20000, 30000, 40000]}],
+    [{'parameter': 'daily_income', 'values': [0, 300, 600]}],
+    [{'parameter': 'diamonds', 'values': [20000, 40000]}, {'parameter': 'daily_income', 'values': [0, 600]}],
+])
+def test_budget_sweep_matches_separate_runs(banner_names, sweep):
+    args = base_args(banner_names)
+    sim = GachaSimulator(engine="numpy")
+    results = sim.run_sweep(*args, sweep, num_simulations=NUM_SIMS, seed=1)
+    
+    assert len(results['points']) == math.prod(len(axis['values']) for axis in sweep)
+    for point in results['points']:
+        point_args = list(args)
+        point_args[0] = point['parameters'].get('diamonds', point_args[0])
+        point_args[8] = point['parameters'].get('daily_income', point_args[8])
+        expected = sim.run_monte_carlo(*point_args, NUM_SIMS, seed=2)['success_rate']
+        assert point['success_rate'] == pytest.approx(expected, abs=tolerance(expected))
+
+
+def test_budget_sweep_curve_rises_with_diamonds(banner_names):
+    sweep = [{'parameter': 'diamonds', 'values': list(range(0, 100001, 10000))}]
+    results = GachaSimulator(engine="numpy").run_sweep(*base_args(banner_names), sweep,
+                                                       num_simulations=5000, seed=1)
+    rates = [point['success_rate'] for point in results['points']]
+    assert rates == sorted(rates)
+    assert rates[-1] > 99
+
+
+def test_full_statistics_sweep_runs_every_point(banner_names):
+    sweep = [{'parameter': 'diamonds', 'values': [20000, 40000]}]
+    sim = GachaSimulator(engine="numpy")
+    curve = sim.run_sweep(*base_args(banner_names), sweep, num_simulations=NUM_SIMS, seed=1)
+    full = sim.run_sweep(*base_args(banner_names), sweep, num_simulations=NUM_SIMS, seed=1,
+                         full_statistics=True)
+    for light, point in zip(curve['points'], full['points']):
+        assert set(point['banner_statistics']) == set(banner_names[:3])
+        assert point['parameters'] == light['parameters']
+        assert point['success_rate'] == pytest.approx(light['success_rate'],
+                                                      abs=tolerance(light['success_rate']))